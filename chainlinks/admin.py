@@ -1,14 +1,21 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
 from admin_numeric_filter.admin import NumericFilterModelAdmin, RangeNumericFilter
 from advanced_filters.admin import AdminAdvancedFiltersMixin
 from advanced_filters.forms import AdvancedFilterForm
 
-from chainlinks.models import ChainJob, ChainBlock
-from chainlinks.tasks import run_check_height
+from chainlinks.data.instrumentation import format_plan
+from chainlinks.models import ChainJob, ChainBlock, ChainProfile, SlowQuery, SERVICE_IDS, BLOCKCHAIN_IDS
+from chainlinks.tasks import check_single_engine
 
 
 SCHEDULE_BLOCK_LIMIT = 100
+KEYSET_VAR = 'before'
 
 # Hack until https://github.com/modlinltd/django-advanced-filters/issues/141
 class MyAdvancedFilterForm(AdvancedFilterForm):
@@ -23,23 +30,132 @@ class MyAdminAdvancedFiltersMixin(AdminAdvancedFiltersMixin):
     advanced_filter_form = MyAdvancedFilterForm
 
 
+class EstimatedCountPaginator(Paginator):
+    '''Paginator that reports the planner's row estimate instead of running COUNT(*)'''
+
+    @cached_property
+    def count(self):
+        return self.object_list.estimate_count()
+
+
+class KeysetChangeList(ChangeList):
+    '''Change list that pages with a (block_height, id) cursor instead of an OFFSET
+
+    Relies on the results being ordered by -block_height, -id, which the admin below enforces.
+    '''
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.keyset = tuple(int(x) for x in request.GET[KEYSET_VAR].split(':')) if KEYSET_VAR in request.GET else None
+        except ValueError:
+            self.keyset = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(KEYSET_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # changing filters or searching starts again from the newest block
+        return super().get_query_string({KEYSET_VAR: None} | (new_params or {}), remove)
+
+    def get_results(self, request):
+        queryset = self.queryset
+        if self.keyset is not None and len(self.keyset) == 2:
+            block_height, pk = self.keyset
+            queryset = queryset.filter(Q(block_height__lt=block_height) | Q(block_height=block_height, pk__lt=pk), block_height__lte=block_height)
+
+        result_list = queryset[:self.list_per_page]
+        last = result_list[len(result_list) - 1] if len(result_list) == self.list_per_page else None
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = last is not None or self.keyset is not None
+        self.newest_url = self.get_query_string() if self.keyset is not None else None
+        self.older_url = self.get_query_string({KEYSET_VAR: f'{last.block_height}:{last.pk}'}) if last is not None else None
+
+
+class ServiceIdListFilter(admin.SimpleListFilter):
+    '''Resolves the service to job ids so the filter pushes down to the job indexes'''
+
+    title = 'service id'
+    parameter_name = 'service_id'
+
+    def lookups(self, request, model_admin):
+        return SERVICE_IDS
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(job__in=list(ChainJob.objects.filter(service_id=self.value()).values_list('pk', flat=True)))
+
+
+class BlockchainIdListFilter(admin.SimpleListFilter):
+    '''Resolves the blockchain to job ids so the filter pushes down to the job indexes'''
+
+    title = 'blockchain id'
+    parameter_name = 'blockchain_id'
+
+    def lookups(self, request, model_admin):
+        return BLOCKCHAIN_IDS
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(job__in=list(ChainJob.objects.filter(blockchain_id=self.value()).values_list('pk', flat=True)))
+
+
 @admin.action(description=f'Schedule selected chain blocks (max {SCHEDULE_BLOCK_LIMIT})')
 def schedule_block(modeladmin, request, queryset):
     try:
-        for block in queryset[:SCHEDULE_BLOCK_LIMIT]:
-            job = block.job
-            run_check_height.delay(job.pk, block.pk, job.blockchain_id, block.block_height, job.service_id)
+        blocks = list(queryset.select_related('job')[:SCHEDULE_BLOCK_LIMIT])
+        check_single_engine.check_blocks_by_hand(blocks)
         modeladmin.message_user(request, 'Scheduled blocks successfully')
     except Exception as e:
         modeladmin.message_user(request, f'Error scheduling blocks error={e}')
 
 
+@admin.action(description='Recheck every height from the lowest to the highest selected, per job, unselected ones included')
+def recheck_range(modeladmin, request, queryset):
+    # the whole span is reset, not just the selected blocks, so that a range can be rechecked from its two ends; the
+    # reset is quick (the checks are dispatched by the jobs' passes), so it is done here, where a failure can be shown
+    try:
+        job_ranges = queryset.order_by().values('job').annotate(Min('block_height'), Max('block_height'))
+        reset_spans, failed_spans = list(), list()
+        for job_range in job_ranges:
+            span = f"job_id={job_range['job']} heights {job_range['block_height__min']}-{job_range['block_height__max']}"
+            reset_count = check_single_engine.recheck_range(job_range['job'], job_range['block_height__min'], job_range['block_height__max'])
+            if reset_count is None:
+                failed_spans.append(span)
+            else:
+                reset_spans.append(f'{span} ({reset_count} reset)')
+        if reset_spans:
+            modeladmin.message_user(request, f'Scheduled range recheck of {", ".join(reset_spans)} successfully')
+        if failed_spans:
+            modeladmin.message_user(request, f'Chain tip cannot be retrieved, nothing reset for {", ".join(failed_spans)}', level=messages.ERROR)
+    except Exception as e:
+        modeladmin.message_user(request, f'Error scheduling range recheck error={e}')
+
+
 class ChainBlockAdmin(MyAdminAdvancedFiltersMixin, NumericFilterModelAdmin):
-    list_display = ('blockchain_id', 'service_id', 'block_height', 'status', 'scheduled', 'completed')
-    ordering = ('job__service_id', 'job__blockchain_id', '-block_height')
-    list_filter = ('job__service_id', 'job__blockchain_id', ('block_height', RangeNumericFilter), 'status')
-    advanced_filter_fields = ('block_height', 'status', 'scheduled', 'completed',)
-    actions = [schedule_block]
+    list_display = ('blockchain_id', 'service_id', 'block_height', 'status', 'scheduled', 'completed', 'attempts', 'retry_after')
+    list_select_related = ('job',)
+    list_filter = (ServiceIdListFilter, BlockchainIdListFilter, 'job', ('block_height', RangeNumericFilter), 'status')
+    advanced_filter_fields = ('job', 'block_height', 'status',)
+    actions = [schedule_block, recheck_range]
+
+    # only the keyset order is served from an index, so other column sorts are disabled
+    ordering = ('-block_height', '-id')
+    sortable_by = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
     def blockchain_id(self, obj):
         return obj.job.blockchain_id
@@ -50,5 +166,48 @@ class ChainBlockAdmin(MyAdminAdvancedFiltersMixin, NumericFilterModelAdmin):
     service_id.short_description = 'Service id'
 
 
-admin.site.register(ChainJob)
+class ChainJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'enabled', 'visible', 'service_id', 'blockchain_id', 'verification_mode', 'anchor_interval', 'multi_target', 'inflight_max', 'inflight_auto', 'inflight_effective')
+    list_filter = ('enabled', 'visible', 'verification_mode', 'multi_target', 'service_id', 'blockchain_id')
+    readonly_fields = ('inflight_effective',)
+
+
+class ChainProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'job', 'task', 'duration')
+    list_filter = ('task', 'job')
+    list_select_related = ('job',)
+    fields = ('created', 'job', 'task', 'duration', 'phases', 'profile_text')
+    readonly_fields = fields
+    ordering = ('-created',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def profile_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.profile)
+    profile_text.short_description = 'Profile'
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created', 'model', 'method', 'duration_ms', 'execution_ms')
+    list_filter = ('model', 'method')
+    fields = ('created', 'model', 'method', 'duration_ms', 'execution_ms', 'sql_text', 'plan_text')
+    readonly_fields = fields
+    ordering = ('-created',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def sql_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.sql)
+    sql_text.short_description = 'SQL'
+
+    def plan_text(self, obj):
+        return format_html('<pre>{}</pre>', format_plan(obj.plan) if obj.plan else '')
+    plan_text.short_description = 'Plan'
+
+
+admin.site.register(ChainJob, ChainJobAdmin)
 admin.site.register(ChainBlock, ChainBlockAdmin)
+admin.site.register(ChainProfile, ChainProfileAdmin)
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from chainlinks.common.constants import BLOCKCHAIN_ID_BITCOIN_MAINNET, SERVICE_ID_BLOCKSET
+from chainlinks.common.constants import RESULT_STATUS_PEND, RESULT_STATUS_GOOD, RESULT_STATUS_BAD, RESULT_STATUS_FAIL
+from chainlinks.models import ChainJob, ChainBlock, ChainBlockFetch
+
+
+@dataclass
+class SyntheticChainSpec:
+    '''Shape of a synthetic job; every rate is the probability of a height (or island) being affected'''
+
+    heights: int
+    start_height: int = 0
+    hole_rate: float = 0.0
+    pending_rate: float = 0.001
+    bad_island_rate: float = 0.001
+    bad_island_length: int = 100
+    fail_share: float = 0.5
+    fetch_rate: float = 1.0
+    superseded_fetch_rate: float = 0.01
+    seed: int = 0
+
+    @property
+    def end_height(self):
+        return self.start_height + self.heights - 1
+
+    @property
+    def name(self):
+        return f'bench-{self.heights}-{self.seed}'
+
+
+class SyntheticChainGenerator:
+    '''Seeds a disabled, hidden job with blocks and fetches generated server side
+
+    Statuses are derived from hashes of the height (and of the island a height falls in) so that the same spec
+    always produces the same data, however many batches it is written in.
+    '''
+
+    BATCH_SIZE = 1_000_000
+    SUPERSEDED_FETCH_AGE = timedelta(days=30)
+
+    def __init__(self, progress=None) -> None:
+        self.progress = progress or (lambda message: None)
+
+    def generate(self, spec: SyntheticChainSpec) -> ChainJob:
+        now = timezone.now()
+        job = ChainJob.objects.create(
+            name=spec.name,
+            enabled=False,
+            visible=False,
+            service_id=SERVICE_ID_BLOCKSET,
+            blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=spec.start_height,
+            end_height=spec.end_height,
+            inflight_max=1000,
+            finality_depth=1,
+        )
+
+        for batch_start in range(spec.start_height, spec.end_height + 1, SyntheticChainGenerator.BATCH_SIZE):
+            batch_end = min(spec.end_height, batch_start + SyntheticChainGenerator.BATCH_SIZE - 1)
+            with transaction.atomic():
+                self._generate_blocks(job, spec, now, batch_start, batch_end)
+                self._generate_fetches(job, spec, now, batch_start, batch_end)
+            self.progress(f'Generated heights {batch_start} to {batch_end} for job_id={job.pk}')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {ChainBlock._meta.db_table}')
+            cursor.execute(f'ANALYZE {ChainBlockFetch._meta.db_table}')
+        return job
+
+    def _generate_blocks(self, job: ChainJob, spec: SyntheticChainSpec, now: datetime, batch_start: int, batch_end: int):
+        completed_never = datetime.utcfromtimestamp(0).replace(tzinfo=timezone.utc)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {ChainBlock._meta.db_table} (job_id, created, updated, scheduled, block_height, completed, status, fetch_id, attempts, retry_after)
+                SELECT %(job_id)s, %(now)s, %(now)s, %(now)s, block_height,
+                    CASE WHEN status = %(pend)s THEN %(completed_never)s ELSE %(now)s END, status, NULL,
+                    CASE WHEN status = %(pend)s THEN 0 ELSE 1 END, CASE WHEN status IN (%(bad)s, %(fail)s) THEN %(now)s END
+                FROM (
+                    SELECT block_height, CASE
+                        WHEN {self._rand('block_height', spec.seed + 1)} < %(pending_rate)s THEN %(pend)s
+                        WHEN {self._rand('block_height / %(island_length)s', spec.seed + 2)} < %(island_rate)s THEN
+                            CASE WHEN {self._rand('block_height / %(island_length)s', spec.seed + 3)} < %(fail_share)s THEN %(fail)s ELSE %(bad)s END
+                        ELSE %(good)s
+                    END AS status
+                    FROM generate_series(%(batch_start)s::bigint, %(batch_end)s::bigint) AS block_height
+                    WHERE {self._rand('block_height', spec.seed)} >= %(hole_rate)s
+                ) sb
+            ''', {
+                'job_id': job.pk, 'now': now, 'completed_never': completed_never,
+                'batch_start': batch_start, 'batch_end': batch_end,
+                'hole_rate': spec.hole_rate, 'pending_rate': spec.pending_rate,
+                'island_length': spec.bad_island_length, 'island_rate': spec.bad_island_rate, 'fail_share': spec.fail_share,
+                'pend': RESULT_STATUS_PEND, 'good': RESULT_STATUS_GOOD, 'bad': RESULT_STATUS_BAD, 'fail': RESULT_STATUS_FAIL,
+            })
+
+    def _generate_fetches(self, job: ChainJob, spec: SyntheticChainSpec, now: datetime, batch_start: int, batch_end: int):
+        with connection.cursor() as cursor:
+            # the fetch each completed block points at
+            cursor.execute(f'''
+                INSERT INTO {ChainBlockFetch._meta.db_table} (job_id, created, block_id,
+                    canonical_http_status, canonical_block_hash, canonical_prev_hash, canonical_txn_count,
+                    service_http_status, service_block_hash, service_prev_hash, service_txn_count)
+                SELECT job_id, %(now)s, id,
+                    200, md5(block_height::text), md5((block_height - 1)::text), 100,
+                    CASE WHEN status = %(fail)s THEN 503 ELSE 200 END,
+                    CASE WHEN status = %(bad)s THEN md5(block_height::text || 'x') ELSE md5(block_height::text) END,
+                    md5((block_height - 1)::text), 100
+                FROM {ChainBlock._meta.db_table}
+                WHERE job_id = %(job_id)s AND block_height >= %(batch_start)s AND block_height <= %(batch_end)s AND status <> %(pend)s
+                    AND ({self._rand('block_height', spec.seed + 4)} < %(fetch_rate)s OR status IN (%(bad)s, %(fail)s))
+            ''', {
+                'job_id': job.pk, 'now': now, 'batch_start': batch_start, 'batch_end': batch_end,
+                'fetch_rate': spec.fetch_rate, 'pend': RESULT_STATUS_PEND, 'bad': RESULT_STATUS_BAD, 'fail': RESULT_STATUS_FAIL,
+            })
+            cursor.execute(f'''
+                UPDATE {ChainBlock._meta.db_table} AS b SET fetch_id = f.id
+                FROM {ChainBlockFetch._meta.db_table} AS f
+                WHERE f.block_id = b.id AND b.job_id = %s AND b.block_height >= %s AND b.block_height <= %s
+            ''', [job.pk, batch_start, batch_end])
+
+            # older fetches that have since been replaced and are due to be cleaned up
+            cursor.execute(f'''
+                INSERT INTO {ChainBlockFetch._meta.db_table} (job_id, created, block_id,
+                    canonical_http_status, canonical_block_hash, canonical_prev_hash, canonical_txn_count,
+                    service_http_status, service_block_hash, service_prev_hash, service_txn_count)
+                SELECT job_id, %(superseded)s, id, 503, '', '', -1, 200, '', '', -1
+                FROM {ChainBlock._meta.db_table}
+                WHERE job_id = %(job_id)s AND block_height >= %(batch_start)s AND block_height <= %(batch_end)s
+                    AND {self._rand('block_height', spec.seed + 5)} < %(superseded_rate)s
+            ''', {
+                'job_id': job.pk, 'superseded': now - SyntheticChainGenerator.SUPERSEDED_FETCH_AGE,
+                'batch_start': batch_start, 'batch_end': batch_end, 'superseded_rate': spec.superseded_fetch_rate,
+            })
+
+    def _rand(self, expression: str, seed: int):
+        # uniform value in [0, 1) derived from an integer expression
+        return f"((hashtextextended(({expression})::text, {int(seed)}) & 2147483647)::float8 / 2147483648.0)"
@@ -0,0 +1,276 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from typing import Any, Callable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from chainlinks.common.constants import GOOD_STATUS_CODES, RESULT_STATUS_PEND, RESULT_STATUS_BAD, RESULT_STATUS_FAIL
+from chainlinks.common.constants import QUEUE_CONSUMER_TIP, QUEUE_CONSUMER_BACKFILL, QUEUE_CONSUMER_RETRY
+from chainlinks.domain.chainsources import get_chainsource, reset_chainsources
+from chainlinks.models import ChainJob, ChainBlock, ChainBlockFetch
+from chainlinks.tasks import check_single_engine
+from chainlinks.web.views import ServiceChainMatrixJsonView
+
+
+def describe_environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW server_version')
+        server_version = cursor.fetchone()[0]
+    return {'commit': commit, 'created': timezone.now().isoformat(), 'postgres_version': server_version}
+
+
+def measure(name: str, repeat: int, func: Callable[[], Any]):
+    timings, rows = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = func()
+        timings.append(time.perf_counter() - started)
+    return {
+        'name': name,
+        'repeat': repeat,
+        'rows': rows,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'max_s': max(timings),
+    }
+
+
+class QuerySetBenchmark:
+    '''Times the ChainBlock and ChainBlockFetch queryset methods against a (synthetic) job'''
+
+    def __init__(self, job: ChainJob, repeat: int) -> None:
+        self.job = job
+        self.repeat = repeat
+
+    def run(self):
+        job = self.job
+        start_height, end_height = job.start_height, job.end_height
+        # the step the matrix view would use for this job
+        step = ServiceChainMatrixJsonView()._compute_chainlinks_step(end_height - start_height + 1, ServiceChainMatrixJsonView.CHART_COLUMN_COUNT)
+
+        results = [
+            measure('find_all_islands', self.repeat, lambda: len(list(
+                ChainBlock.objects.find_all_islands(job.pk, start_height, end_height, [RESULT_STATUS_PEND, RESULT_STATUS_BAD, RESULT_STATUS_FAIL])))),
+            measure(f'find_status_counts_in_ranges[step={step}]', self.repeat, lambda: len(list(
+                ChainBlock.objects.find_status_counts_in_ranges(job.pk, start_height, end_height, step)))),
+            measure('count_pending_blocks', self.repeat, lambda:
+                ChainBlock.objects.count_pending_blocks(job.pk, start_height, end_height)),
+            measure('delete_superceded_fetches', self.repeat, self._delete_superceded_fetches),
+        ]
+        for check_for_holes in (False, True):
+            with override_settings(CHECK_FOR_HOLES=check_for_holes):
+                results.append(measure(f'has_holes[check_for_holes={check_for_holes}]', self.repeat, lambda:
+                    int(ChainBlock.objects.has_holes(job.pk, start_height, end_height))))
+                results.append(measure(f'find_all_gaps[check_for_holes={check_for_holes}]', self.repeat, lambda: len(list(
+                    ChainBlock.objects.find_all_gaps(job.pk, start_height, end_height)))))
+
+        return {
+            'environment': describe_environment(),
+            'dataset': self._describe_dataset(),
+            'results': results,
+        }
+
+    def _delete_superceded_fetches(self):
+        # measured inside a rolled back transaction so that every repetition sees the same data
+        with transaction.atomic():
+            ChainBlockFetch.objects.delete_superceded_fetches(timezone.now() - timedelta(days=7))
+            transaction.set_rollback(True)
+
+    def _describe_dataset(self):
+        return {
+            'job_id': self.job.pk,
+            'job_name': self.job.name,
+            'start_height': self.job.start_height,
+            'end_height': self.job.end_height,
+            'block_statuses': {
+                x['status']: x['count'] for x in ChainBlock.objects.filter(job=self.job).values('status').annotate(count=Count('id'))
+            },
+            'fetch_count': ChainBlockFetch.objects.filter(job=self.job).count(),
+        }
+
+
+class ChainSourceBenchmark:
+    '''Times fetching and parsing blocks from a chain source, typically replayed from a cassette'''
+
+    def __init__(self, service_id: str, blockchain_id: str, start_height: int, end_height: int, repeat: int) -> None:
+        self.service_id = service_id
+        self.blockchain_id = blockchain_id
+        self.start_height = start_height
+        self.end_height = end_height
+        self.repeat = repeat
+
+    def run(self):
+        chainsource = get_chainsource(self.service_id, self.blockchain_id)
+        heights = range(self.start_height, self.end_height + 1)
+        results = [
+            measure('get_chain', self.repeat, lambda: chainsource.get_chain().chain_height),
+            measure(f'get_block[heights={len(heights)}]', self.repeat, lambda: sum(
+                1 for height in heights if chainsource.get_block(height).status in GOOD_STATUS_CODES)),
+        ]
+        return {
+            'environment': describe_environment(),
+            'parameters': {
+                'service_id': self.service_id,
+                'blockchain_id': self.blockchain_id,
+                'start_height': self.start_height,
+                'end_height': self.end_height,
+                'cassette': settings.CHAINSOURCE_CASSETTE or None,
+                'cassette_mode': settings.CHAINSOURCE_CASSETTE_MODE if settings.CHAINSOURCE_CASSETTE else None,
+            },
+            'results': results,
+        }
+
+
+class WorkerThroughputBenchmark:
+    '''Checks every height of a fresh (disabled, hidden) job against a stub chain source or a cassette
+
+    The job is scheduled from this process, through the broker, while a worker consuming every lane, started with the
+    Procfile's options, does the checking; latencies are measured from a block being scheduled to it being completed.
+    The source settings (see CANONICAL_URL, CHAINSOURCE_CASSETTE, etc.) are applied to both processes.
+    '''
+
+    SCHEDULE_INTERVAL_S = 1.0
+    WORKER_START_TIMEOUT_S = 60
+    WORKER_STOP_TIMEOUT_S = 30
+
+    def __init__(self, source_settings: dict, blockchain_id: str, service_id: str, chain_height: int, heights: int,
+                 concurrency: int, inflight_max: int, timeout_s: float, worker_log: str, progress=None) -> None:
+        self.source_settings = source_settings
+        self.blockchain_id = blockchain_id
+        self.service_id = service_id
+        self.chain_height = chain_height
+        self.heights = heights
+        self.concurrency = concurrency
+        self.inflight_max = inflight_max
+        self.timeout_s = timeout_s
+        self.worker_log = worker_log
+        self.progress = progress or (lambda message: None)
+
+    def run(self):
+        job = ChainJob.objects.create(
+            name=f'bench-workers-{self.heights}',
+            enabled=False,
+            visible=False,
+            service_id=self.service_id,
+            blockchain_id=self.blockchain_id,
+            start_height=self.chain_height - self.heights + 1,
+            end_height=self.chain_height,
+            inflight_max=self.inflight_max,
+            finality_depth=1,
+        )
+
+        writes_before = self._count_table_writes()
+        worker = self._start_worker()
+        try:
+            with override_settings(**self.source_settings):
+                reset_chainsources()
+                try:
+                    completed = self._schedule(job)
+                finally:
+                    reset_chainsources()
+        finally:
+            # stopping the worker also flushes its table statistics
+            self._stop_worker(worker)
+        writes_after = self._count_table_writes()
+
+        results = self._describe_blocks(job)
+        results['completed'] = completed
+        results['db_rows_written'] = {table: writes_after[table] - writes_before.get(table, 0) for table in writes_after}
+        results['db_rows_written_per_s'] = sum(results['db_rows_written'].values()) / results['elapsed_s'] if results['elapsed_s'] else None
+        return {
+            'environment': describe_environment(),
+            'parameters': {
+                'blockchain_id': self.blockchain_id,
+                'service_id': self.service_id,
+                'heights': self.heights,
+                'concurrency': self.concurrency,
+                'inflight_max': self.inflight_max,
+            },
+            'dataset': {
+                'job_id': job.pk,
+                'block_statuses': {
+                    x['status']: x['count'] for x in ChainBlock.objects.filter(job=job).values('status').annotate(count=Count('id'))
+                },
+            },
+            'results': results,
+        }
+
+    def _schedule(self, job: ChainJob):
+        started = time.perf_counter()
+        while time.perf_counter() - started < self.timeout_s:
+            check_single_engine.check_chain(job.pk)
+            completed_count = ChainBlock.objects.filter(job=job).exclude(status=RESULT_STATUS_PEND).count()
+            self.progress(f'Checked {completed_count} of {self.heights} heights for job_id={job.pk}')
+            if completed_count >= self.heights:
+                return True
+            time.sleep(WorkerThroughputBenchmark.SCHEDULE_INTERVAL_S)
+        return False
+
+    def _start_worker(self):
+        with open(self.worker_log, 'w') as log_file:
+            worker = subprocess.Popen([
+                sys.executable, '-m', 'celery', '-A', 'server', 'worker', '-l', 'info', '-Q', ','.join((QUEUE_CONSUMER_TIP, QUEUE_CONSUMER_BACKFILL, QUEUE_CONSUMER_RETRY)),
+                '-P', 'gevent', '-Ofair', '-c', str(self.concurrency), '-n', f'bench-workers-{os.getpid()}@%h',
+                '--without-mingle', '--without-gossip', '--without-heartbeat',
+            ], cwd=settings.BASE_DIR, env=dict(os.environ, **self.source_settings), stdout=log_file, stderr=subprocess.STDOUT)
+
+        started = time.perf_counter()
+        while time.perf_counter() - started < WorkerThroughputBenchmark.WORKER_START_TIMEOUT_S:
+            if worker.poll() is not None:
+                raise RuntimeError(f'Worker exited with returncode={worker.returncode}, see {self.worker_log}')
+            with open(self.worker_log) as log_file:
+                if ' ready.' in log_file.read():
+                    return worker
+            time.sleep(0.5)
+        self._stop_worker(worker)
+        raise RuntimeError(f'Worker did not start within {WorkerThroughputBenchmark.WORKER_START_TIMEOUT_S}s, see {self.worker_log}')
+
+    def _stop_worker(self, worker: subprocess.Popen):
+        worker.terminate()
+        try:
+            worker.wait(WorkerThroughputBenchmark.WORKER_STOP_TIMEOUT_S)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+            worker.wait()
+
+    def _describe_blocks(self, job: ChainJob):
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT count(*),
+                    extract(epoch FROM max(completed) - min(scheduled)),
+                    percentile_cont(0.5) WITHIN GROUP (ORDER BY extract(epoch FROM completed - scheduled)),
+                    percentile_cont(0.99) WITHIN GROUP (ORDER BY extract(epoch FROM completed - scheduled)),
+                    max(extract(epoch FROM completed - scheduled))
+                FROM {ChainBlock._meta.db_table}
+                WHERE job_id = %s AND status <> %s
+            ''', [job.pk, RESULT_STATUS_PEND])
+            count, elapsed, p50, p99, maximum = cursor.fetchone()
+        elapsed = float(elapsed) if elapsed is not None else None
+        return {
+            'blocks_checked': count,
+            'elapsed_s': elapsed,
+            'blocks_per_s': count / elapsed if elapsed else None,
+            'latency_p50_s': p50,
+            'latency_p99_s': p99,
+            'latency_max_s': float(maximum) if maximum is not None else None,
+        }
+
+    def _count_table_writes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_stat_clear_snapshot()')
+            cursor.execute('''
+                SELECT relname, n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables WHERE relname IN (%s, %s)
+            ''', [ChainBlock._meta.db_table, ChainBlockFetch._meta.db_table])
+            return {relname: count for relname, count in cursor.fetchall()}
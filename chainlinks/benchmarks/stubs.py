@@ -0,0 +1,233 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlsplit
+
+
+@dataclass
+class StubChainSourceConfig:
+    '''Behaviour of the stub; error and throttle rates apply per request, the mismatch rate per height'''
+
+    chain_height: int = 1_000_000
+    latency_median_ms: float = 50.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    mismatch_rate: float = 0.0
+    txn_count_max: int = 100
+    seed: int = 0
+
+
+class StubChainSource:
+    '''A deterministic chain that every stubbed API agrees on, except for heights where the service is made to disagree
+
+    Block hashes lead with the height so that canonical lookups by hash need no index.
+    '''
+
+    def __init__(self, config: StubChainSourceConfig) -> None:
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+
+    def block_hash(self, height: int, prefix: str = '') -> str:
+        digest = hashlib.sha256(f'{self.config.seed}:{height}'.encode()).hexdigest()
+        return f'{prefix}{height:016x}{digest[:48]}'
+
+    def block_height(self, block_hash: str) -> Optional[int]:
+        try:
+            return int(block_hash[-64:][:16], 16)
+        except ValueError:
+            return None
+
+    def service_block_hash(self, height: int, prefix: str = '') -> str:
+        block_hash = self.block_hash(height, prefix)
+        return block_hash[:-8] + 'deadbeef' if self._is_mismatched(height) else block_hash
+
+    def txn_ids(self, height: int, prefix: str = ''):
+        txn_count = self._uniform(f'txns:{height}') * self.config.txn_count_max
+        return [f'{prefix}{height:016x}{index:048x}' for index in range(int(txn_count) + 1)]
+
+    def has_block(self, height: int) -> bool:
+        return 0 <= height <= self.config.chain_height
+
+    def next_delay(self) -> float:
+        if self.config.latency_median_ms <= 0:
+            return 0.0
+        with self.lock:
+            return self.random.lognormvariate(math.log(self.config.latency_median_ms / 1000), self.config.latency_sigma)
+
+    def next_fault(self) -> Optional[int]:
+        with self.lock:
+            sample = self.random.random()
+        if sample < self.config.error_rate:
+            return 503
+        if sample < self.config.error_rate + self.config.throttle_rate:
+            return 429
+        return None
+
+    def _is_mismatched(self, height: int) -> bool:
+        return self._uniform(f'mismatch:{height}') < self.config.mismatch_rate
+
+    def _uniform(self, key: str) -> float:
+        digest = hashlib.sha256(f'{self.config.seed}:{key}'.encode()).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class StubChainSourceHandler(BaseHTTPRequestHandler):
+    '''Serves the Canonical, Blockset and Infura URL shapes used by chainlinks.domain.chainsources'''
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately; don't let them wait on delayed acks
+    disable_nagle_algorithm = True
+
+    CANONICAL_CHAIN_PATH = re.compile(r'^/_coinnode/(?P<chain>[^/]+)/blockchain/?$')
+    CANONICAL_HEIGHT_PATH = re.compile(r'^/_coinnode/(?P<chain>[^/]+)/heights/(?P<height>\d+)$')
+    CANONICAL_BLOCK_PATH = re.compile(r'^/_coinnode/(?P<chain>[^/]+)/blocks/(?P<hash>[0-9a-fA-Fx]+)$')
+    BLOCKSET_CHAIN_PATH = re.compile(r'^/blockchain/(?P<chain>[^/]+)$')
+    BLOCKSET_BLOCK_PATH = re.compile(r'^/blocks/(?P<chain>[^/:]+):(?P<height>\d+)$')
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        source = self.server.source
+        if not self._before_response():
+            return
+
+        match = StubChainSourceHandler.CANONICAL_CHAIN_PATH.match(path)
+        if match:
+            return self._send_json(200, {'num_consensus_rounds': source.config.chain_height})
+
+        match = StubChainSourceHandler.CANONICAL_HEIGHT_PATH.match(path)
+        if match:
+            height = int(match['height'])
+            if not source.has_block(height):
+                return self._send_json(404, {})
+            return self._send_json(200, {'blockHash': source.block_hash(height)})
+
+        match = StubChainSourceHandler.CANONICAL_BLOCK_PATH.match(path)
+        if match:
+            height = source.block_height(match['hash'])
+            if height is None or not source.has_block(height) or source.block_hash(height) != match['hash']:
+                return self._send_json(404, {})
+            return self._send_json(200, {
+                'hash': source.block_hash(height),
+                'prevHash': source.block_hash(height - 1),
+                'height': height,
+                'transactions': source.txn_ids(height),
+            })
+
+        match = StubChainSourceHandler.BLOCKSET_CHAIN_PATH.match(path)
+        if match:
+            return self._send_json(200, {'block_height': source.config.chain_height})
+
+        match = StubChainSourceHandler.BLOCKSET_BLOCK_PATH.match(path)
+        if match:
+            height = int(match['height'])
+            prefix = self._hash_prefix(match['chain'])
+            if not source.has_block(height):
+                return self._send_json(404, {})
+            return self._send_json(200, {
+                'hash': source.service_block_hash(height, prefix),
+                'prev_hash': source.block_hash(height - 1, prefix),
+                'height': height,
+                'transaction_ids': source.txn_ids(height, prefix),
+            })
+
+        self._send_json(404, {})
+
+    def do_POST(self):
+        # Infura; the project id path segment is ignored
+        source = self.server.source
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            return self._send_json(400, {})
+        if not self._before_response():
+            return
+
+        method, params = body.get('method'), body.get('params', [])
+        if method == 'eth_blockNumber':
+            result = hex(source.config.chain_height)
+        elif method == 'eth_getBlockByNumber' and params:
+            height = int(params[0], 16)
+            result = {
+                'hash': source.block_hash(height, '0x'),
+                'parentHash': source.block_hash(height - 1, '0x'),
+                'number': hex(height),
+                'transactions': source.txn_ids(height, '0x'),
+            } if source.has_block(height) else None
+        else:
+            return self._send_json(200, {'jsonrpc': '2.0', 'id': body.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}})
+        self._send_json(200, {'jsonrpc': '2.0', 'id': body.get('id'), 'result': result})
+
+    def log_message(self, format, *args):
+        pass
+
+    def _before_response(self) -> bool:
+        source = self.server.source
+        time.sleep(source.next_delay())
+        status = source.next_fault()
+        if status is not None:
+            self._send_json(status, {})
+            return False
+        return True
+
+    def _hash_prefix(self, blockchain_id: str) -> str:
+        return '0x' if blockchain_id.startswith('ethereum-') else ''
+
+    def _send_json(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def create_stub_server(config: StubChainSourceConfig, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StubChainSourceHandler)
+    server.daemon_threads = True
+    server.source = StubChainSource(config)
+    return server
+
+
+def serve_stub(config: StubChainSourceConfig, host: str = '127.0.0.1', port: int = 0, ready=None):
+    '''Serves until interrupted; the bound port is put on the ready queue, if given, once requests can be accepted'''
+
+    server = create_stub_server(config, host, port)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def add_stub_arguments(parser):
+    parser.add_argument('--chain-height', type=int, default=1_000_000, help='height of the stubbed chain tip (default: 1000000)')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='median response latency (default: 50)')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='sigma of the lognormal latency distribution (default: 0.5)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of a request failing with a 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='probability of a request being throttled with a 429')
+    parser.add_argument('--mismatch-rate', type=float, default=0.0, help='probability of the service disagreeing on a height')
+    parser.add_argument('--txn-count-max', type=int, default=100, help='maximum transactions per block (default: 100)')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def stub_config_from_options(options) -> StubChainSourceConfig:
+    return StubChainSourceConfig(
+        chain_height=options['chain_height'],
+        latency_median_ms=options['latency_ms'],
+        latency_sigma=options['latency_sigma'],
+        error_rate=options['error_rate'],
+        throttle_rate=options['throttle_rate'],
+        mismatch_rate=options['mismatch_rate'],
+        txn_count_max=options['txn_count_max'],
+        seed=options['seed'],
+    )
@@ -6,6 +6,12 @@ SERVICE_ID_BLOCKSET = 'blockset'
 SERVICE_ID_INFURA = 'infura'
 
 
+# block checks are split into lanes, each with its own workers, so that following the tip never waits on backfill
+QUEUE_CONSUMER_TIP = 'consumer'
+QUEUE_CONSUMER_BACKFILL = 'consumer-backfill'
+QUEUE_CONSUMER_RETRY = 'consumer-retry'
+
+
 BLOCKCHAIN_ID_BITCOIN_MAINNET = 'bitcoin-mainnet'
 BLOCKCHAIN_ID_BITCOIN_TESTNET = 'bitcoin-testnet'
 BLOCKCHAIN_ID_BITCOINCASH_MAINNET = 'bitcoincash-mainnet'
@@ -26,5 +32,10 @@ RESULT_STATUS_BAD = 'bd'
 RESULT_STATUS_FAIL = 'fl'
 
 
+VERIFICATION_MODE_EXHAUSTIVE = 'exhaustive'
+VERIFICATION_MODE_SAMPLED = 'sampled'
+VERIFICATION_MODE_CONTINUITY = 'continuity'
+
+
 UNKNOWN_TXN_COUNT = -1
 UNKNOWN_HASH_VALUE = ''
@@ -0,0 +1,69 @@
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess, start_http_server
+
+
+# With PROMETHEUS_MULTIPROC_DIR set (it must be set before this module is imported, and emptied on start), each
+# process writes its samples there and whoever serves them aggregates across processes.
+
+
+CHAINSOURCE_REQUEST_SECONDS = Histogram(
+    'chainlinks_chainsource_request_seconds', 'Chain source request latency, from sending to the body read, retries and failed requests included',
+    ('service_id', 'blockchain_id'))
+CHAINSOURCE_RESPONSES = Counter(
+    'chainlinks_chainsource_responses', 'Chain source responses by HTTP status',
+    ('service_id', 'blockchain_id', 'status'))
+CHAINSOURCE_BREAKER_STATE = Gauge(
+    'chainlinks_chainsource_breaker_state', 'Circuit breaker state as of the last scheduler pass (0 closed, 1 half-open, 2 open)',
+    ('service_id', 'blockchain_id'), multiprocess_mode='livemostrecent')
+
+BLOCKS_VERIFIED = Counter(
+    'chainlinks_blocks_verified', 'Blocks checked, by outcome status',
+    ('service_id', 'blockchain_id', 'outcome'))
+
+JOB_INFLIGHT_MAX = Gauge(
+    'chainlinks_job_inflight_max', 'Most blocks a job may have pending',
+    ('job_id',), multiprocess_mode='livemostrecent')
+JOB_INFLIGHT_EFFECTIVE = Gauge(
+    'chainlinks_job_inflight_effective', 'Most blocks a job may have pending as of the last scheduler pass, once tuned',
+    ('job_id',), multiprocess_mode='livemostrecent')
+JOB_PENDING_BLOCKS = Gauge(
+    'chainlinks_job_pending_blocks', 'Blocks scheduled but not yet checked, as of the last scheduler pass',
+    ('job_id',), multiprocess_mode='livemostrecent')
+BLOCK_CHECKS_DROPPED = Counter(
+    'chainlinks_block_checks_dropped', 'Block checks dropped as duplicates of a later or running dispatch',
+    ('blockchain_id',))
+JOB_QUEUED_BLOCKS = Counter(
+    'chainlinks_job_queued_blocks', 'Blocks queued for checking, by reason',
+    ('job_id', 'reason'))
+
+SCHEDULER_PHASE_SECONDS = Histogram(
+    'chainlinks_scheduler_phase_seconds', 'Scheduler pass duration by phase',
+    ('blockchain_id', 'phase'))
+
+DB_QUERY_SECONDS = Histogram(
+    'chainlinks_db_query_seconds', 'Time spent in queryset methods, including consuming their results',
+    ('model', 'method'))
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def start_metrics_server(port: int):
+    start_http_server(port, registry=get_registry())
+
+
+def mark_process_dead(pid: int):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def chainsource_response_hook(service_id: str, blockchain_id: str):
+    def _observe(response, *args, **kwargs):
+        CHAINSOURCE_RESPONSES.labels(service_id, blockchain_id, response.status_code).inc()
+    return _observe
@@ -0,0 +1,170 @@
+import functools
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from types import GeneratorType
+
+from celery import signature
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import QuerySet
+
+from chainlinks.common.metrics import DB_QUERY_SECONDS
+
+
+SLOW_QUERY_EXPLAIN_INTERVAL_S = 300
+SLOW_QUERY_EXPLAIN_KEY = 'chainlinks.slow-query.{model}.{method}'
+
+# statements that write or lock rows are only planned, never run, as running them again would take their locks again
+READ_ONLY_STATEMENT = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+WRITE_OR_LOCK_CLAUSE = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE)\b|\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b', re.IGNORECASE)
+
+
+logger = logging.getLogger('chainlinks.data.instrumentation')
+
+
+def timed_query(method):
+    '''Records the time spent in a queryset method in DB_QUERY_SECONDS and captures its slow statements
+
+    Generators are timed while they are consumed and querysets are evaluated up front, so the time is that of the
+    query rather than of building it. Statements slower than SLOW_QUERY_THRESHOLD_MS are queued, on a sample, to be
+    explained (see record_slow_query).
+    '''
+
+    @functools.wraps(method)
+    def _timed_query(self, *args, **kwargs):
+        capture = _SlowStatementCapture(self.model.__name__, method.__name__)
+        histogram = DB_QUERY_SECONDS.labels(self.model.__name__, method.__name__)
+        started = time.perf_counter()
+        with capture.capturing():
+            result = method(self, *args, **kwargs)
+            if isinstance(result, QuerySet):
+                len(result)
+        if isinstance(result, GeneratorType):
+            return _timed_generator(histogram, capture, result, time.perf_counter() - started)
+        histogram.observe(time.perf_counter() - started)
+        capture.submit()
+        return result
+
+    return _timed_query
+
+
+def _timed_generator(histogram, capture, generator, elapsed: float):
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                with capture.capturing():
+                    item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        generator.close()
+        histogram.observe(elapsed)
+        capture.submit()
+
+
+class _SlowStatementCapture:
+    '''Keeps the slowest statement a queryset method ran above the threshold, with its parameters bound'''
+
+    def __init__(self, model: str, method: str) -> None:
+        self.model = model
+        self.method = method
+        self.slowest = None
+
+    @contextmanager
+    def capturing(self):
+        if settings.SLOW_QUERY_THRESHOLD_MS <= 0:
+            yield
+            return
+        with connection.execute_wrapper(self._execute):
+            yield
+
+    def submit(self):
+        if self.slowest is None or random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+            return
+        # at most one explain per method and interval, however often it runs slow
+        if not cache.add(SLOW_QUERY_EXPLAIN_KEY.format(model=self.model, method=self.method), True, SLOW_QUERY_EXPLAIN_INTERVAL_S):
+            return
+
+        duration_ms, sql = self.slowest
+        try:
+            signature('chainlinks.tasks.explain_slow_query').apply_async(args=(self.model, self.method, duration_ms, sql))
+        except Exception as e:
+            logger.warning(f'Unable to queue explain for model={self.model} and method={self.method} error={e}')
+
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if not many and duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS and (self.slowest is None or duration_ms > self.slowest[0]):
+                self.slowest = (duration_ms, context['cursor'].mogrify(sql, params).decode())
+
+
+def explain_query(sql: str):
+    '''EXPLAIN (ANALYZE, BUFFERS) a read-only statement, or only EXPLAIN one that writes or locks rows
+
+    Either way it runs in a transaction that is rolled back.
+    '''
+
+    if is_read_only(sql):
+        explain = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)'
+    else:
+        explain = 'EXPLAIN (FORMAT JSON)'
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS])
+            cursor.execute(f'{explain} {sql}')
+            plan = cursor.fetchone()[0]
+        transaction.set_rollback(True)
+    return plan[0] if isinstance(plan, list) else plan
+
+
+def is_read_only(sql: str) -> bool:
+    return bool(READ_ONLY_STATEMENT.match(sql)) and not WRITE_OR_LOCK_CLAUSE.search(sql)
+
+
+def record_slow_query(model: str, method: str, duration_ms: float, sql: str):
+    from chainlinks.models import SlowQuery
+
+    try:
+        plan = explain_query(sql)
+    except DatabaseError as e:
+        logger.warning(f'Unable to explain slow query for model={model} and method={method} error={e}')
+        plan = None
+
+    return SlowQuery.objects.create(
+        model=model,
+        method=method,
+        duration_ms=duration_ms,
+        sql=sql,
+        plan=plan,
+        execution_ms=plan.get('Execution Time') if plan else None,
+    )
+
+
+def format_plan(plan: dict):
+    '''Renders a JSON plan as indented lines, one per node'''
+
+    def _format_node(node: dict, depth: int):
+        relation = f" on {node['Relation Name']}" if 'Relation Name' in node else ''
+        index = f" using {node['Index Name']}" if 'Index Name' in node else ''
+        if 'Actual Rows' in node:
+            buffers = f"shared hit={node.get('Shared Hit Blocks', 0)} read={node.get('Shared Read Blocks', 0)}"
+            yield (f"{'  ' * depth}-> {node['Node Type']}{index}{relation} "
+                   f"(rows={node.get('Plan Rows')} actual rows={node.get('Actual Rows')} loops={node.get('Actual Loops')} "
+                   f"time={node.get('Actual Total Time')}ms {buffers})")
+        else:
+            yield f"{'  ' * depth}-> {node['Node Type']}{index}{relation} (rows={node.get('Plan Rows')} cost={node.get('Total Cost')})"
+        for child in node.get('Plans', []):
+            yield from _format_node(child, depth + 1)
+
+    return '\n'.join(_format_node(plan['Plan'], 0))
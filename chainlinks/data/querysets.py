@@ -1,13 +1,18 @@
 from datetime import datetime
 import itertools
-from typing import Any, List
+from typing import Any, List, Optional, Tuple
 
 from django.conf import settings
 from django.db import connection, models
+from django.utils import timezone
 
-from chainlinks.common.constants import RESULT_STATUS_PEND, RESULT_STATUS_BAD, RESULT_STATUS_FAIL
+from chainlinks.common.constants import RESULT_STATUS_PEND, RESULT_STATUS_GOOD, RESULT_STATUS_BAD, RESULT_STATUS_FAIL
+from chainlinks.data.instrumentation import timed_query
 
 
+# when a pending block that was reset to be checked again, but not dispatched yet, was scheduled
+SCHEDULED_NEVER = datetime.utcfromtimestamp(0).replace(tzinfo=timezone.utc)
+
 
 class ChainJobQuerySet(models.QuerySet):
 
@@ -17,6 +22,9 @@ class ChainJobQuerySet(models.QuerySet):
     def find_all_visible(self):
         return self.filter(visible=True)
 
+    def find_all_multi_target(self, blockchain_id: str):
+        return self.filter(enabled=True, multi_target=True, blockchain_id=blockchain_id)
+
 
 class ChainBlockQuerySet(models.QuerySet):
 
@@ -24,6 +32,7 @@ class ChainBlockQuerySet(models.QuerySet):
     def table_name(self):
         return self.model._meta.db_table
 
+    @timed_query
     def find_status_counts_in_ranges(self, job_pk, start_inclusive, end_inclusive, step):
         with connection.cursor() as cursor:
             cursor.execute(f'''
@@ -34,6 +43,7 @@ class ChainBlockQuerySet(models.QuerySet):
             for status, range_start, range_count in cursor:
                 yield (status, range_start, range_count)
 
+    @timed_query
     def find_all_islands(self, job_pk: Any, start_inclusive: int, end_inclusive: int, status_list: List[str]):
         with connection.cursor() as cursor:
             cursor.execute(f'''
@@ -48,6 +58,33 @@ class ChainBlockQuerySet(models.QuerySet):
             for (status, island_start, island_end) in cursor:
                 yield (status, island_start, island_end)
 
+    @timed_query
+    def find_islands_page(self, job_pk: Any, start_inclusive: int, end_inclusive: int, status_list: List[str], limit: int):
+        # only island boundaries are returned so the scan stops as soon as the page is complete
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT status, block_height, is_island_start, is_island_end
+                FROM (
+                    SELECT status, block_height,
+                        LAG(block_height) OVER w IS DISTINCT FROM block_height - 1 OR LAG(status) OVER w IS DISTINCT FROM status AS is_island_start,
+                        LEAD(block_height) OVER w IS DISTINCT FROM block_height + 1 OR LEAD(status) OVER w IS DISTINCT FROM status AS is_island_end
+                    FROM {self.table_name}
+                    WHERE job_id = %s AND block_height >= %s AND block_height <= %s AND status IN %s
+                    WINDOW w AS (ORDER BY block_height ASC)
+                ) nh
+                WHERE is_island_start OR is_island_end ORDER BY block_height LIMIT %s
+            ''', [job_pk, start_inclusive, end_inclusive, tuple(status_list), 2 * limit])
+            island_start, island_count = None, 0
+            for (status, block_height, is_island_start, is_island_end) in cursor:
+                if is_island_start:
+                    island_start = block_height
+                if is_island_end and island_start is not None:
+                    yield (status, island_start, block_height)
+                    island_start, island_count = None, island_count + 1
+                    if island_count == limit:
+                        return
+
+    @timed_query
     def has_holes(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
         min_block_height, max_block_height = self.find_block_height_range(job_pk, start_inclusive, end_inclusive)
 
@@ -59,6 +96,7 @@ class ChainBlockQuerySet(models.QuerySet):
 
         return self.find_block_height_count(job_pk, min_block_height, max_block_height) != (max_block_height - min_block_height + 1)
 
+    @timed_query
     def find_all_gaps(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
         # get the min and max block we have tracked
         min_block_height, max_block_height = self.find_block_height_range(job_pk, start_inclusive, end_inclusive)
@@ -91,6 +129,7 @@ class ChainBlockQuerySet(models.QuerySet):
                     for gap_start, gap_end in cursor:
                         yield (gap_start, gap_end)
 
+    @timed_query
     def find_all_gap_heights(self, job_pk: Any, start_inclusive: int, end_inclusive: int, limit: int):
         def _find_all_gap_heights():
             for gap_start, gap_end in self.find_all_gaps(job_pk, start_inclusive, end_inclusive):
@@ -98,23 +137,137 @@ class ChainBlockQuerySet(models.QuerySet):
                     yield gap_index
         yield from itertools.islice(_find_all_gap_heights(), limit)
 
+    @timed_query
+    def find_all_job_work(self, job_ranges: List[Tuple[Any, int, int, int]], scheduled_before: datetime, retry_before: datetime):
+        # for each (job, start, end, gap_start), whether a scheduler pass would find gaps from gap_start, or expired
+        # pending blocks, blocks reset to be rechecked or blocks due a retry from start, up to end, all in one statement
+        # however many jobs there are; gaps are found as in has_holes
+        if not job_ranges:
+            return
+        job_pks, starts, ends, gap_starts = zip(*job_ranges)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT j.job_id, r.min_height, r.max_height,
+                    CASE WHEN %(count_heights)s AND r.min_height IS NOT NULL THEN (
+                        SELECT COUNT(*) FROM {self.table_name} WHERE job_id = j.job_id AND block_height >= r.min_height AND block_height <= r.max_height
+                    ) END AS height_count,
+                    EXISTS (
+                        SELECT 1 FROM {self.table_name} WHERE job_id = j.job_id AND status = %(pending)s
+                            AND block_height >= j.start_height AND block_height <= j.end_height AND scheduled <= %(scheduled_before)s AND scheduled > %(never)s
+                    ) AS has_expired,
+                    EXISTS (
+                        SELECT 1 FROM {self.table_name} WHERE job_id = j.job_id AND status = %(pending)s
+                            AND block_height >= j.start_height AND block_height <= j.end_height AND scheduled = %(never)s
+                    ) AS has_rechecks,
+                    EXISTS (
+                        SELECT 1 FROM {self.table_name} WHERE job_id = j.job_id AND status IN %(unsuccessful)s
+                            AND block_height >= j.start_height AND block_height <= j.end_height AND retry_after <= %(retry_before)s
+                    ) AS has_retries
+                FROM unnest(%(job_ids)s::integer[], %(starts)s::bigint[], %(ends)s::bigint[], %(gap_starts)s::bigint[]) AS j(job_id, start_height, end_height, gap_start)
+                CROSS JOIN LATERAL (
+                    SELECT MIN(block_height) AS min_height, MAX(block_height) AS max_height
+                    FROM {self.table_name} WHERE job_id = j.job_id AND block_height >= j.gap_start AND block_height <= j.end_height
+                ) r
+            ''', {
+                'job_ids': list(job_pks), 'starts': list(starts), 'ends': list(ends), 'gap_starts': list(gap_starts), 'count_heights': settings.CHECK_FOR_HOLES,
+                'pending': RESULT_STATUS_PEND, 'unsuccessful': (RESULT_STATUS_BAD, RESULT_STATUS_FAIL),
+                'scheduled_before': scheduled_before, 'retry_before': retry_before, 'never': SCHEDULED_NEVER,
+            })
+            ranges = {job_pk: (gap_start, end) for job_pk, _, end, gap_start in job_ranges}
+            for job_pk, min_height, max_height, height_count, has_expired, has_rechecks, has_retries in cursor:
+                start_inclusive, end_inclusive = ranges[job_pk]
+                has_gaps = start_inclusive <= end_inclusive and (
+                    min_height is None or min_height != start_inclusive or max_height != end_inclusive or
+                    (height_count is not None and height_count != max_height - min_height + 1))
+                yield (job_pk, has_gaps, has_expired, has_rechecks, has_retries)
+
+    @timed_query
+    def find_bucket_counts(self, job_pk: Any, bucket_ranges: List[Tuple[int, int, int]]):
+        # for each (bucket_start, low, high), the blocks between low and high and, of those, the bad and the good ones
+        if not bucket_ranges:
+            return
+        bucket_starts, lows, highs = zip(*bucket_ranges)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT b.bucket_start, COUNT(c.id) AS block_count,
+                    COUNT(c.id) FILTER (WHERE c.status = %(bad)s) AS bad_count, COUNT(c.id) FILTER (WHERE c.status = %(good)s) AS good_count
+                FROM unnest(%(bucket_starts)s::bigint[], %(lows)s::bigint[], %(highs)s::bigint[]) AS b(bucket_start, low, high)
+                LEFT JOIN {self.table_name} c ON c.job_id = %(job_id)s AND c.block_height >= b.low AND c.block_height <= b.high
+                GROUP BY b.bucket_start ORDER BY b.bucket_start
+            ''', {
+                'job_id': job_pk, 'bucket_starts': list(bucket_starts), 'lows': list(lows), 'highs': list(highs),
+                'bad': RESULT_STATUS_BAD, 'good': RESULT_STATUS_GOOD,
+            })
+            for bucket_start, block_count, bad_count, good_count in cursor:
+                yield (bucket_start, block_count, bad_count, good_count)
+
+    @timed_query
+    def find_block_at(self, job_pk: Any, block_height: int):
+        return self.select_related('fetch').filter(job=job_pk, block_height=block_height).first()
+
+    @timed_query
+    def find_missing_heights(self, job_pk: Any, start_inclusive: int, end_inclusive: int, limit: int):
+        # every height of the range without a block, holes included whatever CHECK_FOR_HOLES says; meant for ranges
+        # of a bucket's size rather than a whole job
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT h FROM generate_series(%s::bigint, %s::bigint) AS h
+                WHERE NOT EXISTS (SELECT 1 FROM {self.table_name} WHERE job_id = %s AND block_height = h)
+                ORDER BY h LIMIT %s
+            ''', [start_inclusive, end_inclusive, job_pk, limit])
+            return [height for height, in cursor]
+
+    @timed_query
+    def find_existing_heights(self, job_pk: Any, heights: List[int]):
+        return self.filter(job=job_pk, block_height__in=heights).values_list('block_height', flat=True)
+
+    @timed_query
     def count_pending_blocks(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
+        # pending blocks reset to be rechecked don't count until they are dispatched
         return self.filter(
             job=job_pk,
             status=RESULT_STATUS_PEND,
             block_height__gte=start_inclusive,
             block_height__lte=end_inclusive,
+            scheduled__gt=SCHEDULED_NEVER,
         ).count()
 
-    def find_all_unsuccessful_blocks(self, job_pk: Any, start_inclusive: int, end_inclusive: int, limit: int, completed_before: datetime):
+    @timed_query
+    def find_all_unsuccessful_blocks(self, job_pk: Any, start_inclusive: int, end_inclusive: int, limit: int, retry_before: datetime):
+        # longest overdue first, which is the order of the cb_job_retry_after index
         return self.filter(
             job=job_pk,
             status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL),
             block_height__gte=start_inclusive,
             block_height__lte=end_inclusive,
-            completed__lte=completed_before,
-        ).order_by('block_height')[:limit]
-
+            retry_after__lte=retry_before,
+        ).order_by('retry_after')[:limit]
+
+    @timed_query
+    def complete_block(self, block_pk: Any, status: str, fetch_pk: Any, completed: datetime,
+                       retry_base_s: Optional[float] = None, retry_cap_s: Optional[float] = None, retry_scale: float = 1.0,
+                       attempts_max: Optional[int] = None):
+        # the retry delay doubles with each attempt before this one, from the base up to the cap, and is then scaled
+        # (for jitter); without a base, or once attempts_max is reached, the block isn't retried. The status the block
+        # had before is returned (None if it is gone)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {self.table_name} AS b SET status = %(status)s, completed = %(completed)s, updated = %(completed)s, fetch_id = %(fetch_id)s,
+                    attempts = b.attempts + 1,
+                    retry_after = CASE WHEN %(retry_base_s)s::float IS NOT NULL AND (%(attempts_max)s::integer IS NULL OR b.attempts + 1 < %(attempts_max)s::integer)
+                        THEN %(completed)s + make_interval(secs => LEAST(%(retry_cap_s)s::float, %(retry_base_s)s::float * power(2, LEAST(b.attempts, 32))) * %(retry_scale)s)
+                        ELSE NULL END
+                FROM (SELECT id, status FROM {self.table_name} WHERE id = %(block_id)s FOR UPDATE) AS previous
+                WHERE b.id = previous.id
+                RETURNING previous.status
+            ''', {
+                'status': status, 'completed': completed, 'fetch_id': fetch_pk, 'block_id': block_pk,
+                'retry_base_s': retry_base_s, 'retry_cap_s': retry_cap_s, 'retry_scale': retry_scale, 'attempts_max': attempts_max,
+            })
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @timed_query
     def find_all_pending_blocks(self, job_pk: Any, start_inclusive: int, end_inclusive: int, limit: int, scheduled_before: datetime):
         return self.filter(
             job=job_pk,
@@ -122,8 +275,83 @@ class ChainBlockQuerySet(models.QuerySet):
             block_height__gte=start_inclusive,
             block_height__lte=end_inclusive,
             scheduled__lte=scheduled_before,
+            scheduled__gt=SCHEDULED_NEVER,
+        ).order_by('block_height')[:limit]
+
+    @timed_query
+    def find_all_recheck_blocks(self, job_pk: Any, start_inclusive: int, end_inclusive: int, limit: int):
+        return self.filter(
+            job=job_pk,
+            status=RESULT_STATUS_PEND,
+            block_height__gte=start_inclusive,
+            block_height__lte=end_inclusive,
+            scheduled=SCHEDULED_NEVER,
         ).order_by('block_height')[:limit]
 
+    @timed_query
+    def find_all_scheduled_blocks(self, job_pks: List[Any], heights: List[int], scheduled: datetime):
+        return self.filter(
+            job__in=job_pks,
+            status=RESULT_STATUS_PEND,
+            block_height__in=heights,
+            scheduled=scheduled,
+        ).order_by('block_height')
+
+    @timed_query
+    def find_unsuccessful_blocks_before(self, job_pk: Any, before_exclusive: int, limit: int):
+        return self.filter(
+            job=job_pk,
+            status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL),
+            block_height__lt=before_exclusive,
+        ).order_by('-block_height')[:limit]
+
+    @timed_query
+    def find_unsuccessful_blocks_after(self, job_pk: Any, after_exclusive: int, limit: int):
+        return self.filter(
+            job=job_pk,
+            status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL),
+            block_height__gt=after_exclusive,
+        ).order_by('block_height')[:limit]
+
+    @timed_query
+    def estimate_count(self):
+        # planner statistics; avoids the full scan an exact COUNT(*) needs on large tables
+        with connection.cursor() as cursor:
+            if not self.query.where:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [self.table_name])
+                reltuples = cursor.fetchone()[0]
+                if reltuples >= 0:
+                    return reltuples
+
+            sql, params = self.order_by().query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        return plan[0]['Plan']['Plan Rows']
+
+    @timed_query
+    def reset_blocks_in_range(self, job_pk: Any, start_inclusive: int, end_inclusive: int, status_list: Optional[List[str]], updated: datetime):
+        # set-based so that arbitrarily large ranges can be reset in one statement; without a status
+        # filter every height in the range is reset, including ones that were never tracked. The blocks are left
+        # pending but never scheduled, for scheduler passes to dispatch as the job has room for them
+        completed = datetime.utcfromtimestamp(0).replace(tzinfo=timezone.utc)
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {self.table_name} SET status = %s, scheduled = %s, completed = %s, updated = %s, fetch_id = NULL, attempts = 0, retry_after = NULL
+                WHERE job_id = %s AND block_height >= %s AND block_height <= %s {'AND status IN %s' if status_list else ''}
+            ''', [RESULT_STATUS_PEND, SCHEDULED_NEVER, completed, updated, job_pk, start_inclusive, end_inclusive] + ([tuple(status_list)] if status_list else []))
+            reset_count = cursor.rowcount
+
+            if not status_list:
+                cursor.execute(f'''
+                    INSERT INTO {self.table_name} (job_id, created, updated, scheduled, block_height, completed, status, fetch_id, attempts, retry_after)
+                    SELECT %s, %s, %s, %s, block_height, %s, %s, NULL, 0, NULL FROM generate_series(%s::bigint, %s::bigint) AS block_height
+                    ON CONFLICT (job_id, block_height) DO NOTHING
+                ''', [job_pk, updated, updated, SCHEDULED_NEVER, completed, RESULT_STATUS_PEND, start_inclusive, end_inclusive])
+                reset_count += cursor.rowcount
+
+        return reset_count
+
+    @timed_query
     def find_min_block_height(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
         res = self.filter(
             job=job_pk,
@@ -132,6 +360,7 @@ class ChainBlockQuerySet(models.QuerySet):
         ).order_by('block_height').only('block_height').first()
         return res.block_height if res else None
 
+    @timed_query
     def find_max_block_height(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
         res = self.filter(
             job=job_pk,
@@ -140,6 +369,7 @@ class ChainBlockQuerySet(models.QuerySet):
         ).order_by('-block_height').only('block_height').first()
         return res.block_height if res else None
 
+    @timed_query
     def find_block_height_range(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
         res = self.filter(
             job=job_pk,
@@ -151,6 +381,7 @@ class ChainBlockQuerySet(models.QuerySet):
         )
         return (res['block_height__min'], res['block_height__max'])
 
+    @timed_query
     def find_block_height_count(self, job_pk: Any, start_inclusive: int, end_inclusive: int):
         res = self.filter(
             job=job_pk,
@@ -168,6 +399,7 @@ class ChainBlockFetchQuerySet(models.QuerySet):
     def table_name(self):
         return self.model._meta.db_table
 
+    @timed_query
     def delete_superceded_fetches(self, cutoff: datetime):
         with connection.cursor() as cursor:
             cursor.execute(f'''
@@ -0,0 +1,293 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+from django.conf import settings
+
+from chainlinks.common.constants import RESULT_STATUS_BAD, RESULT_STATUS_FAIL
+
+
+BLOCK_STATUS_CHANNEL = 'chainlinks.block-status'
+BLOCK_STATUS_VERSION_KEY = 'chainlinks.block-status.version.{job_pk}'
+BLOCK_STATUS_FAILURE_VERSION_KEY = 'chainlinks.block-status.failure-version.{job_pk}'
+
+BLOCK_FAILURES_KEY = 'chainlinks.block-failures'
+BLOCK_FAILURE_HEIGHTS_KEY = 'chainlinks.block-failures.heights.{job_pk}.{reason}'
+BLOCK_FAILURE_SAMPLE_KEY = 'chainlinks.block-failures.sample.{job_pk}.{reason}'
+# failures outlive a missed report or two, but not a reporter that isn't running at all
+BLOCK_FAILURE_EXPIRY_S = 24 * 60 * 60
+
+BLOCK_LEASE_KEY = 'chainlinks.block-lease.{block_pk}'
+
+JOB_INFLIGHT_KEY = 'chainlinks.job-inflight.{job_pk}'
+
+JOB_OWNER_KEY = 'chainlinks.job-owner.{job_pk}'
+
+SCHEDULER_NODES_KEY = 'chainlinks.scheduler-nodes'
+
+JOB_COMPLETIONS_KEY = 'chainlinks.job-completions.{job_pk}'
+JOB_COMPLETIONS_EXPIRY_S = 24 * 60 * 60
+
+JOB_FILLED_BUCKETS_KEY = 'chainlinks.job-filled-buckets.{job_pk}'
+
+
+_clients = dict()
+
+def get_redis() -> redis.Redis:
+    global _clients
+    if settings.REDIS_URL not in _clients:
+        _clients[settings.REDIS_URL] = redis.Redis.from_url(settings.REDIS_URL)
+    return _clients[settings.REDIS_URL]
+
+
+class BlockStatusChannel:
+    '''Block status transitions, published as (height, from_status, to_status) deltas per job
+
+    Every publish also bumps the job's data version, which lets readers cache anything derived from block statuses,
+    and its failure version when a block went bad or failed, or stopped being so, for readers of failures alone.
+    '''
+
+    FAILURE_STATUSES = (RESULT_STATUS_BAD, RESULT_STATUS_FAIL)
+
+    def publish(self, job_pk: Any, deltas: Iterable[Tuple[int, Optional[str], str]]):
+        deltas = [[height, from_status, to_status] for height, from_status, to_status in deltas if from_status != to_status]
+        if deltas:
+            pipeline = get_redis().pipeline(transaction=False)
+            pipeline.incr(BLOCK_STATUS_VERSION_KEY.format(job_pk=job_pk))
+            if any(from_status in BlockStatusChannel.FAILURE_STATUSES or to_status in BlockStatusChannel.FAILURE_STATUSES for _, from_status, to_status in deltas):
+                pipeline.incr(BLOCK_STATUS_FAILURE_VERSION_KEY.format(job_pk=job_pk))
+            pipeline.publish(BLOCK_STATUS_CHANNEL, json.dumps({'job_id': job_pk, 'deltas': deltas}))
+            pipeline.execute()
+
+    def publish_reset(self, job_pk: Any):
+        # for bulk changes where per-height deltas are unknown; listeners reload the job instead
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.incr(BLOCK_STATUS_VERSION_KEY.format(job_pk=job_pk))
+        pipeline.incr(BLOCK_STATUS_FAILURE_VERSION_KEY.format(job_pk=job_pk))
+        pipeline.publish(BLOCK_STATUS_CHANNEL, json.dumps({'job_id': job_pk, 'deltas': [], 'reset': True}))
+        pipeline.execute()
+
+    def version(self, job_pk: Any) -> int:
+        return int(get_redis().get(BLOCK_STATUS_VERSION_KEY.format(job_pk=job_pk)) or 0)
+
+    def failure_version(self, job_pk: Any) -> int:
+        return int(get_redis().get(BLOCK_STATUS_FAILURE_VERSION_KEY.format(job_pk=job_pk)) or 0)
+
+    def listen(self):
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(BLOCK_STATUS_CHANNEL)
+        try:
+            for message in pubsub.listen():
+                yield json.loads(message['data'])
+        finally:
+            pubsub.close()
+
+
+class BlockFailureBuffer:
+    '''Heights that failed their check, per job and failure reason, held until the next report drains them
+
+    Along with the heights, the first failure of each reason since the last drain is kept as a sample.
+    '''
+
+    def add(self, job_pk: Any, reason: str, height: int, sample: dict):
+        heights_key = BLOCK_FAILURE_HEIGHTS_KEY.format(job_pk=job_pk, reason=reason)
+        sample_key = BLOCK_FAILURE_SAMPLE_KEY.format(job_pk=job_pk, reason=reason)
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.zadd(heights_key, {height: height})
+        pipeline.expire(heights_key, BLOCK_FAILURE_EXPIRY_S)
+        pipeline.set(sample_key, json.dumps(dict(sample, failed=time.time())), nx=True, ex=BLOCK_FAILURE_EXPIRY_S)
+        pipeline.sadd(BLOCK_FAILURES_KEY, json.dumps([job_pk, reason]))
+        pipeline.execute()
+
+    def pending(self) -> List[Tuple[Any, str]]:
+        return [tuple(json.loads(member)) for member in get_redis().smembers(BLOCK_FAILURES_KEY)]
+
+    def drain(self, job_pk: Any, reason: str) -> Tuple[List[int], Optional[dict]]:
+        heights_key = BLOCK_FAILURE_HEIGHTS_KEY.format(job_pk=job_pk, reason=reason)
+        sample_key = BLOCK_FAILURE_SAMPLE_KEY.format(job_pk=job_pk, reason=reason)
+        pipeline = get_redis().pipeline(transaction=True)
+        pipeline.srem(BLOCK_FAILURES_KEY, json.dumps([job_pk, reason]))
+        pipeline.zrange(heights_key, 0, -1, withscores=True)
+        pipeline.get(sample_key)
+        pipeline.delete(heights_key, sample_key)
+        _, heights, sample, _ = pipeline.execute()
+        return [int(score) for _, score in heights], json.loads(sample) if sample else None
+
+
+class BlockDispatchLease:
+    '''Which of the messages queued to check a block may run: the last one queued, and only once
+
+    Every dispatch leases the block under a new token, carried by its message, and a check only runs if it can claim
+    the lease with that token. Messages made stale by a later dispatch, or that were delivered twice, are dropped. A
+    message that outlived its lease still runs, as nothing later superseded it; dropping it would leave its block
+    pending until it expires and is requeued.
+    '''
+
+    def take(self, block_pks: Iterable[Any], expiry: timedelta) -> Dict[Any, str]:
+        tokens = {block_pk: uuid.uuid4().hex for block_pk in block_pks}
+        pipeline = get_redis().pipeline(transaction=False)
+        for block_pk, token in tokens.items():
+            pipeline.set(BLOCK_LEASE_KEY.format(block_pk=block_pk), token, ex=expiry)
+        pipeline.execute()
+        return tokens
+
+    def claim(self, block_pk: Any, token: str, expiry: timedelta) -> bool:
+        key = BLOCK_LEASE_KEY.format(block_pk=block_pk)
+        with get_redis().pipeline(transaction=True) as pipeline:
+            try:
+                pipeline.watch(key)
+                current = pipeline.get(key)
+                if current is not None and current != token.encode():
+                    return False
+                pipeline.multi()
+                pipeline.set(key, f'{token}:claimed', ex=expiry)
+                pipeline.execute()
+                return True
+            except redis.WatchError:
+                # leased again, or claimed by another delivery, since it was read
+                return False
+
+
+class JobInflightCounter:
+    '''The number of a job's blocks that are pending and dispatched, kept as they are scheduled and completed
+
+    Unknown (None) until it is first set from the database, which is also how drift is corrected; counting from
+    nothing, after the key was lost, would miss the blocks that were already pending.
+    '''
+
+    def get(self, job_pk: Any) -> Optional[int]:
+        count, known = get_redis().hmget(JOB_INFLIGHT_KEY.format(job_pk=job_pk), 'count', 'known')
+        return max(0, int(count or 0)) if known else None
+
+    def get_all(self, job_pks: Iterable[Any]) -> Dict[Any, Optional[int]]:
+        job_pks = list(job_pks)
+        pipeline = get_redis().pipeline(transaction=False)
+        for job_pk in job_pks:
+            pipeline.hmget(JOB_INFLIGHT_KEY.format(job_pk=job_pk), 'count', 'known')
+        return {job_pk: max(0, int(count or 0)) if known else None for job_pk, (count, known) in zip(job_pks, pipeline.execute())}
+
+    def set(self, job_pk: Any, count: int):
+        get_redis().hset(JOB_INFLIGHT_KEY.format(job_pk=job_pk), mapping={'count': count, 'known': 1})
+
+    def add(self, job_pk: Any, count: int):
+        if count:
+            get_redis().hincrby(JOB_INFLIGHT_KEY.format(job_pk=job_pk), 'count', count)
+
+
+class JobFilledBuckets:
+    '''The sample buckets of a job that need no more heights, by their start
+
+    A bucket is filled once its sample has all been checked good, or once every height of it is scheduled after a bad
+    sample. Losing the key only costs counting the buckets' blocks again.
+    '''
+
+    def get(self, job_pk: Any) -> Set[int]:
+        return {int(bucket_start) for bucket_start in get_redis().smembers(JOB_FILLED_BUCKETS_KEY.format(job_pk=job_pk))}
+
+    def count_all(self, job_pks: Iterable[Any]) -> Dict[Any, int]:
+        job_pks = list(job_pks)
+        pipeline = get_redis().pipeline(transaction=False)
+        for job_pk in job_pks:
+            pipeline.scard(JOB_FILLED_BUCKETS_KEY.format(job_pk=job_pk))
+        return dict(zip(job_pks, pipeline.execute()))
+
+    def add(self, job_pk: Any, bucket_starts: Iterable[int]):
+        bucket_starts = list(bucket_starts)
+        if bucket_starts:
+            get_redis().sadd(JOB_FILLED_BUCKETS_KEY.format(job_pk=job_pk), *bucket_starts)
+
+    def reset(self, job_pk: Any):
+        get_redis().delete(JOB_FILLED_BUCKETS_KEY.format(job_pk=job_pk))
+
+
+class JobOwnerLease:
+    '''Which scheduler node plans a job, for as long as it keeps renewing the lease'''
+
+    def acquire(self, job_pks: Iterable[Any], node_id: str, expiry_s: int) -> List[Any]:
+        '''Takes or renews the leases of the jobs that are free or already the node's, and returns those jobs'''
+
+        job_pks = list(job_pks)
+        pipeline = get_redis().pipeline(transaction=False)
+        for job_pk in job_pks:
+            key = JOB_OWNER_KEY.format(job_pk=job_pk)
+            pipeline.set(key, node_id, nx=True, ex=expiry_s)
+            pipeline.get(key)
+        results = pipeline.execute()
+
+        owned = [job_pk for job_pk, owner in zip(job_pks, results[1::2]) if owner == node_id.encode()]
+        pipeline = get_redis().pipeline(transaction=False)
+        for job_pk in owned:
+            pipeline.expire(JOB_OWNER_KEY.format(job_pk=job_pk), expiry_s)
+        pipeline.execute()
+        return owned
+
+    def release(self, job_pks: Iterable[Any], node_id: str):
+        '''Gives up the leases the node holds, leaving those of other nodes be'''
+
+        for job_pk in job_pks:
+            key = JOB_OWNER_KEY.format(job_pk=job_pk)
+            with get_redis().pipeline(transaction=True) as pipeline:
+                try:
+                    pipeline.watch(key)
+                    if pipeline.get(key) != node_id.encode():
+                        continue
+                    pipeline.multi()
+                    pipeline.delete(key)
+                    pipeline.execute()
+                except redis.WatchError:
+                    # taken over since it was read, so no longer the node's
+                    continue
+
+
+class SchedulerNodes:
+    '''Scheduler nodes by when they were last seen'''
+
+    def heartbeat(self, node_id: str):
+        get_redis().zadd(SCHEDULER_NODES_KEY, {node_id: time.time()})
+
+    def live(self, expiry_s: int) -> List[str]:
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.zremrangebyscore(SCHEDULER_NODES_KEY, '-inf', time.time() - expiry_s)
+        pipeline.zrange(SCHEDULER_NODES_KEY, 0, -1)
+        return [node_id.decode() for node_id in pipeline.execute()[1]]
+
+    def leave(self, node_id: str):
+        get_redis().zrem(SCHEDULER_NODES_KEY, node_id)
+
+
+class JobCompletionStats:
+    '''A job's block checks completed since the scheduler last took them, and a latency baseline that it keeps'''
+
+    def record(self, job_pk: Any, failed: bool, fetch_seconds: float):
+        key = JOB_COMPLETIONS_KEY.format(job_pk=job_pk)
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.hincrby(key, 'completed', 1)
+        pipeline.hincrby(key, 'failed', int(failed))
+        pipeline.hincrbyfloat(key, 'fetch_seconds', fetch_seconds)
+        pipeline.expire(key, JOB_COMPLETIONS_EXPIRY_S)
+        pipeline.execute()
+
+    def take(self, job_pk: Any, completed_min: int = 0) -> Tuple[int, int, float, Optional[float]]:
+        '''The counts so far, which are only taken (reset) once there are completed_min completions; they are taken by
+        subtracting what was read, so that completions recorded meanwhile count towards the next time'''
+
+        key = JOB_COMPLETIONS_KEY.format(job_pk=job_pk)
+        completed, failed, fetch_seconds, baseline_seconds = get_redis().hmget(key, 'completed', 'failed', 'fetch_seconds', 'baseline_seconds')
+        completed, failed, fetch_seconds = int(completed or 0), int(failed or 0), float(fetch_seconds or 0)
+        if completed and completed >= completed_min:
+            pipeline = get_redis().pipeline(transaction=True)
+            pipeline.hincrby(key, 'completed', -completed)
+            pipeline.hincrby(key, 'failed', -failed)
+            pipeline.hincrbyfloat(key, 'fetch_seconds', -fetch_seconds)
+            pipeline.execute()
+        return completed, failed, fetch_seconds, float(baseline_seconds) if baseline_seconds else None
+
+    def set_baseline(self, job_pk: Any, baseline_seconds: float):
+        key = JOB_COMPLETIONS_KEY.format(job_pk=job_pk)
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.hset(key, 'baseline_seconds', baseline_seconds)
+        pipeline.expire(key, JOB_COMPLETIONS_EXPIRY_S)
+        pipeline.execute()
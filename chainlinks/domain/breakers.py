@@ -0,0 +1,99 @@
+import time
+from typing import Optional
+
+from chainlinks.common.constants import GOOD_STATUS_CODES
+from chainlinks.data.stores import get_redis
+
+
+BREAKER_STATE_CLOSED = 'closed'
+BREAKER_STATE_OPEN = 'open'
+BREAKER_STATE_HALF_OPEN = 'half-open'
+# in order of severity, which is also the value of the breaker state gauge
+BREAKER_STATES = (BREAKER_STATE_CLOSED, BREAKER_STATE_HALF_OPEN, BREAKER_STATE_OPEN)
+
+BREAKER_OUTCOMES_KEY = 'chainlinks.breaker.outcomes.{service_id}.{blockchain_id}.{bucket}'
+BREAKER_STATE_KEY = 'chainlinks.breaker.state.{service_id}.{blockchain_id}'
+
+
+def is_failure(status: Optional[int]) -> bool:
+    '''Whether the service errored, throttled or didn't respond, as opposed to answering, even if with a 404'''
+    return status is None or (status not in GOOD_STATUS_CODES and (status == 429 or status >= 500))
+
+
+class CircuitBreaker:
+    '''Whether a service is healthy enough, for a blockchain, to be sent blocks to check
+
+    Outcomes of requests are counted in Redis, in buckets of BUCKET_S, so that every worker's requests count. The
+    breaker opens once enough of the requests in the last WINDOW_S have failed. Open, nothing is dispatched, until
+    OPEN_S has passed and it goes half-open: a few probe heights are dispatched and PROBE_SUCCESSES good outcomes in a
+    row close it again, while any failure reopens it for twice as long (up to OPEN_MAX_S).
+    '''
+
+    BUCKET_S = 10
+    WINDOW_S = 60
+
+    FAILURE_RATE = 0.5
+    REQUESTS_MIN = 20
+
+    OPEN_S = 60
+    OPEN_MAX_S = 15 * 60
+
+    PROBE_COUNT = 2
+    PROBE_SUCCESSES = 3
+
+    def __init__(self, service_id: str, blockchain_id: str) -> None:
+        self.service_id = service_id
+        self.blockchain_id = blockchain_id
+        self.state_key = BREAKER_STATE_KEY.format(service_id=service_id, blockchain_id=blockchain_id)
+
+    def state(self) -> str:
+        state, opened, trips, _ = self._read_state(get_redis().hmget(self.state_key, 'state', 'opened', 'trips', 'probes'))
+        if state == BREAKER_STATE_OPEN and time.time() - opened >= self._open_s(trips):
+            return BREAKER_STATE_HALF_OPEN
+        return state
+
+    def record(self, status: Optional[int]):
+        '''Counts the outcome of a request that got a response with the status, or none at all'''
+
+        now = time.time()
+        failure = is_failure(status)
+        buckets = [self._outcomes_key(now - offset) for offset in range(0, CircuitBreaker.WINDOW_S, CircuitBreaker.BUCKET_S)]
+
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.hincrby(buckets[0], 'failures' if failure else 'successes', 1)
+        pipeline.expire(buckets[0], CircuitBreaker.WINDOW_S + CircuitBreaker.BUCKET_S)
+        pipeline.hmget(self.state_key, 'state', 'opened', 'trips', 'probes')
+        for bucket in buckets:
+            pipeline.hmget(bucket, 'failures', 'successes')
+        results = pipeline.execute()
+
+        state, opened, trips, probes = self._read_state(results[2])
+        if state == BREAKER_STATE_CLOSED:
+            failures = sum(int(x[0] or 0) for x in results[3:])
+            requests = failures + sum(int(x[1] or 0) for x in results[3:])
+            if requests >= CircuitBreaker.REQUESTS_MIN and failures >= requests * CircuitBreaker.FAILURE_RATE:
+                self._open(now, 0)
+        elif now - opened < self._open_s(trips):
+            # still open; stragglers dispatched before it opened don't count as probes
+            pass
+        elif failure:
+            self._open(now, trips + 1)
+        elif probes + 1 >= CircuitBreaker.PROBE_SUCCESSES:
+            get_redis().delete(self.state_key, *buckets)
+        else:
+            get_redis().hincrby(self.state_key, 'probes', 1)
+
+    def _open(self, now: float, trips: int):
+        get_redis().hset(self.state_key, mapping={'state': BREAKER_STATE_OPEN, 'opened': now, 'trips': trips, 'probes': 0})
+
+    def _open_s(self, trips: int) -> float:
+        return min(CircuitBreaker.OPEN_S * 2 ** trips, CircuitBreaker.OPEN_MAX_S)
+
+    def _outcomes_key(self, timestamp: float) -> str:
+        return BREAKER_OUTCOMES_KEY.format(service_id=self.service_id, blockchain_id=self.blockchain_id, bucket=int(timestamp // CircuitBreaker.BUCKET_S))
+
+    def _read_state(self, values):
+        state, opened, trips, probes = values
+        if state is None:
+            return BREAKER_STATE_CLOSED, 0.0, 0, 0
+        return state.decode(), float(opened), int(trips), int(probes)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+CASSETTE_MODE_RECORD = 'record'
+CASSETTE_MODE_REPLAY = 'replay'
+CASSETTE_MODES = (CASSETTE_MODE_RECORD, CASSETTE_MODE_REPLAY)
+
+REDACTED_VALUE = 'REDACTED'
+# query parameters, and path segments following a segment, with names like these carry credentials
+CREDENTIAL_NAME = re.compile(r'token|key|secret|auth|password|credential', re.IGNORECASE)
+
+
+class CassetteMissError(requests.exceptions.RequestException):
+    '''Raised when replaying a request that was never recorded'''
+
+
+class Cassette:
+    '''Recorded responses in a sqlite file, keyed by a digest of the request
+
+    Headers are left out of the key (and never stored for requests) so that tokens don't end up in cassettes. Secrets
+    in URLs (such as Infura's project id) and in request bodies, and credential-like query parameters and path
+    segments, are redacted before a request is keyed or stored, which also lets a cassette be replayed without them.
+    '''
+
+    COMPRESSION_LEVEL = 6
+
+    def __init__(self, path: str, secrets: Iterable[str] = ()) -> None:
+        self.path = path
+        # longest first, so that a secret containing another is redacted whole
+        self.secrets = sorted({secret for secret in secrets if secret}, key=len, reverse=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                request_key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL
+            )
+        ''')
+
+    def get(self, request: requests.PreparedRequest):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT status, reason, headers, body FROM responses WHERE request_key = ?', (self.request_key(request),)
+            ).fetchone()
+        if row is None:
+            return None
+        status, reason, headers, body = row
+        return status, reason, json.loads(headers), zlib.decompress(body)
+
+    def put(self, request: requests.PreparedRequest, response: requests.Response):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                self.request_key(request),
+                request.method,
+                self.redact_url(request.url),
+                response.status_code,
+                response.reason or '',
+                json.dumps({k: v for k, v in response.headers.items() if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}),
+                zlib.compress(response.content, Cassette.COMPRESSION_LEVEL),
+            ))
+
+    def request_key(self, request: requests.PreparedRequest) -> str:
+        url = self.redact_url(request.url)
+        body = request.body or b''
+        body = body.encode() if isinstance(body, str) else body
+        for secret in self.secrets:
+            body = body.replace(secret.encode(), REDACTED_VALUE.encode())
+        return hashlib.sha256(b'\n'.join((request.method.encode(), url.encode(), body))).hexdigest()
+
+    def redact_url(self, url: str) -> str:
+        # query parameters are sorted so that equivalent requests share a key
+        scheme, netloc, path, query, _ = urlsplit(url)
+        for secret in self.secrets:
+            path = path.replace(secret, REDACTED_VALUE)
+        segments = path.split('/')
+        segments = [REDACTED_VALUE if index and CREDENTIAL_NAME.search(segments[index - 1]) else segment for index, segment in enumerate(segments)]
+        query = sorted((name, REDACTED_VALUE if CREDENTIAL_NAME.search(name) else value) for name, value in parse_qsl(query, keep_blank_values=True))
+        return urlunsplit((scheme, netloc, '/'.join(segments), urlencode(query), ''))
+
+    def find_secrets(self, secrets: Dict[str, str]) -> List[str]:
+        '''The names of the secrets that appear anywhere in the recorded responses'''
+
+        secrets = {name: secret.encode() for name, secret in secrets.items() if secret}
+        found = set()
+        with self.lock:
+            rows = self.connection.execute('SELECT method, url, reason, headers, body FROM responses').fetchall()
+        for method, url, reason, headers, body in rows:
+            recorded = b'\n'.join((method.encode(), url.encode(), reason.encode(), headers.encode(), zlib.decompress(body)))
+            found.update(name for name, secret in secrets.items() if secret in recorded)
+        return sorted(found)
+
+
+class CassetteAdapter(requests.adapters.HTTPAdapter):
+    '''Transport that records responses to, or replays them from, a cassette'''
+
+    def __init__(self, cassette: Cassette, mode: str, **kwargs) -> None:
+        assert mode in CASSETTE_MODES
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.mode = mode
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.mode == CASSETTE_MODE_RECORD:
+            response = super().send(request, **kwargs)
+            self.cassette.put(request, response)
+            return response
+
+        recorded = self.cassette.get(request)
+        if recorded is None:
+            raise CassetteMissError(f'No recording of {request.method} {request.url} in {self.cassette.path}', request=request)
+
+        status, reason, headers, body = recorded
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = body
+        return response
+
+
+_cassettes = dict()
+
+def get_cassette(path: str, secrets: Iterable[str] = ()) -> Cassette:
+    global _cassettes
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path, secrets)
+    return _cassettes[path]
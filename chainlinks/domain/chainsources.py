@@ -1,3 +1,4 @@
+import time
 from dataclasses import dataclass
 from urllib3.util.retry import Retry
 
@@ -5,9 +6,12 @@ import requests
 
 from chainlinks.common.constants import GOOD_STATUS_CODES, SERVICE_ID_CANONICAL, SERVICE_ID_BLOCKSET, SERVICE_ID_INFURA
 from chainlinks.common.constants import BLOCKCHAIN_ID_ETHEREUM_MAINNET, BLOCKCHAIN_ID_ETHEREUM_ROPSTEN
+from chainlinks.common.metrics import CHAINSOURCE_REQUEST_SECONDS, chainsource_response_hook
+from chainlinks.domain.cassettes import CassetteAdapter, get_cassette
 
 
-RETRY_STATUS_CODES = (404, 429, 500, 503, 504)
+# a 404 is an answer (the block isn't there yet); retrying it only multiplies requests
+RETRY_STATUS_CODES = (429, 500, 503, 504)
 
 CONNECTION_POOL_COUNT=20
 CONNECTION_POOL_SIZE=1000
@@ -15,6 +19,34 @@ CONNECTION_POOL_SIZE=1000
 REQUESTS_ADAPTER_OPTIONS = dict(pool_connections=CONNECTION_POOL_COUNT, pool_maxsize=CONNECTION_POOL_SIZE, max_retries=Retry(3, backoff_factor=0.1, raise_on_status=False, status_forcelist=RETRY_STATUS_CODES))
 REQUESTS_TIMEOUTS = (3, 30)
 
+# settings that must never end up in a cassette
+CASSETTE_SECRET_SETTINGS = ('CANONICAL_TOKEN', 'BLOCKSET_TOKEN', 'INFURA_PROJECT_ID', 'SECRET_KEY')
+
+
+class TimedSession(requests.Session):
+    '''Session that times each request as a whole; a response's elapsed leaves out reading the body, and requests
+    that fail have no response at all'''
+
+    def __init__(self, service_id: str, blockchain_id: str) -> None:
+        super().__init__()
+        self.request_seconds = CHAINSOURCE_REQUEST_SECONDS.labels(service_id, blockchain_id)
+
+    def request(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            self.request_seconds.observe(time.perf_counter() - started)
+
+
+def create_session(service_id: str, blockchain_id: str, adapter: requests.adapters.BaseAdapter = None) -> requests.Session:
+    adapter = adapter or requests.adapters.HTTPAdapter(**REQUESTS_ADAPTER_OPTIONS)
+    session = TimedSession(service_id, blockchain_id)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(chainsource_response_hook(service_id, blockchain_id))
+    return session
+
 
 @dataclass
 class Chain:
@@ -41,20 +73,17 @@ class Infura:
         'ethereum-ropsten': 'https://ropsten.infura.io/v3',
     }
 
-    def __init__(self, project_id, blockchain_id) -> None:
+    def __init__(self, project_id, blockchain_id, base_url=None, adapter=None) -> None:
         assert blockchain_id in Infura.CHAIN_TO_URL.keys()
-        self.base_url = Infura.CHAIN_TO_URL[blockchain_id]
+        self.base_url = base_url or Infura.CHAIN_TO_URL[blockchain_id]
         self.project_id = project_id
 
-        adapter = requests.adapters.HTTPAdapter(**REQUESTS_ADAPTER_OPTIONS)
-        self.session = requests.session()
-        self.session.mount('https://', adapter)
-        self.session.mount('http://', adapter)
+        self.session = create_session(SERVICE_ID_INFURA, blockchain_id, adapter)
 
     def get_chain(self) -> Chain:
         resp = self.session.request('post', f'{self.base_url}/{self.project_id}', json={
             'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []
-        })
+        }, timeout=REQUESTS_TIMEOUTS)
         if (resp.status_code not in GOOD_STATUS_CODES):
             return Chain(resp.status_code, None)
 
@@ -65,7 +94,7 @@ class Infura:
     def get_block(self, block_height: str) -> Block:
         resp = self.session.request('post', f'{self.base_url}/{self.project_id}', json={
             'jsonrpc': '2.0', 'id': 1, 'method': 'eth_getBlockByNumber', 'params': [f'{hex(int(block_height))}', False]
-        })
+        }, timeout=REQUESTS_TIMEOUTS)
         if (resp.status_code not in GOOD_STATUS_CODES):
             return Block(resp.status_code, None, None, None, None)
 
@@ -81,15 +110,12 @@ class Infura:
 class Blockset:
     '''Blockset API'''
 
-    def __init__(self, base_url, token, blockchain_id) -> None:
+    def __init__(self, base_url, token, blockchain_id, adapter=None) -> None:
         self.token = token
         self.blockchain_id = blockchain_id
         self.base_url = base_url
 
-        adapter = requests.adapters.HTTPAdapter(**REQUESTS_ADAPTER_OPTIONS)
-        self.session = requests.session()
-        self.session.mount('https://', adapter)
-        self.session.mount('http://', adapter)
+        self.session = create_session(SERVICE_ID_BLOCKSET, blockchain_id, adapter)
 
     def get_block(self, block_height: str) -> Block:
         hdrs = {"Authorization": f"Bearer {self.token}"}
@@ -118,15 +144,12 @@ class Blockset:
 class Canonical:
     '''Canonical API'''
 
-    def __init__(self, base_url, token, blockchain_id) -> None:
+    def __init__(self, base_url, token, blockchain_id, adapter=None) -> None:
         self.token = token
         self.blockchain_id = blockchain_id
         self.base_url = base_url
 
-        adapter = requests.adapters.HTTPAdapter(**REQUESTS_ADAPTER_OPTIONS)
-        self.session = requests.session()
-        self.session.mount('https://', adapter)
-        self.session.mount('http://', adapter)
+        self.session = create_session(SERVICE_ID_CANONICAL, blockchain_id, adapter)
 
     def get_block(self, block_height: str) -> Block:
         hdrs = {"Authorization": f"Bearer {self.token}"}
@@ -172,12 +195,17 @@ def get_chainsource(service_id: str, blockchain_id: str):
             (SERVICE_ID_CANONICAL, BLOCKCHAIN_ID_ETHEREUM_ROPSTEN): SERVICE_ID_INFURA,
         }.get((service_id, blockchain_id), service_id)
 
+        # record or replay upstream responses when a cassette is configured
+        adapter = CassetteAdapter(
+            get_cassette(settings.CHAINSOURCE_CASSETTE, get_cassette_secrets().values()), settings.CHAINSOURCE_CASSETTE_MODE, **REQUESTS_ADAPTER_OPTIONS
+        ) if settings.CHAINSOURCE_CASSETTE else None
+
         if service_id == SERVICE_ID_CANONICAL:
-            return Canonical(settings.CANONICAL_URL, settings.CANONICAL_TOKEN, blockchain_id)
+            return Canonical(settings.CANONICAL_URL, settings.CANONICAL_TOKEN, blockchain_id, adapter)
         elif service_id == SERVICE_ID_BLOCKSET:
-            return Blockset(settings.BLOCKSET_URL, settings.BLOCKSET_TOKEN, blockchain_id)
+            return Blockset(settings.BLOCKSET_URL, settings.BLOCKSET_TOKEN, blockchain_id, adapter)
         elif service_id == SERVICE_ID_INFURA:
-            return Infura(settings.INFURA_PROJECT_ID, blockchain_id)
+            return Infura(settings.INFURA_PROJECT_ID, blockchain_id, settings.INFURA_URL, adapter)
         raise ValueError(f'unknown service_id={service_id}')
 
     global _chainsources
@@ -185,3 +213,14 @@ def get_chainsource(service_id: str, blockchain_id: str):
         _chainsources[(service_id, blockchain_id)] = _get_chainsource(service_id, blockchain_id)
     return _chainsources[(service_id, blockchain_id)]
 
+
+def get_cassette_secrets():
+    from django.conf import settings
+
+    return {name: getattr(settings, name) for name in CASSETTE_SECRET_SETTINGS if getattr(settings, name, '')}
+
+
+def reset_chainsources():
+    '''Drops the cached chain sources so that the next lookups pick up changed settings'''
+    global _chainsources
+    _chainsources = dict()
@@ -1,16 +1,36 @@
+import itertools
 import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, List
+from typing import Any, Dict, Iterable, List, Optional
 
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from gevent import spawn
+from gevent.pool import Pool
+from redis import RedisError
+from requests import RequestException
 from sentry_sdk import push_scope, capture_message
 
 from chainlinks.common.constants import RESULT_STATUS_FAIL
 from chainlinks.common.constants import GOOD_STATUS_CODES, UNKNOWN_HASH_VALUE, UNKNOWN_TXN_COUNT
 from chainlinks.common.constants import SERVICE_ID_CANONICAL
+from chainlinks.common.constants import QUEUE_CONSUMER_TIP, QUEUE_CONSUMER_BACKFILL, QUEUE_CONSUMER_RETRY
+from chainlinks.common.constants import VERIFICATION_MODE_CONTINUITY, VERIFICATION_MODE_EXHAUSTIVE, VERIFICATION_MODE_SAMPLED
+from chainlinks.common.metrics import BLOCK_CHECKS_DROPPED, BLOCKS_VERIFIED, CHAINSOURCE_BREAKER_STATE, JOB_INFLIGHT_EFFECTIVE, JOB_INFLIGHT_MAX, JOB_PENDING_BLOCKS, JOB_QUEUED_BLOCKS, SCHEDULER_PHASE_SECONDS
+from chainlinks.data.querysets import SCHEDULED_NEVER
+from chainlinks.data.stores import BlockDispatchLease, BlockFailureBuffer, BlockStatusChannel, JobCompletionStats, JobFilledBuckets, JobInflightCounter
+from chainlinks.domain.breakers import BREAKER_STATE_CLOSED, BREAKER_STATE_HALF_OPEN, BREAKER_STATE_OPEN, BREAKER_STATES, CircuitBreaker, is_failure
 from chainlinks.domain.chainsources import Block, get_chainsource
-from chainlinks.models import ChainJob, ChainBlockFetch, ChainBlock
+from chainlinks.domain.profiling import PhaseTimer, profile_task, should_profile
+from chainlinks.domain.sampling import sample_heights
+from chainlinks.domain.sharding import SchedulerShard
+from chainlinks.domain.tuning import InflightTuner
+from chainlinks.models import ChainJob, ChainBlockFetch, ChainBlock, ChainProfile, SlowQuery
 from chainlinks.models import RESULT_STATUS_PEND, RESULT_STATUS_GOOD, RESULT_STATUS_BAD
 
 
@@ -18,34 +38,280 @@ from chainlinks.models import RESULT_STATUS_PEND, RESULT_STATUS_GOOD, RESULT_STA
 logger = logging.getLogger('chainlinks.domain.engines')
 
 
+# how a height of a continuity job is checked: against canonical, or by linking it to its verified successor
+CONTINUITY_ANCHOR = 'anchor'
+CONTINUITY_LINK = 'link'
+
+
+@dataclass
+class RetryPolicy:
+    '''When a block checked with some unsuccessful status is next retried
+
+    The delay doubles with every attempt, from base up to cap, and is shortened by up to the jitter share so that
+    blocks that failed together don't come due together. After attempts_max attempts, if set, the block is left as it
+    is until it is rechecked by hand.
+    '''
+
+    base: timedelta
+    cap: timedelta
+    jitter: float = 0.0
+    attempts_max: Optional[int] = None
+
+
+@dataclass
+class CheckTarget:
+    '''A job's block to compare in a shared check of a height'''
+
+    job_pk: Any
+    block_pk: Any
+    service_id: str
+    lease_token: Optional[str] = None
+
+
 # Engines
 
 
+def reconcile_inflight(job: ChainJob, final_height: int):
+    '''Sets the job's inflight counter from the database, over the heights the scheduler requeues from; blocks
+    completing meanwhile can leave it off by a few until the next time'''
+
+    inflight_blocks = ChainBlock.objects.count_pending_blocks(job.pk, job.start_height, final_height)
+    try:
+        JobInflightCounter().set(job.pk, inflight_blocks)
+    except RedisError as e:
+        logger.warning(f'Unable to set inflight count for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+    return inflight_blocks
+
+
+def fetch_chain(blockchain_id: str):
+    try:
+        chain = get_chainsource(SERVICE_ID_CANONICAL, blockchain_id).get_chain()
+    except RequestException:
+        record_outcome(SERVICE_ID_CANONICAL, blockchain_id, None)
+        raise
+    record_outcome(SERVICE_ID_CANONICAL, blockchain_id, chain.status)
+    return chain
+
+
+def record_outcome(service_id: str, blockchain_id: str, status: Optional[int]):
+    try:
+        CircuitBreaker(service_id, blockchain_id).record(status)
+    except RedisError as e:
+        logger.warning(f'Unable to record outcome for service_id={service_id} and blockchain_id={blockchain_id} error={e}')
+
+
 class ChainCheckAllEngine:
 
-    def __init__(self, check_scheduler: Any, retention_timedelta: timedelta) -> None:
+    REPORT_ISLANDS_MAX = 20
+    # longest the tips of all chains are waited for when planning
+    CHAIN_TIP_TIMEOUT_S = 10
+
+    def __init__(self, check_scheduler: Any, retention_timedelta: timedelta, requeue_timedelta: timedelta) -> None:
         self.check_scheduler = check_scheduler
         self.retention_timedelta = retention_timedelta
+        self.requeue_timedelta = requeue_timedelta
 
-    def check_all_chains(self):
-        for job in ChainJob.objects.find_all_active():
-            self.check_scheduler(args=(job.pk,))
+    def check_all_chains(self, shard: Optional[SchedulerShard] = None):
+        now = timezone.now()
+        jobs = list(ChainJob.objects.find_all_active())
+        # with several scheduler nodes, only the jobs this one owns
+        if shard is not None:
+            jobs = shard.claim_jobs(jobs)
+
+        # one tip per blockchain, however many jobs check it, which the jobs are then handed
+        chain_heights = self._find_chain_heights({job.blockchain_id for job in jobs})
+        jobs = [job for job in jobs if chain_heights[job.blockchain_id] is not None]
+
+        # only jobs with work are dispatched, so that idle jobs cost the planning queries and nothing more
+        busy_job_pks = self._find_busy_jobs(now, jobs, chain_heights)
+        logger.info(f'Dispatching busy_count={len(busy_job_pks)} of job_count={len(jobs)}')
+        for job in jobs:
+            if job.pk in busy_job_pks:
+                self.check_scheduler(args=(job.pk,), kwargs=dict(chain_height=chain_heights[job.blockchain_id]))
+
+    def _find_chain_heights(self, blockchain_ids: Iterable[str]):
+        # in threads, since neither beat nor runscheduler is monkey-patched for greenlets; a chain whose tip takes
+        # longer than CHAIN_TIP_TIMEOUT_S has none this time, rather than holding up every other chain's jobs
+        blockchain_ids = sorted(blockchain_ids)
+        if not blockchain_ids:
+            return dict()
+        executor = ThreadPoolExecutor(max_workers=len(blockchain_ids))
+        try:
+            futures = {blockchain_id: executor.submit(self._find_chain_height, blockchain_id) for blockchain_id in blockchain_ids}
+            deadline = time.monotonic() + ChainCheckAllEngine.CHAIN_TIP_TIMEOUT_S
+            chain_heights = dict()
+            for blockchain_id, future in futures.items():
+                try:
+                    chain_heights[blockchain_id] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.error(f'Chain tip timed out for blockchain_id={blockchain_id}')
+                    chain_heights[blockchain_id] = None
+            return chain_heights
+        finally:
+            # a request that timed out is left to finish on its own (its own timeouts bound it)
+            executor.shutdown(wait=False)
+
+    def _find_chain_height(self, blockchain_id: str):
+        try:
+            current_chain = fetch_chain(blockchain_id)
+        except RequestException as e:
+            logger.error(f'Chain tip cannot be retrieved for blockchain_id={blockchain_id} error={e}')
+            return None
+        if current_chain.status not in GOOD_STATUS_CODES:
+            logger.error(f'Chain tip cannot be retrieved for blockchain_id={blockchain_id}')
+            return None
+        return current_chain.chain_height
+
+    def _find_busy_jobs(self, now: datetime, jobs: List[ChainJob], chain_heights: Dict[str, int]):
+        try:
+            inflights = JobInflightCounter().get_all(job.pk for job in jobs)
+        except RedisError as e:
+            logger.warning(f'Unable to get inflight counts error={e}')
+            inflights = dict()
+
+        sampled_job_pks = [job.pk for job in jobs if job.verification_mode == VERIFICATION_MODE_SAMPLED]
+        try:
+            filled_buckets = JobFilledBuckets().count_all(sampled_job_pks)
+        except RedisError as e:
+            logger.warning(f'Unable to get filled bucket counts error={e}')
+            filled_buckets = dict()
+
+        # a job without room for another block has nothing to do but requeue its expired blocks, which already
+        # count against its window; one whose count isn't known yet is dispatched to find out
+        full_job_pks = set()
+        sampling_job_pks = set()
+        job_ranges = list()
+        for job in jobs:
+            inflight_window = min(job.inflight_effective, job.inflight_max) if job.inflight_auto and job.inflight_effective else job.inflight_max
+            inflight_blocks = inflights.get(job.pk)
+            if inflight_blocks is not None and inflight_blocks >= inflight_window:
+                full_job_pks.add(job.pk)
+
+            final_height = chain_heights[job.blockchain_id] - job.finality_depth + 1
+            gap_start = job.start_height
+            if job.verification_mode == VERIFICATION_MODE_SAMPLED:
+                # below the tip window a sampled job's gaps are meant to be there, so it only has work there while
+                # some whole bucket isn't filled yet
+                gap_start = max(job.start_height, final_height - ChainCheckEngine.TIP_WINDOW_SIZE + 1)
+                sample_end = final_height - ChainCheckEngine.TIP_WINDOW_SIZE
+                whole_buckets = max(0, (sample_end + 1) // job.sample_bucket_size - job.start_height // job.sample_bucket_size)
+                if filled_buckets.get(job.pk, 0) < whole_buckets:
+                    sampling_job_pks.add(job.pk)
+            job_ranges.append((job.pk, job.start_height, final_height, gap_start))
+
+        return {
+            job_pk for job_pk, has_gaps, has_expired, has_rechecks, has_retries
+            in ChainBlock.objects.find_all_job_work(job_ranges, now - self.requeue_timedelta, now)
+            if has_expired or (job_pk not in full_job_pks and (has_gaps or has_rechecks or has_retries or job_pk in sampling_job_pks))
+        }
 
     def clean_all_chains(self):
         now = timezone.now()
         ChainBlockFetch.objects.delete_superceded_fetches(now - self.retention_timedelta)
+        ChainProfile.objects.filter(created__lt=now - self.retention_timedelta).delete()
+        SlowQuery.objects.filter(created__lt=now - self.retention_timedelta).delete()
+
+    def reconcile_all_chains(self):
+        jobs = list(ChainJob.objects.find_all_active())
+        chain_heights = self._find_chain_heights({job.blockchain_id for job in jobs})
+        for job in jobs:
+            if chain_heights[job.blockchain_id] is None:
+                continue
+            inflight_blocks = reconcile_inflight(job, chain_heights[job.blockchain_id] - job.finality_depth + 1)
+            logger.info(f'Reconciled inflights={inflight_blocks} for job_id={job.pk} and blockchain_id={job.blockchain_id}')
+
+    def report_all_failures(self):
+        failure_buffer = BlockFailureBuffer()
+        try:
+            pending = failure_buffer.pending()
+        except RedisError as e:
+            logger.warning(f'Unable to find block failures error={e}')
+            return
+
+        for job_pk, reason in pending:
+            try:
+                heights, sample = failure_buffer.drain(job_pk, reason)
+            except RedisError as e:
+                logger.warning(f'Unable to drain block failures for job_id={job_pk} and reason={reason} error={e}')
+                continue
+            if heights and sample:
+                self._report_failures(job_pk, reason, heights, sample)
+
+    def _report_failures(self, job_pk: Any, reason: str, heights: List[int], sample: dict):
+        islands = self._find_islands(heights)
+        logger.info(f'Reporting island_count={len(islands)} and height_count={len(heights)} for job_id={job_pk} and reason={reason}')
+
+        # a scattering of failures would still be an event per height; past a point, the rest go out as one
+        if len(islands) > ChainCheckAllEngine.REPORT_ISLANDS_MAX:
+            remainder = islands[ChainCheckAllEngine.REPORT_ISLANDS_MAX - 1:]
+            islands = islands[:ChainCheckAllEngine.REPORT_ISLANDS_MAX - 1]
+            islands.append((remainder[0][0], remainder[-1][1], sum(count for _, _, count in remainder)))
+
+        for start_height, end_height, height_count in islands:
+            self._report_island(job_pk, reason, start_height, end_height, height_count, sample)
+
+    def _find_islands(self, heights: List[int]):
+        islands = list()
+        for height in heights:
+            if islands and islands[-1][1] + 1 == height:
+                start_height, _, height_count = islands[-1]
+                islands[-1] = (start_height, height, height_count + 1)
+            else:
+                islands.append((height, height, 1))
+        return islands
+
+    def _report_island(self, job_pk: Any, reason: str, start_height: int, end_height: int, height_count: int, sample: dict):
+        service_id, blockchain_id = sample['service_id'], sample['blockchain_id']
+        with push_scope() as sentry_scope:
+            # one issue per job and reason, however many islands it spans
+            sentry_scope.fingerprint = ['block-failures', str(job_pk), reason]
+            sentry_scope.set_tag('job_id', job_pk)
+            sentry_scope.set_tag('block_outcome', sample['status'])
+            sentry_scope.set_tag('failure_reason', reason)
+            sentry_scope.set_tag('service_id', service_id)
+            sentry_scope.set_tag('blockchain_id', blockchain_id)
+            sentry_scope.set_context('block_info', {
+                'start_height': start_height,
+                'end_height': end_height,
+                'height_count': height_count,
+                'first_failed': datetime.fromtimestamp(sample['failed'], tz=timezone.utc).isoformat(),
+            })
+            sentry_scope.set_context('sample_block', {
+                'block_id': sample['block_id'],
+                'block_height': sample['block_height'],
+                'error_message': sample['error_message'],
+            })
+            sentry_scope.set_context('canonical_block', sample['canonical_block'])
+            sentry_scope.set_context('service_block', sample['service_block'])
+            capture_message(
+                f'Block errors for {blockchain_id} at {start_height}-{end_height} ({height_count} heights) for {service_id}: {reason}',
+                level='error')
 
 
 class ChainCheckEngine:
 
-    def __init__(self, block_scheduler, requeue_timedelta: timedelta, retry_timedelta: timedelta) -> None:
+    # heights this close to the final height are checked in the tip lane, whatever the reason
+    TIP_WINDOW_SIZE = 100
+    # service blocks fetched at once when linking the heights below a checked continuity height
+    LINK_FETCH_CONCURRENCY = 20
+    # sample buckets counted at once, until enough heights are found
+    SAMPLE_BUCKET_BATCH_SIZE = 100
+
+    def __init__(self, block_scheduler, requeue_timedelta: timedelta, retry_policies: Dict[str, RetryPolicy], shared_block_scheduler) -> None:
         self.block_scheduler = block_scheduler
+        self.shared_block_scheduler = shared_block_scheduler
         self.requeue_timedelta = requeue_timedelta
-        self.retry_timedelta = retry_timedelta
+        self.retry_policies = retry_policies
 
-    def check_chain(self, job_pk: Any):
-        now = timezone.now()
+    def check_chain(self, job_pk: Any, chain_height: Optional[int] = None):
         job = ChainJob.objects.get(pk=job_pk)
+        timer = PhaseTimer(lambda phase, seconds: SCHEDULER_PHASE_SECONDS.labels(job.blockchain_id, phase).observe(seconds))
+        with profile_task(job_pk, 'check_chain', timer, should_profile(job.profile_sample_rate)):
+            self._check_chain(job, chain_height, timer)
+
+    def _check_chain(self, job: ChainJob, chain_height: Optional[int], timer: PhaseTimer):
+        now = timezone.now()
+        job_pk = job.pk
 
         # Get the job details
         blockchain_id = job.blockchain_id
@@ -53,43 +319,90 @@ class ChainCheckEngine:
         start_height = job.start_height
         end_height = job.end_height
         inflight_max = job.inflight_max
-        service_id = job.service_id
 
         logger.info(
             f"Running with finality_depth={finality_depth}, start_height={start_height}, end_height={end_height}, and inflight_max={inflight_max} " +
             f"for job_id={job_pk} and blockchain_id={blockchain_id}")
 
-        # Get the current state of the chain
-        current_chain = get_chainsource(SERVICE_ID_CANONICAL, blockchain_id).get_chain()
-        if current_chain.status not in GOOD_STATUS_CODES:
-            logger.error(f"Chain tip cannot be retrieved for job_id={job_pk} and blockchain_id={blockchain_id}")
+        # Get the current state of the chain, unless it was found when all jobs were planned
+        if chain_height is None:
+            with timer.phase('tip'):
+                current_chain = fetch_chain(blockchain_id)
+            if current_chain.status not in GOOD_STATUS_CODES:
+                logger.error(f"Chain tip cannot be retrieved for job_id={job_pk} and blockchain_id={blockchain_id}")
+                return
+            chain_height = current_chain.chain_height
+
+        # Hold back while either side is down, bar a few probes to find out when it's back
+        with timer.phase('breaker'):
+            breaker_state = self._find_breaker_state(job)
+        if breaker_state == BREAKER_STATE_OPEN:
+            logger.warning(f'Circuit open, skipping dispatch for job_id={job_pk} and blockchain_id={blockchain_id}')
             return
 
-        final_height = current_chain.chain_height - finality_depth + 1
+        final_height = chain_height - finality_depth + 1
         logger.info(f"State is final_height={final_height} for job_id={job_pk} and blockchain_id={blockchain_id}")
 
         # Get the current inflight requests
-        inflight_blocks = ChainBlock.objects.count_pending_blocks(job_pk, start_height, final_height)
-        inflight_capacity = max(0, inflight_max - inflight_blocks)
-        logger.info(f'Inflight inflights={inflight_blocks}, capacity={inflight_capacity} for job_id={job_pk} and blockchain_id={blockchain_id}')
+        with timer.phase('inflight'):
+            inflight_blocks = self._count_inflight(job, final_height)
+            inflight_window = self._tune_inflight(job, inflight_blocks) if job.inflight_auto else inflight_max
+        inflight_capacity = max(0, inflight_window - inflight_blocks)
+        if breaker_state == BREAKER_STATE_HALF_OPEN:
+            inflight_capacity = min(inflight_capacity, CircuitBreaker.PROBE_COUNT)
+        JOB_INFLIGHT_MAX.labels(job_pk).set(inflight_max)
+        JOB_INFLIGHT_EFFECTIVE.labels(job_pk).set(inflight_window)
+        JOB_PENDING_BLOCKS.labels(job_pk).set(inflight_blocks)
+        logger.info(f'Inflight inflights={inflight_blocks}, window={inflight_window}, capacity={inflight_capacity} for job_id={job_pk} and blockchain_id={blockchain_id}')
+
+        # Find heights near the tip that are missing, ahead of any other work
+
+        with timer.phase('head'):
+            head_heights = [x for x in ChainBlock.objects.find_all_gap_heights(job_pk, max(start_height, final_height - ChainCheckEngine.TIP_WINDOW_SIZE + 1), final_height, inflight_capacity)]
+            logger.info(f'Found head_count={len(head_heights)} for job_id={job_pk} and blockchain_id={blockchain_id}')
+            self._schedule_blocks(now, job, 'head', head_heights, final_height)
+
+        inflight_capacity = max(0, inflight_capacity - len(head_heights))
+
+        # Find heights that have not completed and are candidates for requeueing; they already count as inflight, so
+        # they are requeued (up to a window's worth) whatever the capacity left, or a window full of lost messages
+        # would never drain
 
-        # Find heights that have not completed and are candidates for requeueing
+        with timer.phase('expiry'):
+            expiry_limit = CircuitBreaker.PROBE_COUNT if breaker_state == BREAKER_STATE_HALF_OPEN else inflight_window
+            expired_blocks = [x for x in ChainBlock.objects.find_all_pending_blocks(job_pk, start_height, final_height, expiry_limit, now - self.requeue_timedelta)]
+            logger.info(f'Found requeue_count={len(expired_blocks)} for job_id={job_pk} and blockchain_id={blockchain_id}')
+            self._reschedule_blocks(now, job, 'expiry', expired_blocks, final_height)
 
-        expired_blocks = [x for x in ChainBlock.objects.find_all_pending_blocks(job_pk, start_height, final_height, inflight_capacity, now - self.requeue_timedelta)]
-        logger.info(f'Found requeue_count={len(expired_blocks)} for job_id={job_pk} and blockchain_id={blockchain_id}')
-        self._reschedule_blocks(now, job_pk, blockchain_id, service_id, 'expiry', expired_blocks)
+        # Check if there is room to continue on
+
+        if inflight_capacity == 0:
+            return
+
+        # Find heights that were reset to be checked again
+
+        with timer.phase('recheck'):
+            recheck_blocks = [x for x in ChainBlock.objects.find_all_recheck_blocks(job_pk, start_height, final_height, inflight_capacity)]
+            logger.info(f'Found recheck_count={len(recheck_blocks)} for job_id={job_pk} and blockchain_id={blockchain_id}')
+            self._reschedule_blocks(now, job, 'recheck', recheck_blocks, final_height)
 
         # Check if there is room to continue on
 
-        inflight_capacity = max(0, inflight_capacity - len(expired_blocks))
+        inflight_capacity = max(0, inflight_capacity - len(recheck_blocks))
         if inflight_capacity == 0:
             return
 
         # Find heights that for some reason are missing
 
-        missing_heights = [x for x in ChainBlock.objects.find_all_gap_heights(job_pk, start_height, final_height, inflight_capacity)]
-        logger.info(f'Found gap_count={len(missing_heights)} for job_id={job_pk} and blockchain_id={blockchain_id}')
-        self._schedule_blocks(now, job_pk, blockchain_id, service_id, 'gap', missing_heights)
+        with timer.phase('gap'):
+            if job.verification_mode == VERIFICATION_MODE_SAMPLED:
+                missing_heights = self._find_sample_heights(job, start_height, final_height - ChainCheckEngine.TIP_WINDOW_SIZE, inflight_capacity)
+            elif job.verification_mode == VERIFICATION_MODE_CONTINUITY:
+                missing_heights = self._find_continuity_heights(job, start_height, final_height, inflight_capacity)
+            else:
+                missing_heights = [x for x in ChainBlock.objects.find_all_gap_heights(job_pk, start_height, final_height, inflight_capacity)]
+            logger.info(f'Found gap_count={len(missing_heights)} for job_id={job_pk} and blockchain_id={blockchain_id}')
+            self._schedule_blocks(now, job, 'gap', missing_heights, final_height)
 
         # Check if there is room to continue on
 
@@ -99,28 +412,225 @@ class ChainCheckEngine:
 
         # Find heights that were unsuccessful and should be retried
 
-        unsuccessful_blocks = [x for x in ChainBlock.objects.find_all_unsuccessful_blocks(job_pk, start_height, final_height, inflight_capacity, now - self.retry_timedelta)]
-        logger.info(f'Found retry_count={len(unsuccessful_blocks)} for job_id={job_pk} and blockchain_id={blockchain_id}')
-        self._reschedule_blocks(now, job_pk, blockchain_id, service_id, 'retry', unsuccessful_blocks)
+        with timer.phase('retry'):
+            unsuccessful_blocks = [x for x in ChainBlock.objects.find_all_unsuccessful_blocks(job_pk, start_height, final_height, inflight_capacity, now)]
+            logger.info(f'Found retry_count={len(unsuccessful_blocks)} for job_id={job_pk} and blockchain_id={blockchain_id}')
+            self._reschedule_blocks(now, job, 'retry', unsuccessful_blocks, final_height)
+
+    def recheck_range(self, job_pk: Any, start_height: int, end_height: int, status_list: Optional[List[str]] = None):
+        now = timezone.now()
+        job = ChainJob.objects.get(pk=job_pk)
+
+        # only final heights within the job are ever checked; None tells a tip that couldn't be found from nothing
+        # to reset
+        try:
+            current_chain = fetch_chain(job.blockchain_id)
+        except RequestException as e:
+            logger.error(f'Chain tip cannot be retrieved for job_id={job_pk} and blockchain_id={job.blockchain_id} error={e}')
+            return None
+        if current_chain.status not in GOOD_STATUS_CODES:
+            logger.error(f"Chain tip cannot be retrieved for job_id={job_pk} and blockchain_id={job.blockchain_id}")
+            return None
+
+        final_height = current_chain.chain_height - job.finality_depth + 1
+        start_height = max(start_height, job.start_height)
+        end_height = min(end_height, job.end_height, final_height)
+        if start_height > end_height:
+            return 0
+
+        # the reset blocks are dispatched by the job's scheduler passes, within its inflight window like any others
+        reset_count = ChainBlock.objects.reset_blocks_in_range(job_pk, start_height, end_height, status_list, now)
+        logger.info(f'Reset reset_count={reset_count} between start_height={start_height} and end_height={end_height} for job_id={job_pk} and blockchain_id={job.blockchain_id}')
+        self._publish_reset(job_pk)
+        # some of the reset blocks may have been pending (and dispatched) already, so count them all again, and
+        # buckets of reset blocks have to be sampled again
+        reconcile_inflight(job, final_height)
+        try:
+            JobFilledBuckets().reset(job_pk)
+        except RedisError as e:
+            logger.warning(f'Unable to reset filled buckets for job_id={job_pk} and blockchain_id={job.blockchain_id} error={e}')
+
+        return reset_count
+
+    def check_blocks_by_hand(self, blocks: List[ChainBlock]):
+        # queued (and leased) like any other dispatch, on the queues of the blocks' jobs, so that a check of a block
+        # already queued is dropped in favour of this one
+        jobs = dict()
+        for block in blocks:
+            jobs.setdefault(block.job_id, (block.job, list()))[1].append(block)
+        for job, job_blocks in jobs.values():
+            self._queue_blocks(job, 'manual', job_blocks, None)
+
+    def check_block(self, job_pk: Any, block_pk: Any, blockchain_id: str, block_height: int, service_id: str, profile: bool = False, fetch_pk: Any = None,
+                    lease_token: Optional[str] = None, continuity: Optional[str] = None):
+        if lease_token is not None and not self._claim_lease(job_pk, block_pk, blockchain_id, block_height, lease_token):
+            BLOCK_CHECKS_DROPPED.labels(blockchain_id).inc()
+            return None
+
+        timer = PhaseTimer()
+        with profile_task(job_pk, 'check_block', timer, profile):
+            return self._check_block(job_pk, block_pk, blockchain_id, block_height, service_id, fetch_pk, continuity, timer)
 
-    def check_block(self, job_pk: Any, block_pk: Any, blockchain_id: str, block_height: int, service_id: str):
+    def _check_block(self, job_pk: Any, block_pk: Any, blockchain_id: str, block_height: int, service_id: str, fetch_pk: Any, continuity: Optional[str], timer: PhaseTimer):
         canonical_chainsource = get_chainsource(SERVICE_ID_CANONICAL, blockchain_id)
         service_chainsource = get_chainsource(service_id, blockchain_id)
 
+        # a canonical block fetched by a previous check of this (final) height is as good as a new one
+        canonical_block = self._find_canonical_block(fetch_pk, block_height) if fetch_pk is not None else None
+        if canonical_block is not None:
+            logger.info(f'Reusing canonical block of fetch_id={fetch_pk} at height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id}')
+
+        # a continuity height may have been linked already, from a height checked above it
+        if continuity is not None:
+            block = ChainBlock.objects.find_block_at(job_pk, block_height)
+            if block is None or block.status != RESULT_STATUS_PEND:
+                logger.info(f'Skipping linked height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id}')
+                return None
+
+        # a height linked by hash to a verified successor needs no canonical block; until the successor is checked,
+        # the height waits (pending) for the successor's check to link it
+        successor_prev_hash = None
+        if continuity == CONTINUITY_LINK and canonical_block is None:
+            successor = ChainBlock.objects.find_block_at(job_pk, block_height + 1)
+            if successor is None or successor.status == RESULT_STATUS_PEND:
+                logger.info(f'Deferring height={block_height} until its successor is checked for job_id={job_pk} and blockchain_id={blockchain_id}')
+                return None
+            if successor.status == RESULT_STATUS_GOOD and successor.fetch is not None:
+                successor_prev_hash = successor.fetch.canonical_prev_hash
+
         # fetch block from canonical and service block (in parallel using greenlets)
-        service_block_greenlet = spawn(service_chainsource.get_block, block_height)
-        canonical_block_greenlet = spawn(canonical_chainsource.get_block, block_height)
-        service_block = service_block_greenlet.get()
-        canonical_block = canonical_block_greenlet.get()
+        canonical_inferred = False
+        with timer.phase('fetch'):
+            service_block_greenlet = spawn(self._fetch_block, service_id, blockchain_id, service_chainsource, block_height)
+            if canonical_block is None and successor_prev_hash is None:
+                canonical_block_greenlet = spawn(self._fetch_block, SERVICE_ID_CANONICAL, blockchain_id, canonical_chainsource, block_height)
+                canonical_block = canonical_block_greenlet.get()
+            service_block = service_block_greenlet.get()
+
+            if canonical_block is None:
+                canonical_block = self._infer_canonical_block(service_block, successor_prev_hash, block_height)
+                canonical_inferred = canonical_block is not None
+            if canonical_block is None:
+                logger.info(f'Continuity broken at height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id}')
+                canonical_block = self._fetch_block(SERVICE_ID_CANONICAL, blockchain_id, canonical_chainsource, block_height)
 
         # compare the blocks
         status = self._compare_blocks(canonical_block, service_block)
         completed = timezone.now()
+        self._record_completion(job_pk, blockchain_id, canonical_block, service_block, timer.phases['fetch'])
+
+        with timer.phase('store'):
+            fetch = self._store_check(job_pk, block_pk, canonical_block, service_block, status, completed, canonical_inferred)
+
+        with timer.phase('publish'):
+            self._publish_check(job_pk, blockchain_id, block_height, service_id, status, fetch)
+
+        # once checked, a height links the pending heights below it, down to the next anchor
+        if continuity is not None:
+            prev_hash = canonical_block.prev_hash if canonical_block.status in GOOD_STATUS_CODES else None
+            with timer.phase('link'):
+                self._check_links(job_pk, blockchain_id, block_height, service_id, prev_hash)
+
+        return block_pk
+
+    def _check_links(self, job_pk: Any, blockchain_id: str, block_height: int, service_id: str, prev_hash: Optional[str]):
+        job = ChainJob.objects.get(pk=job_pk)
+        low_height = max(job.start_height, (block_height - 1) // job.anchor_interval * job.anchor_interval + 1)
+        if low_height >= block_height:
+            return
+
+        # the run of pending heights right below this one; a height not scheduled yet ends it, and is linked by its
+        # own check once it is
+        pending_blocks = {block.block_height: block for block in ChainBlock.objects.find_all_pending_blocks(
+            job_pk, low_height, block_height - 1, block_height - low_height, timezone.now())}
+        heights = list()
+        for height in range(block_height - 1, low_height - 1, -1):
+            if height not in pending_blocks:
+                break
+            heights.append(height)
+        if not heights:
+            return
+
+        # fetch the service blocks together, then follow their previous hashes down from this height; below a broken
+        # link nothing is verified, so the rest are checked against canonical
+        pool = Pool(ChainCheckEngine.LINK_FETCH_CONCURRENCY)
+        service_chainsource = get_chainsource(service_id, blockchain_id)
+        canonical_chainsource = get_chainsource(SERVICE_ID_CANONICAL, blockchain_id)
+        try:
+            started = time.perf_counter()
+            service_blocks = pool.map(lambda height: self._fetch_block(service_id, blockchain_id, service_chainsource, height), heights)
+            canonical_blocks = list()
+            for height, service_block in zip(heights, service_blocks):
+                canonical_block = self._infer_canonical_block(service_block, prev_hash, height)
+                if canonical_block is None:
+                    logger.info(f'Continuity broken at height={height} for job_id={job_pk} and blockchain_id={blockchain_id}')
+                    break
+                canonical_blocks.append(canonical_block)
+                prev_hash = service_block.prev_hash
+            inferred_count = len(canonical_blocks)
+            canonical_blocks.extend(pool.map(
+                lambda height: self._fetch_block(SERVICE_ID_CANONICAL, blockchain_id, canonical_chainsource, height), heights[inferred_count:]))
+            fetch_seconds = (time.perf_counter() - started) / len(heights)
+        except RequestException as e:
+            # the heights stay pending, and are checked on their own once they expire
+            logger.warning(f'Unable to link height_count={len(heights)} below height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id} error={e}')
+            return
+        logger.info(f'Linked inferred_count={inferred_count} of height_count={len(heights)} below height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id}')
+
+        for index, (height, canonical_block, service_block) in enumerate(zip(heights, canonical_blocks, service_blocks)):
+            status = self._compare_blocks(canonical_block, service_block)
+            self._record_completion(job_pk, blockchain_id, canonical_block, service_block, fetch_seconds)
+            fetch = self._store_check(job_pk, pending_blocks[height].pk, canonical_block, service_block, status, timezone.now(), index < inferred_count)
+            self._publish_check(job_pk, blockchain_id, height, service_id, status, fetch)
+
+    def check_shared_block(self, blockchain_id: str, block_height: int, targets: List[dict], profile: bool = False):
+        targets = [CheckTarget(**target) for target in targets]
+        claimed_targets = [target for target in targets if target.lease_token is None or self._claim_lease(
+            target.job_pk, target.block_pk, blockchain_id, block_height, target.lease_token)]
+        BLOCK_CHECKS_DROPPED.labels(blockchain_id).inc(len(targets) - len(claimed_targets))
+        if not claimed_targets:
+            return []
+
+        timer = PhaseTimer()
+        with profile_task(claimed_targets[0].job_pk, 'check_shared_block', timer, profile):
+            return self._check_shared_block(blockchain_id, block_height, claimed_targets, timer)
+
+    def _check_shared_block(self, blockchain_id: str, block_height: int, targets: List[CheckTarget], timer: PhaseTimer):
+        # fetch canonical once, and each service once, however many jobs compare them (in parallel using greenlets)
+        with timer.phase('fetch'):
+            canonical_block_greenlet = spawn(self._fetch_block, SERVICE_ID_CANONICAL, blockchain_id, get_chainsource(SERVICE_ID_CANONICAL, blockchain_id), block_height)
+            service_block_greenlets = {service_id: spawn(
+                self._fetch_block, service_id, blockchain_id, get_chainsource(service_id, blockchain_id), block_height
+            ) for service_id in sorted({target.service_id for target in targets})}
+            canonical_block = canonical_block_greenlet.get()
+            service_blocks = {service_id: greenlet.get() for service_id, greenlet in service_block_greenlets.items()}
+
+        # compare the blocks
+        statuses = [self._compare_blocks(canonical_block, service_blocks[target.service_id]) for target in targets]
+        completed = timezone.now()
+        for target in targets:
+            self._record_completion(target.job_pk, blockchain_id, canonical_block, service_blocks[target.service_id], timer.phases['fetch'])
+
+        with timer.phase('store'):
+            # every job's outcome for the height, or none of them
+            with transaction.atomic():
+                fetches = [self._store_check(
+                    target.job_pk, target.block_pk, canonical_block, service_blocks[target.service_id], status, completed
+                ) for target, status in zip(targets, statuses)]
+
+        with timer.phase('publish'):
+            for target, status, fetch in zip(targets, statuses, fetches):
+                self._publish_check(target.job_pk, blockchain_id, block_height, target.service_id, status, fetch)
 
+        return [target.block_pk for target in targets]
+
+    def _store_check(self, job_pk: Any, block_pk: Any, canonical_block: Block, service_block: Block, status: str, completed: datetime,
+                     canonical_inferred: bool = False):
         # create a record of our fetch
         fetch = ChainBlockFetch.objects.create(
             job_id=job_pk,
             block_id = block_pk,
+            canonical_inferred=canonical_inferred,
 
             canonical_http_status=canonical_block.status,
             canonical_block_hash=canonical_block.hash or UNKNOWN_HASH_VALUE,
@@ -133,36 +643,333 @@ class ChainCheckEngine:
             service_txn_count=service_block.txn_count or UNKNOWN_TXN_COUNT,
         )
 
-        # update the block to point to our blocks as the latest fetch
-        ChainBlock.objects.filter(pk=block_pk).update(
-            completed=completed,
-            status=status,
-            fetch=fetch
-        )
+        # update the block to point to our blocks as the latest fetch, and when to retry it if need be
+        retry_policy = self.retry_policies.get(status)
+        previous_status = ChainBlock.objects.complete_block(block_pk, status, fetch.pk, completed, **(dict(
+            retry_base_s=retry_policy.base.total_seconds(),
+            retry_cap_s=retry_policy.cap.total_seconds(),
+            retry_scale=1 - retry_policy.jitter * random.random(),
+            attempts_max=retry_policy.attempts_max,
+        ) if retry_policy else dict()))
+        # a block checked twice (after expiring) is only pending for the first
+        if previous_status == RESULT_STATUS_PEND:
+            self._add_inflight(job_pk, -1)
+        return fetch
+
+    def _publish_check(self, job_pk: Any, blockchain_id: str, block_height: int, service_id: str, status: str, fetch: ChainBlockFetch):
+        # notify live dashboards of the transition
+        self._publish_statuses(job_pk, [(block_height, RESULT_STATUS_PEND, status)])
+        BLOCKS_VERIFIED.labels(service_id, blockchain_id, status).inc()
 
-        # report to Sentry on failure
+        # hold failures for the next report to Sentry
         if RESULT_STATUS_GOOD != status:
-            self._report_error(blockchain_id, block_height, service_id, status, fetch)
+            self._buffer_failure(blockchain_id, block_height, service_id, status, fetch)
 
-        return block_pk
+    def _find_canonical_block(self, fetch_pk: Any, block_height: int):
+        fetch = ChainBlockFetch.objects.filter(pk=fetch_pk).first()
+        if fetch is None or fetch.canonical_http_status not in GOOD_STATUS_CODES:
+            return None
+        # the height isn't stored, but a good canonical block is the one asked for; nor is a count of zero
+        # transactions, which is stored as unknown
+        return Block(
+            fetch.canonical_http_status,
+            fetch.canonical_block_hash or None,
+            fetch.canonical_prev_hash or None,
+            block_height,
+            max(fetch.canonical_txn_count, 0),
+        )
+
+    def _infer_canonical_block(self, service_block: Block, successor_prev_hash: Optional[str], block_height: int):
+        # the verified successor's canonical previous hash is canonical's hash at this height, so a service block with
+        # that hash is the canonical block (whose contents the hash commits to)
+        if successor_prev_hash is None or service_block.status not in GOOD_STATUS_CODES or not service_block.hash:
+            return None
+        if service_block.hash != successor_prev_hash:
+            return None
+        return Block(service_block.status, service_block.hash, service_block.prev_hash, block_height, service_block.txn_count)
+
+    def _fetch_block(self, service_id: str, blockchain_id: str, chainsource: Any, block_height: int):
+        try:
+            block = chainsource.get_block(block_height)
+        except RequestException:
+            record_outcome(service_id, blockchain_id, None)
+            raise
+        record_outcome(service_id, blockchain_id, block.status)
+        return block
+
+    def _record_completion(self, job_pk: Any, blockchain_id: str, canonical_block: Block, service_block: Block, fetch_seconds: float):
+        failed = is_failure(canonical_block.status) or is_failure(service_block.status)
+        try:
+            JobCompletionStats().record(job_pk, failed, fetch_seconds)
+        except RedisError as e:
+            logger.warning(f'Unable to record completion for job_id={job_pk} and blockchain_id={blockchain_id} error={e}')
+
+    def _count_inflight(self, job: ChainJob, final_height: int):
+        try:
+            inflight_blocks = JobInflightCounter().get(job.pk)
+        except RedisError as e:
+            logger.warning(f'Unable to get inflight count for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+            return ChainBlock.objects.count_pending_blocks(job.pk, job.start_height, final_height)
+        return inflight_blocks if inflight_blocks is not None else reconcile_inflight(job, final_height)
+
+    def _add_inflight(self, job_pk: Any, count: int):
+        try:
+            JobInflightCounter().add(job_pk, count)
+        except RedisError as e:
+            logger.warning(f'Unable to add to inflight count for job_id={job_pk} error={e}')
+
+    def _tune_inflight(self, job: ChainJob, inflight_blocks: int):
+        tuner = InflightTuner()
+        window = job.inflight_effective or tuner.start(job.inflight_max)
+        try:
+            completed, failed, fetch_seconds, baseline = JobCompletionStats().take(job.pk, InflightTuner.COMPLETED_MIN)
+        except RedisError as e:
+            logger.warning(f'Unable to take completions for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+            return min(window, job.inflight_max)
+
+        # a window smaller than COMPLETED_MIN can't complete that many in one pass, so the completions build up over
+        # passes until there are enough to go by
+        if completed < InflightTuner.COMPLETED_MIN:
+            return min(window, job.inflight_max)
+
+        latency = fetch_seconds / completed if completed else None
+        tuned_window = tuner.tune(job.inflight_max, window, inflight_blocks, completed, failed, latency, baseline)
+        logger.info(
+            f'Tuned window={window} to window={tuned_window} from completed={completed}, failed={failed}, latency={latency} and baseline={baseline} ' +
+            f'for job_id={job.pk} and blockchain_id={job.blockchain_id}')
+
+        rebased = tuner.rebase(latency, baseline)
+        if rebased is not None and rebased != baseline:
+            try:
+                JobCompletionStats().set_baseline(job.pk, rebased)
+            except RedisError as e:
+                logger.warning(f'Unable to set latency baseline for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+        if tuned_window != job.inflight_effective:
+            ChainJob.objects.filter(pk=job.pk).update(inflight_effective=tuned_window)
+        return tuned_window
+
+    def _find_breaker_state(self, job: ChainJob):
+        # the worse of the two sides; with Redis unavailable, checking carries on as if both were fine
+        states = list()
+        for service_id in (SERVICE_ID_CANONICAL, job.service_id):
+            try:
+                state = CircuitBreaker(service_id, job.blockchain_id).state()
+            except RedisError as e:
+                logger.warning(f'Unable to find circuit state for service_id={service_id} and blockchain_id={job.blockchain_id} error={e}')
+                state = BREAKER_STATE_CLOSED
+            CHAINSOURCE_BREAKER_STATE.labels(service_id, job.blockchain_id).set(BREAKER_STATES.index(state))
+            states.append(state)
+        return max(states, key=BREAKER_STATES.index)
+
+    def _find_continuity_heights(self, job: ChainJob, start_height: int, final_height: int, limit: int):
+        # a link waits (pending) for its successor's check, so the anchors are scheduled before any link, and each
+        # interval's links from its anchor down; links scheduled from the bottom of an interval up would wait on
+        # successors not scheduled yet, and could fill the window for good
+        anchor_interval = job.anchor_interval
+        # heights from here up are all anchors (see _find_continuity)
+        anchor_height = min(job.end_height, final_height - ChainCheckEngine.TIP_WINDOW_SIZE + 1)
+        gaps = sorted(ChainBlock.objects.find_all_gaps(job.pk, start_height, final_height))
+
+        def _find_anchor_heights():
+            for gap_start, gap_end in gaps:
+                yield from range(-(-gap_start // anchor_interval) * anchor_interval, min(gap_end, anchor_height - 1) + 1, anchor_interval)
+                yield from range(max(gap_start, anchor_height), gap_end + 1)
+
+        def _find_link_heights():
+            for gap_start, gap_end in gaps:
+                low_height, high_height = gap_start, min(gap_end, anchor_height - 1)
+                while low_height <= high_height:
+                    interval_end = min(high_height, (low_height // anchor_interval + 1) * anchor_interval - 1)
+                    yield from (x for x in range(interval_end, low_height - 1, -1) if x % anchor_interval)
+                    low_height = interval_end + 1
+
+        return list(itertools.islice(itertools.chain(_find_anchor_heights(), _find_link_heights()), limit))
+
+    def _find_sample_heights(self, job: ChainJob, start_height: int, end_height: int, limit: int):
+        # buckets are filled up to their sample in order, and a bucket with a bad sample is filled up entirely; only
+        # the buckets not known to be filled are counted, a batch at a time
+        bucket_size = job.sample_bucket_size
+        try:
+            filled_buckets = JobFilledBuckets().get(job.pk)
+        except RedisError as e:
+            logger.warning(f'Unable to get filled buckets for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+            filled_buckets = set()
+
+        heights = list()
+        newly_filled = list()
+        bucket_starts = (x for x in range(start_height // bucket_size * bucket_size, end_height + 1, bucket_size) if x not in filled_buckets)
+        while len(heights) < limit:
+            bucket_ranges = [(x, max(start_height, x), min(end_height, x + bucket_size - 1)) for x in itertools.islice(
+                bucket_starts, ChainCheckEngine.SAMPLE_BUCKET_BATCH_SIZE)]
+            if not bucket_ranges:
+                break
+            bucket_counts = {x: counts for x, *counts in ChainBlock.objects.find_bucket_counts(job.pk, bucket_ranges)}
+
+            for bucket_start, bucket_low, bucket_high in bucket_ranges:
+                if len(heights) >= limit:
+                    break
+                block_count, bad_count, good_count = bucket_counts[bucket_start]
+                bucket_count = bucket_high - bucket_low + 1
+                # the last bucket grows with the chain, so it is never filled
+                whole = bucket_high == bucket_start + bucket_size - 1
+                if bad_count and block_count < bucket_count:
+                    logger.info(f'Escalating bucket={bucket_start} with bad_count={bad_count} for job_id={job.pk} and blockchain_id={job.blockchain_id}')
+                    heights.extend(ChainBlock.objects.find_missing_heights(job.pk, bucket_low, bucket_high, limit - len(heights)))
+                elif bad_count:
+                    if whole:
+                        newly_filled.append(bucket_start)
+                elif block_count < min(job.sample_size, bucket_count):
+                    bucket_heights = sample_heights(job.pk, bucket_start, bucket_low, bucket_high, job.sample_size)
+                    existing_heights = set(ChainBlock.objects.find_existing_heights(job.pk, bucket_heights))
+                    heights.extend([x for x in bucket_heights if x not in existing_heights][:limit - len(heights)])
+                elif whole and good_count >= min(job.sample_size, bucket_count):
+                    # a sample still pending or failed may yet turn out bad
+                    newly_filled.append(bucket_start)
+
+        try:
+            JobFilledBuckets().add(job.pk, newly_filled)
+        except RedisError as e:
+            logger.warning(f'Unable to add filled buckets for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+        return heights
+
+    def _schedule_blocks(self, now: datetime, job: ChainJob, reason: str, heights: List[int], final_height: int):
+        if job.multi_target:
+            return self._schedule_shared_blocks(now, job, reason, heights, final_height)
 
-    def _schedule_blocks(self, now: datetime, job_pk: int, blockchain_id: str, service_id: str, reason: str, heights: List[int]):
         blocks = ChainBlock.objects.bulk_create([self._create_chain_check_block(
-            now, job_pk, height
+            now, job.pk, height
         ) for height in heights])
+        self._add_inflight(job.pk, len(blocks))
+        self._publish_statuses(job.pk, [(block.block_height, None, RESULT_STATUS_PEND) for block in blocks])
+        self._queue_blocks(job, reason, blocks, final_height)
 
-        for block in blocks:
-            logger.info(f'Queueing height={block.block_height} for job_id={job_pk} and blockchain_id={blockchain_id} due to {reason}')
-            self.block_scheduler(args=(job_pk, block.pk, blockchain_id, block.block_height, service_id))
+    def _schedule_shared_blocks(self, now: datetime, job: ChainJob, reason: str, heights: List[int], final_height: int):
+        # the heights are also scheduled for the other multi-target jobs of the chain that would check them on their
+        # own passes: those that check every height, aren't held back by a breaker, cover the heights and find them
+        # final at their own finality depth, up to the room left in their windows; only the blocks created here are
+        # queued, the rest being another pass's
+        chain_height = final_height + job.finality_depth - 1
+        jobs = {job.pk: job}
+        job_heights = {job.pk: heights}
+        for sibling in ChainJob.objects.find_all_multi_target(job.blockchain_id):
+            if sibling.pk == job.pk or sibling.verification_mode != VERIFICATION_MODE_EXHAUSTIVE:
+                continue
+            if self._find_breaker_state(sibling) != BREAKER_STATE_CLOSED:
+                continue
+            sibling_final_height = chain_height - sibling.finality_depth + 1
+            sibling_heights = [x for x in heights if sibling.start_height <= x <= min(sibling.end_height, sibling_final_height)]
+            if not sibling_heights:
+                continue
+            sibling_window = min(sibling.inflight_effective or InflightTuner().start(sibling.inflight_max), sibling.inflight_max) if (
+                sibling.inflight_auto) else sibling.inflight_max
+            sibling_capacity = max(0, sibling_window - self._count_inflight(sibling, sibling_final_height))
+            if sibling_capacity:
+                jobs[sibling.pk] = sibling
+                job_heights[sibling.pk] = sibling_heights[:sibling_capacity]
+        ChainBlock.objects.bulk_create([self._create_chain_check_block(
+            now, job_pk, height
+        ) for job_pk, x in job_heights.items() for height in x], ignore_conflicts=True)
+        blocks = list(ChainBlock.objects.find_all_scheduled_blocks(list(jobs), heights, now))
+
+        for job_pk in jobs:
+            job_blocks = [block for block in blocks if block.job_id == job_pk]
+            if job_blocks:
+                self._add_inflight(job_pk, len(job_blocks))
+                self._publish_statuses(job_pk, [(block.block_height, None, RESULT_STATUS_PEND) for block in job_blocks])
+        self._queue_shared_blocks(job, reason, jobs, blocks, final_height)
 
-    def _reschedule_blocks(self, now: datetime, job_pk: int, blockchain_id: str, service_id: str, reason: str, blocks: List[ChainBlock]):
+    def _reschedule_blocks(self, now: datetime, job: ChainJob, reason: str, blocks: List[ChainBlock], final_height: int):
+        deltas = [(block.block_height, block.status, RESULT_STATUS_PEND) for block in blocks]
+        newly_pending = sum(1 for block in blocks if block.status != RESULT_STATUS_PEND or block.scheduled == SCHEDULED_NEVER)
+        # the previous fetches go with the retries, for the checks to reuse what they can of them
+        fetch_pks = {block.pk: block.fetch_id for block in blocks if block.fetch_id is not None}
         ChainBlock.objects.bulk_update([self._reset_chain_check_block(
             now, height
-        ) for height in blocks], fields=('status', 'scheduled', 'completed', 'fetch'))
+        ) for height in blocks], fields=('status', 'scheduled', 'completed', 'fetch', 'retry_after'))
+        self._add_inflight(job.pk, newly_pending)
+        self._publish_statuses(job.pk, deltas)
+        self._queue_blocks(job, reason, blocks, final_height, fetch_pks)
+
+    def _queue_blocks(self, job: ChainJob, reason: str, blocks: Iterable[ChainBlock], final_height: Optional[int], fetch_pks: Optional[Dict[Any, Any]] = None):
+        queued_blocks = JOB_QUEUED_BLOCKS.labels(job.pk, reason)
+        blocks = list(blocks)
+        lease_tokens = self._take_leases(job, blocks)
+        for block in blocks:
+            queue = self._find_queue(job, reason, block.block_height, final_height)
+            logger.info(f'Queueing height={block.block_height} on queue={queue} for job_id={job.pk} and blockchain_id={job.blockchain_id} due to {reason}')
+            # the sampling decision travels with the task so that workers needn't look the job up
+            kwargs = dict(profile=True) if should_profile(job.profile_sample_rate) else dict()
+            if fetch_pks and block.pk in fetch_pks:
+                kwargs['fetch_pk'] = fetch_pks[block.pk]
+            if block.pk in lease_tokens:
+                kwargs['lease_token'] = lease_tokens[block.pk]
+            continuity = self._find_continuity(job, reason, block.block_height, final_height)
+            if continuity is not None:
+                kwargs['continuity'] = continuity
+            self.block_scheduler(args=(job.pk, block.pk, job.blockchain_id, block.block_height, job.service_id), kwargs=kwargs, queue=queue)
+            queued_blocks.inc()
 
+    def _queue_shared_blocks(self, job: ChainJob, reason: str, jobs: Dict[Any, ChainJob], blocks: List[ChainBlock], final_height: int):
+        lease_tokens = self._take_leases(job, blocks)
+        heights = dict()
         for block in blocks:
-            logger.info(f'Queueing height={block.block_height} for job_id={job_pk} and blockchain_id={blockchain_id} due to {reason}')
-            self.block_scheduler(args=(job_pk, block.pk, blockchain_id, block.block_height, service_id))
+            heights.setdefault(block.block_height, []).append(block)
+        for block_height, height_blocks in heights.items():
+            queue = self._find_queue(job, reason, block_height, final_height)
+            logger.info(f'Queueing height={block_height} with target_count={len(height_blocks)} on queue={queue} for job_id={job.pk} and blockchain_id={job.blockchain_id} due to {reason}')
+            kwargs = dict(profile=True) if should_profile(job.profile_sample_rate) else dict()
+            targets = [dict(
+                job_pk=block.job_id, block_pk=block.pk, service_id=jobs[block.job_id].service_id, lease_token=lease_tokens.get(block.pk),
+            ) for block in height_blocks]
+            self.shared_block_scheduler(args=(job.blockchain_id, block_height, targets), kwargs=kwargs, queue=queue)
+            for block in height_blocks:
+                JOB_QUEUED_BLOCKS.labels(block.job_id, reason).inc()
+
+    def _take_leases(self, job: ChainJob, blocks: List[ChainBlock]):
+        # leases last as long as a block may stay pending before it is requeued, which takes a new lease anyway
+        try:
+            return BlockDispatchLease().take([block.pk for block in blocks], self.requeue_timedelta)
+        except RedisError as e:
+            logger.warning(f'Unable to take leases for job_id={job.pk} and blockchain_id={job.blockchain_id} error={e}')
+            return dict()
+
+    def _claim_lease(self, job_pk: Any, block_pk: Any, blockchain_id: str, block_height: int, lease_token: str):
+        # without Redis, checking twice beats not checking at all
+        try:
+            claimed = BlockDispatchLease().claim(block_pk, lease_token, self.requeue_timedelta)
+        except RedisError as e:
+            logger.warning(f'Unable to claim lease at height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id} error={e}')
+            return True
+        if not claimed:
+            logger.info(f'Dropping duplicate check at height={block_height} for job_id={job_pk} and blockchain_id={blockchain_id}')
+        return claimed
+
+    def _find_continuity(self, job: ChainJob, reason: str, block_height: int, final_height: Optional[int]):
+        # retries are of heights already found wanting, and checks by hand of heights in doubt, so get a full check
+        if job.verification_mode != VERIFICATION_MODE_CONTINUITY or reason in ('retry', 'manual'):
+            return None
+        # the last height of the job has no successor to link to, and heights at the tip would wait for successors
+        # that aren't final yet, so they are anchors too
+        if block_height % job.anchor_interval == 0 or block_height >= job.end_height:
+            return CONTINUITY_ANCHOR
+        if final_height is not None and block_height > final_height - ChainCheckEngine.TIP_WINDOW_SIZE:
+            return CONTINUITY_ANCHOR
+        return CONTINUITY_LINK
+
+    def _find_queue(self, job: ChainJob, reason: str, block_height: int, final_height: Optional[int]):
+        # without a final height, nothing is treated as being at the tip
+        if final_height is not None and block_height > final_height - ChainCheckEngine.TIP_WINDOW_SIZE:
+            lane = QUEUE_CONSUMER_TIP
+        elif reason == 'retry':
+            lane = QUEUE_CONSUMER_RETRY
+        else:
+            lane = QUEUE_CONSUMER_BACKFILL
+
+        # then the job's own queues for the lane, or its chain's, if they are routed apart
+        routes = settings.CHECK_QUEUE_ROUTES
+        group = routes.get(f'job-{job.pk}', routes.get(job.blockchain_id, routes.get('*', '')))
+        group = group.format(job_id=job.pk, blockchain_id=job.blockchain_id)
+        return f'{lane}.{group}' if group else lane
 
     def _create_chain_check_block(self, now: datetime, job_pk: int, block_height: int):
         return ChainBlock(
@@ -179,8 +986,21 @@ class ChainCheckEngine:
         block.status = RESULT_STATUS_PEND
         block.completed = datetime.utcfromtimestamp(0).replace(tzinfo=timezone.utc)
         block.fetch = None
+        block.retry_after = None
         return block
 
+    def _publish_statuses(self, job_pk: int, deltas: List[tuple]):
+        try:
+            BlockStatusChannel().publish(job_pk, deltas)
+        except RedisError as e:
+            logger.warning(f'Unable to publish block statuses for job_id={job_pk} error={e}')
+
+    def _publish_reset(self, job_pk: int):
+        try:
+            BlockStatusChannel().publish_reset(job_pk)
+        except RedisError as e:
+            logger.warning(f'Unable to publish block status reset for job_id={job_pk} error={e}')
+
     def _compare_blocks(self, canonical_block: Block, service_block: Block):
         return RESULT_STATUS_FAIL if (
             canonical_block.status not in GOOD_STATUS_CODES
@@ -192,26 +1012,27 @@ class ChainCheckEngine:
             canonical_block.txn_count != service_block.txn_count
         ) else RESULT_STATUS_GOOD
 
-    def _report_error(self, blockchain_id: str, block_height: int, service_id: str, status: str, fetch: ChainBlockFetch):
-        with push_scope() as sentry_scope:
-            sentry_scope.set_tag('job_id', fetch.job_id)
-            sentry_scope.set_tag('block_id', fetch.block_id)
-            sentry_scope.set_tag('block_outcome', status)
-            sentry_scope.set_tag('service_id', service_id)
-            sentry_scope.set_tag('blockchain_id', blockchain_id)
-            sentry_scope.set_context('block_info', {
+    def _buffer_failure(self, blockchain_id: str, block_height: int, service_id: str, status: str, fetch: ChainBlockFetch):
+        try:
+            BlockFailureBuffer().add(fetch.job_id, fetch.error_reason, block_height, {
+                'status': status,
+                'service_id': service_id,
+                'blockchain_id': blockchain_id,
+                'block_id': fetch.block_id,
                 'block_height': block_height,
+                'error_message': fetch.error_message,
+                'canonical_block': {
+                    'http_status': fetch.canonical_http_status,
+                    'block_hash': fetch.canonical_block_hash,
+                    'prev_hash': fetch.canonical_prev_hash,
+                    'txn_count': fetch.canonical_txn_count,
+                },
+                'service_block': {
+                    'http_status': fetch.service_http_status,
+                    'block_hash': fetch.service_block_hash,
+                    'prev_hash': fetch.service_prev_hash,
+                    'txn_count': fetch.service_txn_count,
+                },
             })
-            sentry_scope.set_context('canonical_block', {
-                'http_status': fetch.canonical_http_status,
-                'block_hash': fetch.canonical_block_hash,
-                'prev_hash': fetch.canonical_prev_hash,
-                'txn_count': fetch.canonical_txn_count,
-            })
-            sentry_scope.set_context('service_block', {
-                'http_status': fetch.service_http_status,
-                'block_hash': fetch.service_block_hash,
-                'prev_hash': fetch.service_prev_hash,
-                'txn_count': fetch.service_txn_count,
-            })
-            capture_message(f'Block error for {blockchain_id} at {block_height} for {service_id}: {fetch.error_message}', level='error')
+        except RedisError as e:
+            logger.warning(f'Unable to buffer block failure at height={block_height} for job_id={fetch.job_id} and blockchain_id={blockchain_id} error={e}')
@@ -0,0 +1,89 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from pyinstrument import Profiler
+
+from chainlinks.models import ChainProfile
+
+
+PROFILE_SAMPLE_INTERVAL_S = 0.001
+
+
+logger = logging.getLogger('chainlinks.domain.profiling')
+
+# the sampler hooks the whole thread, so only one task per process is profiled at a time
+_profiler_lock = threading.Lock()
+
+
+class PhaseTimer:
+    '''Wall time spent in each named phase of a task'''
+
+    def __init__(self, observe: Optional[Callable[[str, float], None]] = None) -> None:
+        self.observe = observe
+        self.phases = dict()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            if self.observe is not None:
+                self.observe(name, elapsed)
+
+
+def should_profile(profile_sample_rate: float) -> bool:
+    sample_rate = max(profile_sample_rate, settings.PROFILE_SAMPLE_RATE)
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+@contextmanager
+def profile_task(job_pk: Any, task: str, timer: PhaseTimer, enabled: bool):
+    '''Samples the task with pyinstrument and stores the result, with the timer's phases, as a ChainProfile
+
+    Under the gevent pool the sampler sees whichever greenlet is running, so a profile includes some of the work of
+    tasks running alongside it; the phase timings are the task's own.
+    '''
+
+    if not enabled or not _profiler_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        profiler = Profiler(interval=PROFILE_SAMPLE_INTERVAL_S, async_mode='disabled')
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            _save_profile(job_pk, task, time.perf_counter() - started, timer.phases, profiler)
+    finally:
+        _profiler_lock.release()
+
+
+def _save_profile(job_pk: Any, task: str, duration: float, phases: dict, profiler: Profiler):
+    try:
+        ChainProfile.objects.create(
+            job_id=job_pk,
+            task=task,
+            duration=duration,
+            phases=phases,
+            profile=profiler.output_text(unicode=True, color=False),
+        )
+        if settings.PROFILE_DIR:
+            path = os.path.join(settings.PROFILE_DIR, f'{task}-{job_pk}-{timezone.now():%Y%m%dT%H%M%S%f}.html')
+            with open(path, 'w') as profile_file:
+                profile_file.write(profiler.output_html())
+    except (DatabaseError, OSError) as e:
+        logger.warning(f'Unable to save {task} profile for job_id={job_pk} error={e}')
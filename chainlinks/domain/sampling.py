@@ -0,0 +1,23 @@
+import math
+import random
+from typing import Any, List
+
+
+# for bounds at 95% confidence
+WILSON_Z = 1.96
+
+
+def sample_heights(job_pk: Any, bucket_start: int, start_inclusive: int, end_inclusive: int, sample_size: int) -> List[int]:
+    '''The heights of a bucket to check; random, but the same on every pass, so that the bucket fills up to its sample'''
+    population = range(start_inclusive, end_inclusive + 1)
+    return sorted(random.Random(f'{job_pk}.{bucket_start}').sample(population, min(sample_size, len(population))))
+
+
+def wilson_upper_bound(failures: int, trials: int, z: float = WILSON_Z) -> float:
+    '''Upper bound of the Wilson score interval on the rate of failures, which stays meaningful for few or no failures'''
+    if trials == 0:
+        return 1.0
+    rate = failures / trials
+    centre = rate + z * z / (2 * trials)
+    spread = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    return min(1.0, (centre + spread) / (1 + z * z / trials))
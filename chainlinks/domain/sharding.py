@@ -0,0 +1,78 @@
+import bisect
+import hashlib
+import logging
+from typing import Any, Iterable, List, Optional
+
+from redis import RedisError
+
+from chainlinks.data.stores import JobOwnerLease, SchedulerNodes
+
+
+logger = logging.getLogger('chainlinks.domain.sharding')
+
+
+class HashRing:
+    '''Consistent hashing of keys to nodes, so that a node joining or leaving only moves the keys it takes or had'''
+
+    REPLICAS = 64
+
+    def __init__(self, node_ids: Iterable[str]) -> None:
+        self.points = sorted((self._hash(f'{node_id}#{replica}'), node_id) for node_id in node_ids for replica in range(HashRing.REPLICAS))
+        self.hashes = [point_hash for point_hash, _ in self.points]
+
+    def owner(self, key: Any) -> Optional[str]:
+        if not self.points:
+            return None
+        return self.points[bisect.bisect(self.hashes, self._hash(str(key))) % len(self.points)][1]
+
+    def _hash(self, value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class SchedulerShard:
+    '''The jobs one of several scheduler nodes plans
+
+    Nodes heartbeat into Redis and jobs are spread across the live ones by consistent hashing. A node only plans a job
+    while it also holds the job's lease, which it renews every pass and gives up once the job hashes to another node,
+    so that a job moving between nodes is never planned by both. Nodes that stop heartbeating drop out, and their
+    leases lapse, after NODE_EXPIRY_S, which is several of the planning intervals (SCHEDULER_PLAN_INTERVAL_S) nodes
+    are meant to run at.
+    '''
+
+    NODE_EXPIRY_S = 150
+
+    def __init__(self, node_id: str) -> None:
+        self.node_id = node_id
+        self.owned_job_pks = set()
+
+    def claim_jobs(self, jobs: List[Any]) -> List[Any]:
+        # without Redis no node can know what it owns, so none plans anything rather than all planning everything
+        try:
+            nodes = SchedulerNodes()
+            nodes.heartbeat(self.node_id)
+            ring = HashRing(nodes.live(SchedulerShard.NODE_EXPIRY_S))
+
+            hashed_job_pks = [job.pk for job in jobs if ring.owner(job.pk) == self.node_id]
+            moved_job_pks = self.owned_job_pks.difference(hashed_job_pks)
+            leases = JobOwnerLease()
+            if moved_job_pks:
+                leases.release(moved_job_pks, self.node_id)
+            self.owned_job_pks = set(leases.acquire(hashed_job_pks, self.node_id, SchedulerShard.NODE_EXPIRY_S))
+        except RedisError as e:
+            logger.warning(f'Unable to claim jobs for node_id={self.node_id} error={e}')
+            self.owned_job_pks = set()
+            return []
+
+        logger.info(
+            f'Claimed owned_count={len(self.owned_job_pks)} of hashed_count={len(hashed_job_pks)}, released moved_count={len(moved_job_pks)} ' +
+            f'for node_id={self.node_id}')
+        return [job for job in jobs if job.pk in self.owned_job_pks]
+
+    def leave(self):
+        # hand the jobs over now rather than once the leases lapse
+        try:
+            SchedulerNodes().leave(self.node_id)
+            JobOwnerLease().release(self.owned_job_pks, self.node_id)
+        except RedisError as e:
+            logger.warning(f'Unable to leave for node_id={self.node_id} error={e}')
+        self.owned_job_pks = set()
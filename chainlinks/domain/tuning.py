@@ -0,0 +1,45 @@
+import math
+from typing import Optional
+
+
+class InflightTuner:
+    '''Additive increase, multiplicative decrease of a job's inflight window, between WINDOW_MIN and its inflight_max
+
+    Each scheduler pass looks at the checks completed since the last. Too many failures (errors or throttling on
+    either side), or a mean fetch latency well above the lowest seen lately, is taken as congestion and halves the
+    window. Otherwise the window grows by a step, but only if it was the limit, i.e. most of it was in use; a job
+    that is keeping up, or has run out of heights, has no use for a larger one.
+    '''
+
+    WINDOW_MIN = 1
+    START_SHARE = 0.1
+    INCREASE_SHARE = 0.05
+    DECREASE_FACTOR = 0.5
+    UTILISATION_MIN = 0.8
+
+    COMPLETED_MIN = 10
+    FAILURE_RATE_MAX = 0.05
+    LATENCY_TOLERANCE = 2.0
+    # lets the baseline drift up, so that a lasting rise in latency stops counting as congestion after a while
+    BASELINE_DRIFT = 1.02
+
+    def start(self, inflight_max: int) -> int:
+        return max(InflightTuner.WINDOW_MIN, math.ceil(inflight_max * InflightTuner.START_SHARE))
+
+    def tune(self, inflight_max: int, window: int, pending: int, completed: int, failed: int, latency: Optional[float], baseline: Optional[float]) -> int:
+        window = min(window, inflight_max)
+        if completed < InflightTuner.COMPLETED_MIN:
+            return max(InflightTuner.WINDOW_MIN, window)
+
+        congested = failed > completed * InflightTuner.FAILURE_RATE_MAX or (
+            latency is not None and baseline is not None and latency > baseline * InflightTuner.LATENCY_TOLERANCE)
+        if congested:
+            window = math.floor(window * InflightTuner.DECREASE_FACTOR)
+        elif pending >= window * InflightTuner.UTILISATION_MIN:
+            window += max(1, math.ceil(inflight_max * InflightTuner.INCREASE_SHARE))
+        return max(InflightTuner.WINDOW_MIN, min(window, inflight_max))
+
+    def rebase(self, latency: Optional[float], baseline: Optional[float]) -> Optional[float]:
+        if latency is None:
+            return baseline
+        return latency if baseline is None else min(latency, baseline * InflightTuner.BASELINE_DRIFT)
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from chainlinks.benchmarks.runners import ChainSourceBenchmark
+from chainlinks.common.constants import BLOCKCHAIN_ID_BITCOIN_MAINNET, SERVICE_ID_CANONICAL, SERVICE_ID_BLOCKSET, SERVICE_ID_INFURA
+from chainlinks.domain.cassettes import CASSETTE_MODES, CASSETTE_MODE_RECORD, CASSETTE_MODE_REPLAY, get_cassette
+from chainlinks.domain.chainsources import get_cassette_secrets
+from chainlinks.models import BLOCKCHAIN_IDS
+
+
+class Command(BaseCommand):
+    help = 'Times fetching and parsing a range of blocks from a chain source; record a cassette once, then replay it offline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--service', default=SERVICE_ID_CANONICAL, choices=(SERVICE_ID_CANONICAL, SERVICE_ID_BLOCKSET, SERVICE_ID_INFURA))
+        parser.add_argument('--blockchain', default=BLOCKCHAIN_ID_BITCOIN_MAINNET, choices=[x for x, _ in BLOCKCHAIN_IDS])
+        parser.add_argument('--start', type=int, required=True, help='first height to fetch')
+        parser.add_argument('--end', type=int, required=True, help='last height to fetch')
+        parser.add_argument('--repeat', type=int, default=5, help='repetitions (default: 5)')
+        parser.add_argument('--cassette', help='cassette to record to or replay from (default: CHAINSOURCE_CASSETTE)')
+        parser.add_argument('--cassette-mode', choices=CASSETTE_MODES, default=CASSETTE_MODE_REPLAY)
+        parser.add_argument('--output', help='file to write the results to (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['start'] > options['end']:
+            raise CommandError('--start must not be after --end')
+
+        cassette_settings = dict(
+            CHAINSOURCE_CASSETTE=options['cassette'], CHAINSOURCE_CASSETTE_MODE=options['cassette_mode']
+        ) if options['cassette'] else dict()
+        with override_settings(**cassette_settings):
+            report = ChainSourceBenchmark(options['service'], options['blockchain'], options['start'], options['end'], options['repeat']).run()
+
+            # a cassette is meant to be shared, so one that caught a secret is refused
+            if options['cassette'] and options['cassette_mode'] == CASSETTE_MODE_RECORD:
+                found = get_cassette(options['cassette']).find_secrets(get_cassette_secrets())
+                if found:
+                    raise CommandError(f"Cassette {options['cassette']} contains the secrets of {', '.join(found)}; delete it before sharing")
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
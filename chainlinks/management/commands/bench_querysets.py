@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chainlinks.benchmarks.runners import QuerySetBenchmark
+from chainlinks.models import ChainJob
+
+
+class Command(BaseCommand):
+    help = 'Times the ChainBlock queryset methods against a job (see bench_seed) and emits the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, required=True, help='id of the job to benchmark against')
+        parser.add_argument('--repeat', type=int, default=5, help='repetitions per method (default: 5)')
+        parser.add_argument('--output', help='file to write the results to (default: stdout)')
+        parser.add_argument('--baseline', help='results of an earlier run to compare median timings against')
+
+    def handle(self, *args, **options):
+        job = ChainJob.objects.filter(pk=options['job']).first()
+        if job is None:
+            raise CommandError(f'job_id={options["job"]} does not exist')
+
+        report = QuerySetBenchmark(job, options['repeat']).run()
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = {x['name']: x for x in json.load(baseline_file)['results']}
+            for result in report['results']:
+                if result['name'] in baseline and result['median_s']:
+                    result['baseline_speedup'] = baseline[result['name']]['median_s'] / result['median_s']
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
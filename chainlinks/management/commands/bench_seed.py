@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chainlinks.benchmarks.generators import SyntheticChainGenerator, SyntheticChainSpec
+
+
+class Command(BaseCommand):
+    help = 'Seeds the database with a synthetic job for benchmarking (the job is disabled and hidden)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heights', type=int, default=100_000, help='number of heights to generate (default: 100000)')
+        parser.add_argument('--start-height', type=int, default=0)
+        parser.add_argument('--hole-rate', type=float, default=0.0, help='probability of a height having no block')
+        parser.add_argument('--pending-rate', type=float, default=0.001, help='probability of a block being pending')
+        parser.add_argument('--bad-island-rate', type=float, default=0.001, help='probability of an island being bad or failed')
+        parser.add_argument('--bad-island-length', type=int, default=100, help='number of heights per island')
+        parser.add_argument('--fail-share', type=float, default=0.5, help='share of bad islands that are failures')
+        parser.add_argument('--fetch-rate', type=float, default=1.0, help='probability of a good block having a fetch')
+        parser.add_argument('--superseded-fetch-rate', type=float, default=0.01, help='probability of a block having a stale fetch')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['heights'] < 1 or options['bad_island_length'] < 1:
+            raise CommandError('--heights and --bad-island-length must be positive')
+
+        spec = SyntheticChainSpec(
+            heights=options['heights'],
+            start_height=options['start_height'],
+            hole_rate=options['hole_rate'],
+            pending_rate=options['pending_rate'],
+            bad_island_rate=options['bad_island_rate'],
+            bad_island_length=options['bad_island_length'],
+            fail_share=options['fail_share'],
+            fetch_rate=options['fetch_rate'],
+            superseded_fetch_rate=options['superseded_fetch_rate'],
+            seed=options['seed'],
+        )
+        job = SyntheticChainGenerator(progress=self.stdout.write).generate(spec)
+        self.stdout.write(self.style.SUCCESS(f'Seeded job_id={job.pk} name={job.name}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from chainlinks.benchmarks.stubs import add_stub_arguments, serve_stub, stub_config_from_options
+
+
+class Command(BaseCommand):
+    help = 'Serves a stub Canonical, Blockset and Infura chain source; point CANONICAL_URL, BLOCKSET_URL and INFURA_URL at it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=18080)
+        add_stub_arguments(parser)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Serving stub chain source on http://{options["host"]}:{options["port"]}')
+        try:
+            serve_stub(stub_config_from_options(options), options['host'], options['port'])
+        except KeyboardInterrupt:
+            pass
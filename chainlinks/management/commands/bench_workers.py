@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chainlinks.benchmarks.runners import WorkerThroughputBenchmark
+from chainlinks.benchmarks.stubs import add_stub_arguments, serve_stub, stub_config_from_options
+from chainlinks.common.constants import BLOCKCHAIN_ID_BITCOIN_MAINNET, SERVICE_ID_BLOCKSET
+from chainlinks.domain.cassettes import CASSETTE_MODES, CASSETTE_MODE_REPLAY
+from chainlinks.models import BLOCKCHAIN_IDS, SERVICE_IDS
+
+
+class Command(BaseCommand):
+    help = 'Measures check_block throughput for a fresh job against a stub chain source and emits the results as JSON'
+
+    STUB_START_TIMEOUT_S = 30
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heights', type=int, default=1000, help='number of heights to check (default: 1000)')
+        parser.add_argument('--blockchain', default=BLOCKCHAIN_ID_BITCOIN_MAINNET, choices=[x for x, _ in BLOCKCHAIN_IDS])
+        parser.add_argument('--service', default=SERVICE_ID_BLOCKSET, choices=[x for x, _ in SERVICE_IDS])
+        parser.add_argument('--concurrency', type=int, default=100, help='concurrency of the worker, as its -c option (default: 100)')
+        parser.add_argument('--inflight-max', type=int, default=1000, help='inflight_max of the job (default: 1000)')
+        parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for every height to be checked (default: 600)')
+        parser.add_argument('--worker-log', help='file to write the worker output to (default: a temporary file)')
+        parser.add_argument('--cassette', help='cassette to record to or replay from instead of starting a stub')
+        parser.add_argument('--cassette-mode', choices=CASSETTE_MODES, default=CASSETTE_MODE_REPLAY)
+        parser.add_argument('--stub-url', help='an already running stub (see bench_stub) to use instead of starting one')
+        parser.add_argument('--output', help='file to write the results to (default: stdout)')
+        add_stub_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['heights'] < 1 or options['concurrency'] < 1 or options['heights'] > options['chain_height'] + 1:
+            raise CommandError('--heights and --concurrency must be positive and --heights at most --chain-height + 1')
+
+        # the stub runs in its own process so that serving requests doesn't compete with scheduling
+        stub_process = None
+        stub_url = options['stub_url']
+        if not stub_url and not options['cassette']:
+            context = multiprocessing.get_context('spawn')
+            ready = context.Queue()
+            stub_process = context.Process(target=serve_stub, args=(stub_config_from_options(options), '127.0.0.1', 0, ready), daemon=True)
+            stub_process.start()
+            stub_url = f'http://127.0.0.1:{ready.get(timeout=Command.STUB_START_TIMEOUT_S)}'
+
+        # without a stub the configured upstreams are used, as recorded to or replayed from the cassette
+        source_settings = dict()
+        if stub_url:
+            source_settings.update(CANONICAL_URL=stub_url, BLOCKSET_URL=stub_url, INFURA_URL=stub_url)
+        if options['cassette']:
+            source_settings.update(CHAINSOURCE_CASSETTE=os.path.abspath(options['cassette']), CHAINSOURCE_CASSETTE_MODE=options['cassette_mode'])
+
+        try:
+            report = WorkerThroughputBenchmark(
+                source_settings,
+                options['blockchain'],
+                options['service'],
+                options['chain_height'],
+                options['heights'],
+                options['concurrency'],
+                options['inflight_max'],
+                options['timeout'],
+                options['worker_log'] or os.path.join(tempfile.gettempdir(), f'bench-workers-{os.getpid()}.log'),
+                progress=self.stderr.write,
+            ).run()
+        finally:
+            if stub_process is not None:
+                stub_process.terminate()
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
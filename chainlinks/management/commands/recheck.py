@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chainlinks.models import ChainJob, RESULT_STATUSES
+from chainlinks.tasks import check_single_engine
+
+
+class Command(BaseCommand):
+    help = 'Resets a range of heights of a job to be checked again, as the job has room for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, required=True, help='id of the job to recheck')
+        parser.add_argument('--start', type=int, default=0, help='first height to recheck (default: start of the job)')
+        parser.add_argument('--end', type=int, default=sys.maxsize, help='last height to recheck (default: latest final height)')
+        parser.add_argument('--status', action='append', choices=[status for status, _ in RESULT_STATUSES],
+                            help='only recheck heights with this status; may be repeated (default: every height)')
+
+    def handle(self, *args, **options):
+        if not ChainJob.objects.filter(pk=options['job']).exists():
+            raise CommandError(f'job_id={options["job"]} does not exist')
+        if options['start'] > options['end']:
+            raise CommandError('--start must not be greater than --end')
+
+        reset_count = check_single_engine.recheck_range(options['job'], options['start'], options['end'], options['status'])
+        if reset_count is None:
+            raise CommandError(f'Chain tip cannot be retrieved for job_id={options["job"]}, nothing was reset')
+        self.stdout.write(self.style.SUCCESS(f'Reset reset_count={reset_count} heights to be rechecked for job_id={options["job"]}'))
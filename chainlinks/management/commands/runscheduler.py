@@ -0,0 +1,54 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chainlinks.domain.sharding import SchedulerShard
+from chainlinks.tasks import check_all_engine
+
+
+class Command(BaseCommand):
+    help = ('Plans, every SCHEDULER_PLAN_INTERVAL_S seconds, the share of jobs this node owns among all running scheduler '
+            'nodes, which is how planning scales out; set SCHEDULER_SHARDED so that the run_all_check_jobs task leaves the '
+            'jobs to them, without which this idles')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--node-id', default=None, help='name of this node (default: SCHEDULER_NODE_ID, or host and process)')
+
+    def handle(self, *args, **options):
+        if settings.SCHEDULER_PLAN_INTERVAL_S * 2 > SchedulerShard.NODE_EXPIRY_S:
+            raise CommandError(f'SCHEDULER_PLAN_INTERVAL_S must be at most {SchedulerShard.NODE_EXPIRY_S // 2}, or nodes expire between passes')
+
+        node_id = options['node_id'] or settings.SCHEDULER_NODE_ID or f'{socket.gethostname()}-{os.getpid()}'
+        shard = SchedulerShard(node_id)
+        stopping = False
+
+        def _stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        # unsharded, the run_all_check_jobs task plans every job already, and a second planner would race it on every
+        # job; as with runworkers, a process manager would take an exit for a crash, so this waits to be stopped
+        if not settings.SCHEDULER_SHARDED:
+            self.stdout.write('SCHEDULER_SHARDED is not set, idling; run_all_check_jobs plans the jobs')
+            while not stopping:
+                time.sleep(1)
+            return
+
+        self.stdout.write(f'Planning as node_id={node_id}')
+        try:
+            while not stopping:
+                started = time.monotonic()
+                try:
+                    check_all_engine.check_all_chains(shard)
+                except Exception as e:
+                    self.stderr.write(f'Unable to plan jobs for node_id={node_id} error={e}')
+                while not stopping and time.monotonic() - started < settings.SCHEDULER_PLAN_INTERVAL_S:
+                    time.sleep(1)
+        finally:
+            shard.leave()
@@ -0,0 +1,129 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chainlinks.common.metrics import mark_process_dead, start_metrics_server
+
+
+TOPOLOGY_GROUP = re.compile(r'^(?P<queues>[^=]+)=(?P<processes>\d+)x(?P<concurrency>\d+)$')
+
+
+@dataclass
+class WorkerGroup:
+    queues: List[str]
+    processes: int
+    concurrency: int
+
+    @property
+    def name(self) -> str:
+        return re.sub(r'[^a-zA-Z0-9-]', '-', self.queues[0])
+
+
+@dataclass
+class WorkerProcess:
+    group: WorkerGroup
+    index: int
+    metrics_port: int
+    popen: Optional[subprocess.Popen] = None
+    started: float = 0.0
+
+
+def parse_topology(topology: str) -> List[WorkerGroup]:
+    groups = list()
+    for group in filter(None, (x.strip() for x in topology.split(';'))):
+        match = TOPOLOGY_GROUP.match(group.replace(' ', ''))
+        if not match:
+            raise CommandError(f'Invalid worker group "{group}", expected <queues>=<processes>x<concurrency>')
+        groups.append(WorkerGroup(match['queues'].split(','), int(match['processes']), int(match['concurrency'])))
+    return groups
+
+
+class Command(BaseCommand):
+    help = ('Runs and supervises gevent workers, as processes per group of queues, so that work spreads across cores and '
+            'chains routed apart (see CHECK_QUEUE_ROUTES) stay apart; e.g. '
+            '"consumer,consumer-backfill,consumer-retry=2x100;consumer.eth,consumer-backfill.eth,consumer-retry.eth=2x200"')
+
+    RESTART_DELAY_S = 5
+    STOP_TIMEOUT_S = 25
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topology', default=None, help='worker groups (default: WORKER_TOPOLOGY)')
+        parser.add_argument('--loglevel', default='info')
+
+    def handle(self, *args, **options):
+        groups = parse_topology(options['topology'] or settings.WORKER_TOPOLOGY)
+
+        # with PROMETHEUS_MULTIPROC_DIR set, the metrics of every process are served from here on METRICS_PORT;
+        # otherwise each process serves its own on METRICS_PORT plus its number
+        multiprocess_metrics = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+        if settings.METRICS_PORT and multiprocess_metrics:
+            start_metrics_server(settings.METRICS_PORT)
+
+        workers = list()
+        for group in groups:
+            for index in range(group.processes):
+                metrics_port = 0 if multiprocess_metrics or not settings.METRICS_PORT else settings.METRICS_PORT + len(workers) + 1
+                workers.append(WorkerProcess(group, index, metrics_port))
+
+        stopping = False
+
+        def _stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        # a process manager would take an exit for a crash (and honcho or foreman stop every other process with it),
+        # so without groups, as when CHECK_QUEUE_ROUTES isn't used, this waits to be stopped instead
+        if not groups:
+            self.stdout.write('No worker groups, idling; set WORKER_TOPOLOGY or pass --topology to run workers')
+            while not stopping:
+                time.sleep(1)
+            return
+
+        try:
+            while not stopping:
+                for worker in workers:
+                    if worker.popen is not None and worker.popen.poll() is None:
+                        continue
+                    if worker.popen is not None:
+                        self.stderr.write(f'Worker {worker.group.name}-{worker.index} exited with returncode={worker.popen.returncode}')
+                        mark_process_dead(worker.popen.pid)
+                        worker.popen = None
+                    # a worker that keeps failing is restarted at most every RESTART_DELAY_S
+                    if time.monotonic() - worker.started >= Command.RESTART_DELAY_S:
+                        self._start(worker, options['loglevel'])
+                time.sleep(1)
+        finally:
+            self._stop_all(workers)
+
+    def _start(self, worker: WorkerProcess, loglevel: str):
+        group = worker.group
+        worker.started = time.monotonic()
+        worker.popen = subprocess.Popen([
+            sys.executable, '-m', 'celery', '-A', 'server', 'worker', '-l', loglevel, '-Q', ','.join(group.queues),
+            '-P', 'gevent', '-Ofair', '-c', str(group.concurrency), '-n', f'{group.name}-{worker.index}@%h',
+            '--without-mingle', '--without-gossip', '--without-heartbeat',
+        ], cwd=settings.BASE_DIR, env=dict(os.environ, METRICS_PORT=str(worker.metrics_port)))
+        self.stdout.write(f'Started worker {group.name}-{worker.index} with pid={worker.popen.pid} for queues={",".join(group.queues)}')
+
+    def _stop_all(self, workers: List[WorkerProcess]):
+        running = [worker.popen for worker in workers if worker.popen is not None and worker.popen.poll() is None]
+        for popen in running:
+            popen.terminate()
+        deadline = time.monotonic() + Command.STOP_TIMEOUT_S
+        for popen in running:
+            try:
+                popen.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                popen.kill()
+                popen.wait()
+            mark_process_dead(popen.pid)
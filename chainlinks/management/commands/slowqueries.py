@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from chainlinks.data.instrumentation import format_plan
+from chainlinks.models import SlowQuery
+
+
+def _plan_shape(plan):
+    # node types and indexes in plan order; a change between captures means the planner changed its mind
+    def _nodes(node):
+        yield (node['Node Type'], node.get('Index Name'))
+        for child in node.get('Plans', []):
+            yield from _nodes(child)
+    return tuple(_nodes(plan['Plan'])) if plan else None
+
+
+class Command(BaseCommand):
+    help = 'Ranks the queryset methods with captured slow statements by their total captured time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='only captures from the last this many days (default: 7)')
+        parser.add_argument('--limit', type=int, default=10, help='methods to show (default: 10)')
+        parser.add_argument('--method', help='only this queryset method')
+        parser.add_argument('--show-plan', action='store_true', help='print the latest plan of each method')
+
+    def handle(self, *args, **options):
+        slow_queries = SlowQuery.objects.filter(created__gte=timezone.now() - timedelta(days=options['days']))
+        if options['method']:
+            slow_queries = slow_queries.filter(method=options['method'])
+
+        ranking = slow_queries.values('model', 'method').annotate(
+            captures=Count('id'), total_ms=Sum('duration_ms'), max_ms=Max('duration_ms'), avg_ms=Avg('duration_ms'),
+        ).order_by('-total_ms')[:options['limit']]
+
+        if not ranking:
+            self.stdout.write('No slow queries captured')
+            return
+
+        for rank, row in enumerate(ranking, start=1):
+            captures = slow_queries.filter(model=row['model'], method=row['method']).exclude(plan=None)
+            earliest, latest = captures.order_by('created').first(), captures.order_by('-created').first()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{rank}. {row['model']}.{row['method']}"))
+            self.stdout.write(
+                f"   captures={row['captures']} total={row['total_ms']:.0f}ms max={row['max_ms']:.0f}ms avg={row['avg_ms']:.0f}ms")
+            if latest is not None:
+                # statements that write are only planned, so they have no execution time
+                if earliest.execution_ms is not None and latest.execution_ms is not None:
+                    self.stdout.write(
+                        f'   executed in {earliest.execution_ms:.0f}ms on {earliest.created:%Y-%m-%d %H:%M}, '
+                        f'{latest.execution_ms:.0f}ms on {latest.created:%Y-%m-%d %H:%M}')
+                if _plan_shape(earliest.plan) != _plan_shape(latest.plan):
+                    self.stdout.write(self.style.WARNING('   plan changed between the earliest and latest capture'))
+                if options['show_plan']:
+                    self.stdout.write(f'   {latest.sql}')
+                    self.stdout.write('\n'.join(f'   {line}' for line in format_plan(latest.plan).splitlines()))
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:08
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('chainlinks', '0005_chainjob_visible'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='chainblock',
+            index=models.Index(condition=models.Q(('status__in', ('bd', 'fl'))), fields=['job', '-block_height'], name='cb_job_unsuccessful'),
+        ),
+    ]
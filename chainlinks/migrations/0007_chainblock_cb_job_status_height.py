@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:09
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('chainlinks', '0006_chainblock_cb_job_unsuccessful'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='chainblock',
+            index=models.Index(fields=['job', 'status', '-block_height'], name='cb_job_status_height'),
+        ),
+    ]
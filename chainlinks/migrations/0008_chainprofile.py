@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:24
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0007_chainblock_cb_job_status_height'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainjob',
+            name='profile_sample_rate',
+            field=models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+        migrations.CreateModel(
+            name='ChainProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('task', models.CharField(max_length=64)),
+                ('duration', models.FloatField()),
+                ('phases', models.JSONField(default=dict)),
+                ('profile', models.TextField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chainlinks.chainjob')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chainprofile',
+            index=models.Index(fields=['-created'], name='cp_created'),
+        ),
+    ]
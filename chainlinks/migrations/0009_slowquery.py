@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0008_chainprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('model', models.CharField(max_length=64)),
+                ('method', models.CharField(max_length=64)),
+                ('duration_ms', models.FloatField()),
+                ('sql', models.TextField()),
+                ('plan', models.JSONField(null=True)),
+                ('execution_ms', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='slowquery',
+            index=models.Index(fields=['-created'], name='sq_created'),
+        ),
+    ]
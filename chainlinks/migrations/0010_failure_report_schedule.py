@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:40
+
+from django.db import migrations
+from django_celery_beat.models import PeriodicTask, IntervalSchedule
+
+
+def create_failure_report_schedule(apps, schema_editor):
+    schedule, _ = IntervalSchedule.objects.get_or_create(
+        every=1,
+        period=IntervalSchedule.MINUTES
+    )
+
+    PeriodicTask.objects.create(
+        interval=schedule,
+        name='Report chain check failures',
+        task='chainlinks.tasks.report_all_check_failures'
+    )
+
+
+def delete_failure_report_schedule(apps, schema_editor):
+    PeriodicTask.objects.filter(task='chainlinks.tasks.report_all_check_failures').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0009_slowquery'),
+        ('django_celery_beat', '0015_edit_solarschedule_events_choices')
+    ]
+
+    operations = [
+        migrations.RunPython(create_failure_report_schedule, delete_failure_report_schedule)
+    ]
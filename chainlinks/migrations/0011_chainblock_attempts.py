@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0010_failure_report_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainblock',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chainblock',
+            name='retry_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # unsuccessful blocks come due when they would have been retried before
+        migrations.RunSQL(
+            "UPDATE chainlinks_chainblock SET attempts = 1, retry_after = completed + interval '12 hours' WHERE status IN ('bd', 'fl')",
+            migrations.RunSQL.noop,
+        ),
+    ]
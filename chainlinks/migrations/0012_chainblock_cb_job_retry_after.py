@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:31
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('chainlinks', '0011_chainblock_attempts'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='chainblock',
+            index=models.Index(condition=models.Q(('retry_after__isnull', False), ('status__in', ('bd', 'fl'))), fields=['job', 'retry_after'], name='cb_job_retry_after'),
+        ),
+    ]
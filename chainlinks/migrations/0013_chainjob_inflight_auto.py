@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0012_chainblock_cb_job_retry_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainjob',
+            name='inflight_auto',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chainjob',
+            name='inflight_effective',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
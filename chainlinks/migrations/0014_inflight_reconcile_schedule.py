@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:10
+
+from django.db import migrations
+from django_celery_beat.models import PeriodicTask, IntervalSchedule
+
+
+def create_inflight_reconcile_schedule(apps, schema_editor):
+    schedule, _ = IntervalSchedule.objects.get_or_create(
+        every=10,
+        period=IntervalSchedule.MINUTES
+    )
+
+    PeriodicTask.objects.create(
+        interval=schedule,
+        name='Reconcile chain inflight counts',
+        task='chainlinks.tasks.reconcile_all_check_jobs'
+    )
+
+
+def delete_inflight_reconcile_schedule(apps, schema_editor):
+    PeriodicTask.objects.filter(task='chainlinks.tasks.reconcile_all_check_jobs').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0013_chainjob_inflight_auto'),
+        ('django_celery_beat', '0015_edit_solarschedule_events_choices')
+    ]
+
+    operations = [
+        migrations.RunPython(create_inflight_reconcile_schedule, delete_inflight_reconcile_schedule)
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0014_inflight_reconcile_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainjob',
+            name='multi_target',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0015_chainjob_multi_target'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainjob',
+            name='sample_bucket_size',
+            field=models.BigIntegerField(default=100000, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='chainjob',
+            name='sample_size',
+            field=models.IntegerField(default=30, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='chainjob',
+            name='verification_mode',
+            field=models.CharField(choices=[('exhaustive', 'Exhaustive'), ('sampled', 'Sampled')], default='exhaustive', max_length=16),
+        ),
+    ]
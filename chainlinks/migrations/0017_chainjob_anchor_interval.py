@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:58
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chainlinks', '0016_chainjob_verification_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chainblockfetch',
+            name='canonical_inferred',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chainjob',
+            name='anchor_interval',
+            field=models.IntegerField(default=100, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='chainjob',
+            name='verification_mode',
+            field=models.CharField(choices=[('exhaustive', 'Exhaustive'), ('sampled', 'Sampled'), ('continuity', 'Continuity')], default='exhaustive', max_length=16),
+        ),
+    ]
@@ -1,8 +1,9 @@
 import sys
 from datetime import datetime
 
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.core.validators import MinValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 
 from chainlinks.common.constants import *
@@ -44,6 +45,13 @@ RESULT_STATUSES = (
 )
 
 
+VERIFICATION_MODES = (
+    (VERIFICATION_MODE_EXHAUSTIVE, 'Exhaustive'),
+    (VERIFICATION_MODE_SAMPLED, 'Sampled'),
+    (VERIFICATION_MODE_CONTINUITY, 'Continuity'),
+)
+
+
 class ChainJob(models.Model):
     name = models.CharField(max_length=64)
 
@@ -62,11 +70,37 @@ class ChainJob(models.Model):
     inflight_max = models.IntegerField(validators=[MinValueValidator(1)])
     finality_depth = models.IntegerField(validators=[MinValueValidator(1)])
 
+    # with inflight_auto, inflight_max is only the ceiling and the scheduler tunes the window it actually uses
+    inflight_auto = models.BooleanField(default=False)
+    inflight_effective = models.IntegerField(null=True, blank=True)
+
+    # sampled, historical heights are checked sample_size at random per bucket of sample_bucket_size heights, and a
+    # bucket is only checked exhaustively once a sample in it is bad; heights near the tip are always all checked
+    verification_mode = models.CharField(max_length=16, choices=VERIFICATION_MODES, default=VERIFICATION_MODE_EXHAUSTIVE)
+    sample_bucket_size = models.BigIntegerField(validators=[MinValueValidator(1)], default=100000)
+    sample_size = models.IntegerField(validators=[MinValueValidator(1)], default=30)
+
+    # with continuity, only every anchor_interval-th height is compared with canonical; the service blocks between
+    # are verified by the hash chain linking them to the verified block above
+    anchor_interval = models.IntegerField(validators=[MinValueValidator(1)], default=100)
+
+    # with multi_target, heights are checked together with the other multi-target jobs of the blockchain, so that
+    # canonical is fetched once for all of them
+    multi_target = models.BooleanField(default=False)
+
+    # share of scheduler passes and block checks to profile (see ChainProfile)
+    profile_sample_rate = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1)], default=0)
+
     objects = ChainJobQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        # heights checked together with other jobs are all compared with canonical, so none would ever be linked
+        if self.verification_mode == VERIFICATION_MODE_CONTINUITY and self.multi_target:
+            raise ValidationError({'multi_target': 'Continuity jobs link heights by hash, which shared checks do not; turn off multi-target or continuity.'})
+
 
 class ChainBlock(models.Model):
     job = models.ForeignKey(ChainJob, on_delete=models.CASCADE)
@@ -84,6 +118,11 @@ class ChainBlock(models.Model):
     status = models.CharField(max_length=2, choices=RESULT_STATUSES)
     fetch = models.ForeignKey('ChainBlockFetch', null=True, on_delete=models.SET_NULL)
 
+    # checks completed so far, and when an unsuccessful block may next be retried (null once it is successful, or
+    # has been given up on)
+    attempts = models.IntegerField(default=0)
+    retry_after = models.DateTimeField(null=True, blank=True)
+
     objects = ChainBlockQuerySet.as_manager()
 
     class Meta:
@@ -93,6 +132,9 @@ class ChainBlock(models.Model):
         indexes = [
             models.Index(fields=('status',), name='cb_status'),
             models.Index(fields=('-block_height',), name='cb_block_height'),
+            models.Index(fields=('job', '-block_height'), name='cb_job_unsuccessful', condition=models.Q(status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL))),
+            models.Index(fields=('job', 'status', '-block_height'), name='cb_job_status_height'),
+            models.Index(fields=('job', 'retry_after'), name='cb_job_retry_after', condition=models.Q(status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL), retry_after__isnull=False)),
         ]
 
     def status_message(self):
@@ -128,6 +170,9 @@ class ChainBlockFetch(models.Model):
     service_prev_hash = models.CharField(max_length=MAX_LEN_BLOCK_HASH)
     service_txn_count = models.IntegerField()
 
+    # the canonical block wasn't fetched but inferred from the service block, which linked to a verified successor
+    canonical_inferred = models.BooleanField(default=False)
+
     objects =  ChainBlockFetchQuerySet.as_manager()
 
     @property
@@ -151,6 +196,71 @@ class ChainBlockFetch(models.Model):
 
         return ', '.join(reasons) if reasons else ''
 
+    @property
+    def error_reason(self):
+        # like error_message, but without the values, so that failures of the same kind compare equal
+        if self.canonical_http_status not in GOOD_STATUS_CODES:
+            return f'canonical-http-{self.canonical_http_status}'
+
+        if self.service_http_status not in GOOD_STATUS_CODES:
+            return f'service-http-{self.service_http_status}'
+
+        reasons = list()
+
+        if self.canonical_block_hash != self.service_block_hash:
+            reasons.append('block-hash')
+
+        if self.canonical_prev_hash != self.service_prev_hash:
+            reasons.append('prev-hash')
+
+        if self.canonical_txn_count != self.service_txn_count:
+            reasons.append('txn-count')
+
+        return '+'.join(reasons) + '-mismatch' if reasons else 'mismatch'
 
     def __str__(self):
         return f'{self.block}'
+
+
+class ChainProfile(models.Model):
+    job = models.ForeignKey(ChainJob, on_delete=models.CASCADE)
+
+    # metadata
+    created = models.DateTimeField(auto_now_add=True)
+
+    # profiled task
+    task = models.CharField(max_length=64)
+    duration = models.FloatField()
+    phases = models.JSONField(default=dict)
+    profile = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('-created',), name='cp_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.job} - {self.task} - {self.created}'
+
+
+class SlowQuery(models.Model):
+    # metadata
+    created = models.DateTimeField(auto_now_add=True)
+
+    # queryset method the statement ran in
+    model = models.CharField(max_length=64)
+    method = models.CharField(max_length=64)
+    duration_ms = models.FloatField()
+
+    # statement with its parameters bound, and its plan when explained
+    sql = models.TextField()
+    plan = models.JSONField(null=True)
+    execution_ms = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('-created',), name='sq_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.model}.{self.method} - {self.created}'
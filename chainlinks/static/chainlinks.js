@@ -1,5 +1,5 @@
 function serviceChainGraph(canvasId, data) {
-    new Chart($(canvasId), {
+    const chart = new Chart($(canvasId), {
         type: 'matrix',
         data: {
             datasets: [{
@@ -13,6 +13,9 @@ function serviceChainGraph(canvasId, data) {
                     if ((value || {}).status_pd) {
                         return 'rgba(249, 165, 56, 0.75)';
                     }
+                    if ((value || {}).corruption_bound != null) {
+                        return 'rgba(5, 175, 242, 0.75)';
+                    }
                     if ((value || {}).missing) {
                         return 'rgba(5, 175, 242, 0.50)';
                     }
@@ -52,7 +55,10 @@ function serviceChainGraph(canvasId, data) {
                                     labels.push('# Checking: ' + value.status_pd.toLocaleString())
                                 }
                                 if ((value || {}).missing) {
-                                    labels.push('# Pending: ' + value.missing.toLocaleString())
+                                    labels.push((value.corruption_bound !== undefined ? '# Not Sampled: ' : '# Pending: ') + value.missing.toLocaleString())
+                                }
+                                if ((value || {}).corruption_bound != null) {
+                                    labels.push('Corruption: < ' + (value.corruption_bound * 100).toPrecision(2) + '% (95% confidence)')
                                 }
                                 return labels;
                             }
@@ -95,4 +101,80 @@ function serviceChainGraph(canvasId, data) {
             }
         }
     });
+    chart.matrix = data;
+    return chart;
+}
+
+function serviceChainUpdate(chart, data) {
+    const dataset = chart.data.datasets[0];
+    if (dataset.data.length === data.dataset.length) {
+        dataset.data.forEach((entry, index) => entry.v = data.dataset[index].v);
+    } else {
+        dataset.data = data.dataset;
+        chart.options.scales.x.labels = data.x_labels;
+        chart.options.scales.y.labels = data.y_labels;
+    }
+    chart.matrix = data;
+    chart.update('none');
+}
+
+function serviceChainApplyDeltas(chart, deltas) {
+    const matrix = chart.matrix;
+    const entries = chart.data.datasets[0].data;
+    let changed = false;
+    deltas.forEach(([height, fromStatus, toStatus]) => {
+        if (height < matrix.start_height || height > matrix.end_height) {
+            return;
+        }
+        const offset = height - matrix.range_start;
+        const y = Math.floor(offset / matrix.range_stride);
+        const x = Math.floor((offset % matrix.range_stride) / matrix.range_step);
+        const value = (entries[y * matrix.range_cols + x] || {}).v;
+        if (!value) {
+            return;
+        }
+        // heights without a block are either counted as missing or, when the matrix was built from islands, as good
+        const fromKey = fromStatus ? 'status_' + fromStatus : (value.missing ? 'missing' : 'status_gd');
+        const toKey = 'status_' + toStatus;
+        value[fromKey] = Math.max(0, (value[fromKey] || 0) - 1);
+        value[toKey] = (value[toKey] || 0) + 1;
+        changed = true;
+    });
+    if (changed) {
+        chart.update('none');
+    }
+}
+
+function serviceChainStream(url, jobIds, charts, reload) {
+    if (!window.EventSource || !jobIds.length) {
+        return null;
+    }
+    const source = new EventSource(url + '?' + jobIds.map(jobId => 'job_id=' + jobId).join('&'));
+    let opened = false;
+    source.onopen = function () {
+        // deltas may have been missed while reconnecting
+        if (opened) {
+            jobIds.forEach(reload);
+        }
+        opened = true;
+    };
+    source.onerror = function () {
+        // the stream is not served (e.g. running under WSGI); fall back to the static matrix
+        if (!opened) {
+            source.close();
+        }
+    };
+    source.onmessage = function (event) {
+        const message = JSON.parse(event.data);
+        const chart = charts[message.job_id];
+        if (chart && message.reset) {
+            reload(message.job_id);
+        } else if (chart) {
+            serviceChainApplyDeltas(chart, message.deltas);
+        }
+    };
+    source.addEventListener('resync', function () {
+        jobIds.forEach(reload);
+    });
+    return source;
 }
@@ -1,10 +1,14 @@
 from datetime import timedelta
+from typing import List, Optional
 
 from celery import shared_task, signature
 from celery.utils.log import get_task_logger
 from celery_singleton import Singleton
+from django.conf import settings
 
-from chainlinks.domain.engines import ChainCheckAllEngine, ChainCheckEngine
+from chainlinks.common.constants import QUEUE_CONSUMER_TIP, RESULT_STATUS_BAD, RESULT_STATUS_FAIL
+from chainlinks.data.instrumentation import record_slow_query
+from chainlinks.domain.engines import ChainCheckAllEngine, ChainCheckEngine, RetryPolicy
 
 
 CHAIN_CHECK_CLEANUP_RETENTION = timedelta(days=7)
@@ -12,13 +16,24 @@ CHAIN_CHECK_CLEANUP_EXPIRY = timedelta(hours=1)
 
 CHAIN_CHECK_ALL_EXPIRY = timedelta(minutes=1)
 
+CHAIN_REPORT_EXPIRY = timedelta(minutes=5)
+
+CHAIN_RECONCILE_EXPIRY = timedelta(minutes=10)
+
 CHAIN_CHECK_JOB_EXPIRY = timedelta(minutes=5)
-CHAIN_CHECK_JOB_RETRY = timedelta(hours=12)
+
+# failures are likely to be transient, so are retried soon and for as long as they last; mismatches are likely to
+# persist, so are retried slowly and eventually given up on
+CHAIN_CHECK_RETRY_POLICIES = {
+    RESULT_STATUS_FAIL: RetryPolicy(base=timedelta(minutes=5), cap=timedelta(hours=12), jitter=0.2),
+    RESULT_STATUS_BAD: RetryPolicy(base=timedelta(hours=1), cap=timedelta(days=7), jitter=0.2, attempts_max=8),
+}
 
 
 logger = get_task_logger('app.tasks')
-check_all_engine = ChainCheckAllEngine(signature('chainlinks.tasks.run_check_job').apply_async, CHAIN_CHECK_CLEANUP_RETENTION)
-check_single_engine = ChainCheckEngine(signature('chainlinks.tasks.run_check_height').apply_async, CHAIN_CHECK_JOB_EXPIRY, CHAIN_CHECK_JOB_RETRY)
+check_all_engine = ChainCheckAllEngine(signature('chainlinks.tasks.run_check_job').apply_async, CHAIN_CHECK_CLEANUP_RETENTION, CHAIN_CHECK_JOB_EXPIRY)
+check_single_engine = ChainCheckEngine(signature('chainlinks.tasks.run_check_height').apply_async, CHAIN_CHECK_JOB_EXPIRY, CHAIN_CHECK_RETRY_POLICIES,
+                                       signature('chainlinks.tasks.run_check_shared_height').apply_async)
 
 
 # Tasks
@@ -29,16 +44,42 @@ def clean_all_check_jobs():
     check_all_engine.clean_all_chains()
 
 
+@shared_task(base=Singleton, ignore_result=True, expiry=CHAIN_RECONCILE_EXPIRY, lock_expiry=CHAIN_RECONCILE_EXPIRY)
+def reconcile_all_check_jobs():
+    check_all_engine.reconcile_all_chains()
+
+
+@shared_task(base=Singleton, ignore_result=True, expiry=CHAIN_REPORT_EXPIRY, lock_expiry=CHAIN_REPORT_EXPIRY)
+def report_all_check_failures():
+    check_all_engine.report_all_failures()
+
+
 @shared_task(base=Singleton, ignore_result=True, expiry=CHAIN_CHECK_ALL_EXPIRY, lock_expiry=CHAIN_CHECK_ALL_EXPIRY)
 def run_all_check_jobs():
+    # sharded, the runscheduler nodes plan the jobs between them instead
+    if settings.SCHEDULER_SHARDED:
+        return
     check_all_engine.check_all_chains()
 
 
-@shared_task(base=Singleton, ignore_result=True, expiry=CHAIN_CHECK_JOB_EXPIRY, lock_expiry=CHAIN_CHECK_JOB_EXPIRY)
-def run_check_job(job_pk: int):
-    check_single_engine.check_chain(job_pk)
+@shared_task(base=Singleton, ignore_result=True, expiry=CHAIN_CHECK_JOB_EXPIRY, lock_expiry=CHAIN_CHECK_JOB_EXPIRY, unique_on=['job_pk'])
+def run_check_job(job_pk: int, chain_height: Optional[int] = None):
+    check_single_engine.check_chain(job_pk, chain_height)
+
+
+# queued on the lane chosen by the engine; the tip lane is only the default
+@shared_task(queue=QUEUE_CONSUMER_TIP, ignore_result=True, expiry=CHAIN_CHECK_JOB_EXPIRY)
+def run_check_height(job_pk: int, block_pk: int, blockchain_id: str, block_height: int, service_id: str, profile: bool = False, fetch_pk: Optional[int] = None,
+                     lease_token: Optional[str] = None, continuity: Optional[str] = None):
+    check_single_engine.check_block(job_pk, block_pk, blockchain_id, block_height, service_id, profile, fetch_pk, lease_token, continuity)
+
+
+# one height of several multi-target jobs, each target being the job_pk, block_pk, service_id and lease_token of one
+@shared_task(queue=QUEUE_CONSUMER_TIP, ignore_result=True, expiry=CHAIN_CHECK_JOB_EXPIRY)
+def run_check_shared_height(blockchain_id: str, block_height: int, targets: List[dict], profile: bool = False):
+    check_single_engine.check_shared_block(blockchain_id, block_height, targets, profile)
 
 
-@shared_task(queue='consumer', ignore_result=True, expiry=CHAIN_CHECK_JOB_EXPIRY)
-def run_check_height(job_pk: int, block_pk: int, blockchain_id: str, block_height: int, service_id: str):
-    check_single_engine.check_block(job_pk, block_pk, blockchain_id, block_height, service_id)
+@shared_task(ignore_result=True)
+def explain_slow_query(model: str, method: str, duration_ms: float, sql: str):
+    record_slow_query(model, method, duration_ms, sql)
@@ -1,3 +1,813 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+from unittest import mock
+from urllib.parse import urlsplit, urlunsplit
 
-# Create your tests here.
+import prometheus_client
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from chainlinks.common.constants import BLOCKCHAIN_ID_BITCOIN_MAINNET, RESULT_STATUS_BAD, RESULT_STATUS_FAIL, RESULT_STATUS_GOOD, RESULT_STATUS_PEND
+from chainlinks.common.constants import SERVICE_ID_BLOCKSET, SERVICE_ID_CANONICAL, SERVICE_ID_INFURA, VERIFICATION_MODE_CONTINUITY, VERIFICATION_MODE_SAMPLED
+from chainlinks.data.querysets import SCHEDULED_NEVER
+from chainlinks.data.stores import BlockDispatchLease, BlockStatusChannel, JobCompletionStats, JobInflightCounter, get_redis
+from chainlinks.domain.breakers import BREAKER_STATE_CLOSED, BREAKER_STATE_HALF_OPEN, BREAKER_STATE_OPEN, CircuitBreaker, is_failure
+from chainlinks.domain.cassettes import CASSETTE_MODE_RECORD, CASSETTE_MODE_REPLAY, Cassette, CassetteAdapter
+from chainlinks.domain.chainsources import Block, Chain, Infura, create_session
+from chainlinks.domain.engines import CONTINUITY_ANCHOR, CONTINUITY_LINK, ChainCheckAllEngine, ChainCheckEngine
+from chainlinks.domain.sampling import sample_heights, wilson_upper_bound
+from chainlinks.domain.sharding import HashRing
+from chainlinks.domain.tuning import InflightTuner
+from chainlinks.models import ChainBlock, ChainJob
+
+
+# tests that go through Redis use a database of their own, so that the ids of test jobs can't touch real jobs' keys
+TEST_REDIS_URL = urlunsplit(urlsplit(settings.REDIS_URL)._replace(path='/15'))
+
+
+@override_settings(REDIS_URL=TEST_REDIS_URL)
+class RedisTestCase(TestCase):
+
+    def setUp(self):
+        get_redis().flushdb()
+        self.addCleanup(get_redis().flushdb)
+
+
+class StaticChainsource:
+    '''Blocks whose hashes chain from each height to the one below, bar the heights with hashes of their own'''
+
+    def __init__(self, broken_heights=()) -> None:
+        self.broken_heights = set(broken_heights)
+        self.heights = list()
+
+    def get_block(self, block_height: int):
+        self.heights.append(block_height)
+        block_hash = f'broken{block_height}' if block_height in self.broken_heights else f'hash{block_height}'
+        return Block(200, block_hash, f'hash{block_height - 1}', block_height, 1)
+
+
+class CassetteTestCase(SimpleTestCase):
+
+    PROJECT_ID = '0123456789abcdef0123456789abcdef'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cassette.sqlite')
+
+    def _record(self, response_body: bytes):
+        def _send(adapter, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.reason = 'OK'
+            response.headers['Content-Type'] = 'application/json'
+            response._content = response_body
+            response.request = request
+            return response
+
+        cassette = Cassette(self.path, [self.PROJECT_ID])
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send', _send):
+            Infura(self.PROJECT_ID, 'ethereum-mainnet', adapter=CassetteAdapter(cassette, CASSETTE_MODE_RECORD)).get_chain()
+        return cassette
+
+    def test_recording_leaves_out_secrets(self):
+        cassette = self._record(b'{"jsonrpc": "2.0", "id": 1, "result": "0x10"}')
+
+        self.assertEqual([], cassette.find_secrets({'INFURA_PROJECT_ID': self.PROJECT_ID}))
+        url, = cassette.connection.execute('SELECT url FROM responses').fetchone()
+        self.assertEqual('https://mainnet.infura.io/v3/REDACTED', url)
+
+    def test_recording_is_replayed_with_another_project_id(self):
+        self._record(b'{"jsonrpc": "2.0", "id": 1, "result": "0x10"}')
+
+        adapter = CassetteAdapter(Cassette(self.path, ['fedcba9876543210fedcba9876543210']), CASSETTE_MODE_REPLAY)
+        chain = Infura('fedcba9876543210fedcba9876543210', 'ethereum-mainnet', adapter=adapter).get_chain()
+        self.assertEqual(16, chain.chain_height)
+
+    def test_find_secrets_in_responses(self):
+        cassette = self._record(f'{{"jsonrpc": "2.0", "id": 1, "result": "0x10", "echo": "{self.PROJECT_ID}"}}'.encode())
+
+        self.assertEqual(['INFURA_PROJECT_ID'], cassette.find_secrets({'INFURA_PROJECT_ID': self.PROJECT_ID, 'BLOCKSET_TOKEN': 'other'}))
+
+    def test_credential_like_url_parts_are_redacted(self):
+        cassette = Cassette(self.path)
+
+        self.assertEqual(
+            'https://example.com/api-key/REDACTED/blocks?access_token=REDACTED&height=1',
+            cassette.redact_url('https://example.com/api-key/abc123/blocks?height=1&access_token=xyz'))
+
+
+class InflightTunerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tuner = InflightTuner()
+
+    def test_start_is_a_share_of_the_maximum(self):
+        self.assertEqual(10, self.tuner.start(100))
+        self.assertEqual(InflightTuner.WINDOW_MIN, self.tuner.start(1))
+
+    def test_too_few_completions_wait_for_more(self):
+        self.assertEqual(40, self.tuner.tune(100, 40, 40, InflightTuner.COMPLETED_MIN - 1, 5, 10.0, 1.0))
+
+    def test_too_few_completions_still_clamp_the_window(self):
+        self.assertEqual(30, self.tuner.tune(30, 40, 40, 0, 0, None, None))
+
+    def test_failures_halve_the_window(self):
+        self.assertEqual(20, self.tuner.tune(100, 40, 40, 100, 6, 1.0, 1.0))
+
+    def test_failures_within_the_rate_grow_the_window(self):
+        self.assertEqual(45, self.tuner.tune(100, 40, 40, 100, 5, 1.0, 1.0))
+
+    def test_latency_over_the_baseline_halves_the_window(self):
+        self.assertEqual(20, self.tuner.tune(100, 40, 40, 100, 0, 2.1, 1.0))
+
+    def test_latency_within_tolerance_grows_the_window(self):
+        self.assertEqual(45, self.tuner.tune(100, 40, 40, 100, 0, 2.0, 1.0))
+
+    def test_latency_without_a_baseline_is_no_congestion(self):
+        self.assertEqual(45, self.tuner.tune(100, 40, 40, 100, 0, 5.0, None))
+
+    def test_halving_stops_at_the_minimum(self):
+        self.assertEqual(InflightTuner.WINDOW_MIN, self.tuner.tune(100, 1, 1, 100, 50, None, None))
+
+    def test_window_grows_only_when_in_use(self):
+        self.assertEqual(40, self.tuner.tune(100, 40, 31, 100, 0, None, None))
+        self.assertEqual(45, self.tuner.tune(100, 40, 32, 100, 0, None, None))
+
+    def test_growth_is_at_least_one(self):
+        self.assertEqual(11, self.tuner.tune(20, 10, 10, 100, 0, None, None))
+
+    def test_growth_stops_at_the_maximum(self):
+        self.assertEqual(100, self.tuner.tune(100, 98, 98, 100, 0, None, None))
+
+    def test_rebase_starts_from_the_first_latency(self):
+        self.assertEqual(3.0, self.tuner.rebase(3.0, None))
+
+    def test_rebase_keeps_the_baseline_without_a_latency(self):
+        self.assertEqual(2.0, self.tuner.rebase(None, 2.0))
+        self.assertIsNone(self.tuner.rebase(None, None))
+
+    def test_rebase_follows_a_lower_latency(self):
+        self.assertEqual(1.0, self.tuner.rebase(1.0, 2.0))
+
+    def test_rebase_drifts_up_towards_a_higher_latency(self):
+        self.assertAlmostEqual(2.0 * InflightTuner.BASELINE_DRIFT, self.tuner.rebase(5.0, 2.0))
+
+
+
+class ChainTipTestCase(SimpleTestCase):
+
+    def test_chain_that_times_out_has_no_tip(self):
+        released = threading.Event()
+        self.addCleanup(released.set)
+
+        def _find_chain_height(blockchain_id: str):
+            if blockchain_id == 'slow':
+                released.wait()
+            return 100
+
+        engine = ChainCheckAllEngine(None, timedelta(days=1), timedelta(minutes=5))
+        started = time.monotonic()
+        with mock.patch.object(ChainCheckAllEngine, 'CHAIN_TIP_TIMEOUT_S', 0.2), mock.patch.object(engine, '_find_chain_height', _find_chain_height):
+            self.assertEqual({'fast': 100, 'slow': None}, engine._find_chain_heights(['slow', 'fast']))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_no_chains_no_tips(self):
+        self.assertEqual({}, ChainCheckAllEngine(None, timedelta(days=1), timedelta(minutes=5))._find_chain_heights([]))
+
+
+class InflightTuningTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = ChainJob.objects.create(
+            name='test', enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=1000, finality_depth=1, inflight_auto=True, inflight_effective=3)
+        self.engine = ChainCheckEngine(mock.Mock(), timedelta(minutes=5), {}, mock.Mock())
+
+    def _pass(self, completed: int):
+        # a pass that finds the window in use, after the window's worth of checks completed since the last
+        for _ in range(completed):
+            JobCompletionStats().record(self.job.pk, False, 0.1)
+        self.job.refresh_from_db()
+        return self.engine._tune_inflight(self.job, self.job.inflight_effective)
+
+    def test_small_window_grows_once_completions_build_up(self):
+        passes = (InflightTuner.COMPLETED_MIN + 2) // 3
+        self.assertEqual([3] * (passes - 1), [self._pass(3) for _ in range(passes - 1)])
+        self.assertEqual(3 + 50, self._pass(3))
+
+    def test_completions_are_only_taken_once_enough(self):
+        for _ in range(InflightTuner.COMPLETED_MIN - 1):
+            JobCompletionStats().record(self.job.pk, False, 0.1)
+        self.assertEqual(InflightTuner.COMPLETED_MIN - 1, JobCompletionStats().take(self.job.pk, InflightTuner.COMPLETED_MIN)[0])
+
+        JobCompletionStats().record(self.job.pk, True, 0.1)
+        self.assertEqual((InflightTuner.COMPLETED_MIN, 1), JobCompletionStats().take(self.job.pk, InflightTuner.COMPLETED_MIN)[:2])
+        self.assertEqual(0, JobCompletionStats().take(self.job.pk, InflightTuner.COMPLETED_MIN)[0])
+
+
+class FailureIslandTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.engine = ChainCheckAllEngine(None, timedelta(days=1), timedelta(minutes=5))
+
+    def test_no_heights_no_islands(self):
+        self.assertEqual([], self.engine._find_islands([]))
+
+    def test_consecutive_heights_are_one_island(self):
+        self.assertEqual([(10, 13, 4)], self.engine._find_islands([10, 11, 12, 13]))
+
+    def test_gaps_split_islands(self):
+        self.assertEqual([(1, 2, 2), (4, 4, 1), (6, 8, 3)], self.engine._find_islands([1, 2, 4, 6, 7, 8]))
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    '''Runs against the Redis at REDIS_URL, on keys of a service no job uses'''
+
+    SERVICE_ID = 'test-service'
+    BLOCKCHAIN_ID = 'test-chain'
+
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch('chainlinks.domain.breakers.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._delete_keys)
+        self._delete_keys()
+        self.breaker = CircuitBreaker(self.SERVICE_ID, self.BLOCKCHAIN_ID)
+
+    def _delete_keys(self):
+        keys = list(get_redis().scan_iter(f'chainlinks.breaker.*.{self.SERVICE_ID}.{self.BLOCKCHAIN_ID}*'))
+        if keys:
+            get_redis().delete(*keys)
+
+    def _open(self):
+        for _ in range(CircuitBreaker.REQUESTS_MIN):
+            self.breaker.record(500)
+
+    def test_failures_are_errors_throttling_and_no_response(self):
+        self.assertTrue(is_failure(None))
+        self.assertTrue(is_failure(429))
+        self.assertTrue(is_failure(503))
+        self.assertFalse(is_failure(200))
+        self.assertFalse(is_failure(404))
+
+    def test_starts_closed(self):
+        self.assertEqual(BREAKER_STATE_CLOSED, self.breaker.state())
+
+    def test_stays_closed_below_the_minimum_requests(self):
+        for _ in range(CircuitBreaker.REQUESTS_MIN - 1):
+            self.breaker.record(500)
+        self.assertEqual(BREAKER_STATE_CLOSED, self.breaker.state())
+
+    def test_stays_closed_below_the_failure_rate(self):
+        for _ in range(CircuitBreaker.REQUESTS_MIN):
+            self.breaker.record(200)
+        for _ in range(CircuitBreaker.REQUESTS_MIN - 1):
+            self.breaker.record(500)
+        self.assertEqual(BREAKER_STATE_CLOSED, self.breaker.state())
+
+    def test_opens_at_the_failure_rate(self):
+        self._open()
+        self.assertEqual(BREAKER_STATE_OPEN, self.breaker.state())
+
+    def test_goes_half_open_after_open_s(self):
+        self._open()
+        self.now += CircuitBreaker.OPEN_S - 1
+        self.assertEqual(BREAKER_STATE_OPEN, self.breaker.state())
+        self.now += 1
+        self.assertEqual(BREAKER_STATE_HALF_OPEN, self.breaker.state())
+
+    def test_outcomes_while_open_are_not_probes(self):
+        self._open()
+        for _ in range(CircuitBreaker.PROBE_SUCCESSES):
+            self.breaker.record(200)
+        self.now += CircuitBreaker.OPEN_S
+        self.assertEqual(BREAKER_STATE_HALF_OPEN, self.breaker.state())
+
+    def test_probe_successes_close_it(self):
+        self._open()
+        self.now += CircuitBreaker.OPEN_S
+        for _ in range(CircuitBreaker.PROBE_SUCCESSES - 1):
+            self.breaker.record(200)
+        self.assertEqual(BREAKER_STATE_HALF_OPEN, self.breaker.state())
+        self.breaker.record(200)
+        self.assertEqual(BREAKER_STATE_CLOSED, self.breaker.state())
+
+    def test_probe_failure_reopens_it_for_twice_as_long(self):
+        self._open()
+        self.now += CircuitBreaker.OPEN_S
+        self.breaker.record(None)
+        self.assertEqual(BREAKER_STATE_OPEN, self.breaker.state())
+        self.now += 2 * CircuitBreaker.OPEN_S - 1
+        self.assertEqual(BREAKER_STATE_OPEN, self.breaker.state())
+        self.now += 1
+        self.assertEqual(BREAKER_STATE_HALF_OPEN, self.breaker.state())
+
+    def test_reopening_is_capped(self):
+        self._open()
+        for _ in range(10):
+            self.now += CircuitBreaker.OPEN_MAX_S
+            self.breaker.record(None)
+        self.now += CircuitBreaker.OPEN_MAX_S
+        self.assertEqual(BREAKER_STATE_HALF_OPEN, self.breaker.state())
+
+
+class RetryBackoffTestCase(TestCase):
+
+    def setUp(self):
+        self.completed = timezone.now()
+        job = ChainJob.objects.create(
+            name='test', enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=10, finality_depth=1)
+        self.block = ChainBlock.objects.create(job=job, block_height=1, scheduled=self.completed, status=RESULT_STATUS_PEND)
+
+    def _complete(self, **kwargs):
+        previous_status = ChainBlock.objects.complete_block(self.block.pk, RESULT_STATUS_FAIL, None, self.completed, **kwargs)
+        self.block.refresh_from_db()
+        return previous_status
+
+    def _delays(self, attempts: int, **kwargs):
+        delays = list()
+        for _ in range(attempts):
+            self._complete(**kwargs)
+            delays.append(None if self.block.retry_after is None else (self.block.retry_after - self.completed).total_seconds())
+        return delays
+
+    def test_returns_the_previous_status(self):
+        self.assertEqual(RESULT_STATUS_PEND, self._complete())
+        self.assertEqual(RESULT_STATUS_FAIL, self._complete())
+        self.assertEqual(2, self.block.attempts)
+
+    def test_returns_none_for_a_missing_block(self):
+        self.assertIsNone(ChainBlock.objects.complete_block(-1, RESULT_STATUS_FAIL, None, self.completed))
+
+    def test_delay_doubles_up_to_the_cap(self):
+        self.assertEqual([60, 120, 240, 480, 600, 600], self._delays(6, retry_base_s=60, retry_cap_s=600))
+
+    def test_delay_is_scaled(self):
+        self.assertEqual([45, 90], self._delays(2, retry_base_s=60, retry_cap_s=600, retry_scale=0.75))
+
+    def test_no_retry_once_attempts_max_is_reached(self):
+        self.assertEqual([60, 120, None], self._delays(3, retry_base_s=60, retry_cap_s=600, attempts_max=3))
+
+    def test_no_retry_without_a_base(self):
+        self.assertEqual([None], self._delays(1))
+
+
+class HashRingTestCase(SimpleTestCase):
+
+    KEYS = range(1000)
+
+    def _owners(self, node_ids):
+        ring = HashRing(node_ids)
+        return {key: ring.owner(key) for key in self.KEYS}
+
+    def test_no_nodes_no_owner(self):
+        self.assertIsNone(HashRing([]).owner(1))
+
+    def test_owner_is_the_same_whatever_the_node_order(self):
+        self.assertEqual(self._owners(['a', 'b', 'c']), self._owners(['c', 'a', 'b']))
+
+    def test_every_node_owns_keys(self):
+        self.assertEqual({'a', 'b', 'c'}, set(self._owners(['a', 'b', 'c']).values()))
+
+    def test_joining_node_only_takes_keys(self):
+        before, after = self._owners(['a', 'b', 'c']), self._owners(['a', 'b', 'c', 'd'])
+
+        moved = {key for key in self.KEYS if before[key] != after[key]}
+        self.assertTrue(moved)
+        self.assertEqual({'d'}, {after[key] for key in moved})
+
+    def test_leaving_node_only_gives_up_its_keys(self):
+        before, after = self._owners(['a', 'b', 'c']), self._owners(['a', 'b'])
+
+        moved = {key for key in self.KEYS if before[key] != after[key]}
+        self.assertEqual({key for key in self.KEYS if before[key] == 'c'}, moved)
+
+
+class SamplingTestCase(SimpleTestCase):
+
+    def test_sample_is_the_same_every_time(self):
+        self.assertEqual(sample_heights(1, 0, 0, 999, 30), sample_heights(1, 0, 0, 999, 30))
+
+    def test_sample_is_sorted_distinct_heights_of_the_range(self):
+        heights = sample_heights(1, 1000, 1000, 1999, 30)
+
+        self.assertEqual(30, len(set(heights)))
+        self.assertEqual(sorted(heights), heights)
+        self.assertTrue(all(1000 <= height <= 1999 for height in heights))
+
+    def test_sample_differs_by_job_and_bucket(self):
+        self.assertNotEqual(sample_heights(1, 0, 0, 999, 30), sample_heights(2, 0, 0, 999, 30))
+        self.assertNotEqual(sample_heights(1, 0, 0, 999, 30), [height - 1000 for height in sample_heights(1, 1000, 1000, 1999, 30)])
+
+    def test_sample_of_a_short_bucket_is_all_of_it(self):
+        self.assertEqual([5, 6, 7], sample_heights(1, 0, 5, 7, 30))
+
+    def test_bound_without_trials_is_one(self):
+        self.assertEqual(1.0, wilson_upper_bound(0, 0))
+
+    def test_bound_without_failures_is_above_zero(self):
+        self.assertAlmostEqual(0.0370, wilson_upper_bound(0, 100), places=4)
+
+    def test_bound_is_above_the_rate_and_at_most_one(self):
+        self.assertGreater(wilson_upper_bound(10, 100), 0.1)
+        self.assertAlmostEqual(1.0, wilson_upper_bound(100, 100))
+
+    def test_bound_tightens_with_more_trials(self):
+        self.assertLess(wilson_upper_bound(10, 1000), wilson_upper_bound(1, 100))
+
+
+class ContinuityTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = ChainJob.objects.create(
+            name='test', enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=1, inflight_max=10, finality_depth=1, verification_mode=VERIFICATION_MODE_CONTINUITY, anchor_interval=10)
+        self.engine = ChainCheckEngine(mock.Mock(), timedelta(minutes=5), {}, mock.Mock())
+        self.canonical = StaticChainsource()
+        self.service = StaticChainsource()
+        patcher = mock.patch('chainlinks.domain.engines.get_chainsource', lambda service_id, blockchain_id: (
+            self.canonical if service_id == SERVICE_ID_CANONICAL else self.service))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_blocks(self, heights, status=RESULT_STATUS_PEND):
+        return {height: ChainBlock.objects.create(
+            job=self.job, block_height=height, scheduled=timezone.now() - timedelta(seconds=1), status=status
+        ) for height in heights}
+
+    def _check(self, block: ChainBlock, continuity: str):
+        return self.engine.check_block(
+            self.job.pk, block.pk, self.job.blockchain_id, block.block_height, self.job.service_id, continuity=continuity)
+
+    def _statuses(self):
+        return {block.block_height: (block.status, block.fetch.canonical_inferred if block.fetch else None) for block in ChainBlock.objects.filter(job=self.job)}
+
+    def test_link_waits_for_its_successor(self):
+        blocks = self._create_blocks([15, 16])
+
+        self.assertIsNone(self._check(blocks[15], CONTINUITY_LINK))
+        self.assertEqual(RESULT_STATUS_PEND, ChainBlock.objects.get(pk=blocks[15].pk).status)
+        self.assertEqual([], self.canonical.heights + self.service.heights)
+
+    def test_link_is_inferred_from_its_checked_successor(self):
+        blocks = self._create_blocks([19, 20])
+        self._check(blocks[20], CONTINUITY_ANCHOR)
+        ChainBlock.objects.filter(pk=blocks[19].pk).update(status=RESULT_STATUS_PEND, fetch=None)
+        self.canonical.heights.clear()
+
+        self._check(blocks[19], CONTINUITY_LINK)
+        self.assertEqual((RESULT_STATUS_GOOD, True), self._statuses()[19])
+        self.assertEqual([], self.canonical.heights)
+
+    def test_anchor_links_the_pending_heights_below(self):
+        blocks = self._create_blocks(range(16, 21))
+
+        self._check(blocks[20], CONTINUITY_ANCHOR)
+        self.assertEqual({
+            16: (RESULT_STATUS_GOOD, True), 17: (RESULT_STATUS_GOOD, True), 18: (RESULT_STATUS_GOOD, True), 19: (RESULT_STATUS_GOOD, True),
+            20: (RESULT_STATUS_GOOD, False),
+        }, self._statuses())
+        self.assertEqual([20], self.canonical.heights)
+
+    def test_broken_link_is_checked_against_canonical(self):
+        blocks = self._create_blocks(range(16, 21))
+        self.service.broken_heights.add(18)
+
+        self._check(blocks[20], CONTINUITY_ANCHOR)
+        self.assertEqual({
+            16: (RESULT_STATUS_GOOD, False), 17: (RESULT_STATUS_GOOD, False), 18: (RESULT_STATUS_BAD, False), 19: (RESULT_STATUS_GOOD, True),
+            20: (RESULT_STATUS_GOOD, False),
+        }, self._statuses())
+        self.assertEqual([16, 17, 18, 20], sorted(self.canonical.heights))
+
+    def test_linking_stops_at_a_height_not_scheduled(self):
+        blocks = self._create_blocks([16, 17, 19, 20])
+
+        self._check(blocks[20], CONTINUITY_ANCHOR)
+        statuses = self._statuses()
+        self.assertEqual((RESULT_STATUS_GOOD, True), statuses[19])
+        self.assertEqual((RESULT_STATUS_PEND, None), statuses[17])
+
+    def test_gaps_are_scheduled_anchors_first_then_links_down_from_them(self):
+        with mock.patch.object(ChainCheckEngine, 'TIP_WINDOW_SIZE', 5):
+            heights = self.engine._find_continuity_heights(self.job, 1, 25, 100)
+
+        self.assertEqual([10, 20, 21, 22, 23, 24, 25] + list(range(9, 0, -1)) + list(range(19, 10, -1)), heights)
+
+    def test_links_never_fill_a_small_window(self):
+        with mock.patch.object(ChainCheckEngine, 'TIP_WINDOW_SIZE', 5):
+            self.assertEqual([10, 20, 21], self.engine._find_continuity_heights(self.job, 1, 25, 3))
+            self._create_blocks([10, 20, 21, 22, 23, 24, 25], RESULT_STATUS_GOOD)
+            self.assertEqual([9, 8, 7], self.engine._find_continuity_heights(self.job, 1, 25, 3))
+
+    def test_multi_target_continuity_job_is_invalid(self):
+        self.job.multi_target = True
+        with self.assertRaises(ValidationError):
+            self.job.full_clean()
+
+
+class SharedScheduleTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = self._create_job('job')
+        self.scheduler = mock.Mock()
+        self.engine = ChainCheckEngine(mock.Mock(), timedelta(minutes=5), {}, self.scheduler)
+
+    def _create_job(self, name: str, **kwargs):
+        return ChainJob.objects.create(**{**dict(
+            name=name, enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=100, finality_depth=1, multi_target=True,
+        ), **kwargs})
+
+    def _schedule(self):
+        # heights 90 to 100, with the chain's tip at 100
+        self.engine._schedule_shared_blocks(timezone.now(), self.job, 'gap', list(range(90, 101)), 100)
+
+    def _heights(self, job: ChainJob):
+        return list(ChainBlock.objects.filter(job=job).order_by('block_height').values_list('block_height', flat=True))
+
+    def test_heights_are_shared_with_siblings_that_cover_them(self):
+        sibling = self._create_job('sibling', start_height=95)
+        JobInflightCounter().set(self.job.pk, 0)
+        self._schedule()
+
+        self.assertEqual(list(range(95, 101)), self._heights(sibling))
+        self.assertEqual(6, JobInflightCounter().get(sibling.pk))
+        self.assertEqual(11, JobInflightCounter().get(self.job.pk))
+        self.assertEqual(11, self.scheduler.call_count)
+
+    def test_sibling_gets_only_heights_final_at_its_depth(self):
+        sibling = self._create_job('sibling', finality_depth=10)
+        self._schedule()
+
+        self.assertEqual([90, 91], self._heights(sibling))
+
+    def test_sibling_gets_no_more_than_its_window_has_room_for(self):
+        sibling = self._create_job('sibling', inflight_max=5)
+        JobInflightCounter().set(sibling.pk, 3)
+        self._schedule()
+
+        self.assertEqual([90, 91], self._heights(sibling))
+        self.assertEqual(5, JobInflightCounter().get(sibling.pk))
+
+    def test_sibling_held_back_by_its_breaker_gets_nothing(self):
+        sibling = self._create_job('sibling', service_id=SERVICE_ID_INFURA)
+        breaker = CircuitBreaker(SERVICE_ID_INFURA, BLOCKCHAIN_ID_BITCOIN_MAINNET)
+        for _ in range(CircuitBreaker.REQUESTS_MIN):
+            breaker.record(500)
+        self._schedule()
+
+        self.assertEqual([], self._heights(sibling))
+
+    def test_sampled_and_disabled_siblings_get_nothing(self):
+        sampled = self._create_job('sampled', verification_mode=VERIFICATION_MODE_SAMPLED)
+        disabled = self._create_job('disabled', enabled=False)
+        self._schedule()
+
+        self.assertEqual([], self._heights(sampled))
+        self.assertEqual([], self._heights(disabled))
+
+
+class RecheckTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = ChainJob.objects.create(
+            name='test', enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=10, finality_depth=1)
+        for height in range(10, 13):
+            ChainBlock.objects.create(job=self.job, block_height=height, scheduled=timezone.now(), status=RESULT_STATUS_GOOD)
+        self.canonical = mock.Mock()
+        patcher = mock.patch('chainlinks.domain.engines.get_chainsource', lambda service_id, blockchain_id: self.canonical)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _recheck(self):
+        call_command('recheck', job=self.job.pk, start=10, end=20, stdout=io.StringIO())
+
+    def test_recheck_resets_the_final_heights(self):
+        self.canonical.get_chain.return_value = Chain(200, 11)
+        self._recheck()
+
+        self.assertEqual([RESULT_STATUS_PEND, RESULT_STATUS_PEND, RESULT_STATUS_GOOD], list(
+            ChainBlock.objects.filter(job=self.job).order_by('block_height').values_list('status', flat=True)))
+
+    def test_unreachable_tip_is_a_command_error(self):
+        self.canonical.get_chain.side_effect = requests.ConnectionError('unreachable')
+        with self.assertRaises(CommandError):
+            self._recheck()
+
+        self.assertFalse(ChainBlock.objects.filter(job=self.job, status=RESULT_STATUS_PEND).exists())
+
+    def test_bad_tip_status_is_a_command_error(self):
+        self.canonical.get_chain.return_value = Chain(503, None)
+        with self.assertRaises(CommandError):
+            self._recheck()
+
+
+class DispatchLeaseTestCase(RedisTestCase):
+
+    EXPIRY = timedelta(minutes=5)
+
+    def test_latest_dispatch_runs_once(self):
+        token = BlockDispatchLease().take([1], self.EXPIRY)[1]
+
+        self.assertTrue(BlockDispatchLease().claim(1, token, self.EXPIRY))
+        self.assertFalse(BlockDispatchLease().claim(1, token, self.EXPIRY))
+
+    def test_superseded_dispatch_is_dropped(self):
+        stale_token = BlockDispatchLease().take([1], self.EXPIRY)[1]
+        token = BlockDispatchLease().take([1], self.EXPIRY)[1]
+
+        self.assertFalse(BlockDispatchLease().claim(1, stale_token, self.EXPIRY))
+        self.assertTrue(BlockDispatchLease().claim(1, token, self.EXPIRY))
+
+    def test_dispatch_whose_lease_lapsed_runs(self):
+        token = BlockDispatchLease().take([1], self.EXPIRY)[1]
+        get_redis().flushdb()
+
+        self.assertTrue(BlockDispatchLease().claim(1, token, self.EXPIRY))
+        self.assertFalse(BlockDispatchLease().claim(1, token, self.EXPIRY))
+
+    def test_leases_are_per_block(self):
+        tokens = BlockDispatchLease().take([1, 2], self.EXPIRY)
+
+        self.assertFalse(BlockDispatchLease().claim(2, tokens[1], self.EXPIRY))
+        self.assertTrue(BlockDispatchLease().claim(2, tokens[2], self.EXPIRY))
+
+
+class InflightAccountingTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = ChainJob.objects.create(
+            name='test', enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=10, finality_depth=1)
+        self.engine = ChainCheckEngine(mock.Mock(), timedelta(minutes=5), {}, mock.Mock())
+        JobInflightCounter().set(self.job.pk, 0)
+
+    def _create_block(self, height: int, status: str, scheduled=None):
+        return ChainBlock.objects.create(job=self.job, block_height=height, scheduled=scheduled or timezone.now(), status=status)
+
+    def _complete(self, block: ChainBlock):
+        checked = Block(200, 'hash', 'prev', block.block_height, 1)
+        self.engine._store_check(self.job.pk, block.pk, checked, checked, RESULT_STATUS_GOOD, timezone.now())
+
+    def test_scheduled_blocks_are_counted(self):
+        self.engine._schedule_blocks(timezone.now(), self.job, 'gap', [1, 2, 3], 100)
+
+        self.assertEqual(3, JobInflightCounter().get(self.job.pk))
+
+    def test_completed_block_is_uncounted_once(self):
+        JobInflightCounter().set(self.job.pk, 2)
+        block = self._create_block(1, RESULT_STATUS_PEND)
+
+        self._complete(block)
+        self.assertEqual(1, JobInflightCounter().get(self.job.pk))
+        # a second check of the block, as after it expired and was requeued, finds it no longer pending
+        self._complete(block)
+        self.assertEqual(1, JobInflightCounter().get(self.job.pk))
+
+    def test_expired_blocks_are_already_counted(self):
+        JobInflightCounter().set(self.job.pk, 2)
+        blocks = [self._create_block(height, RESULT_STATUS_PEND) for height in (1, 2)]
+
+        self.engine._reschedule_blocks(timezone.now(), self.job, 'expiry', blocks, 100)
+        self.assertEqual(2, JobInflightCounter().get(self.job.pk))
+
+    def test_retried_and_rechecked_blocks_are_counted(self):
+        blocks = [self._create_block(1, RESULT_STATUS_BAD), self._create_block(2, RESULT_STATUS_FAIL), self._create_block(3, RESULT_STATUS_PEND, SCHEDULED_NEVER)]
+
+        self.engine._reschedule_blocks(timezone.now(), self.job, 'retry', blocks, 100)
+        self.assertEqual(3, JobInflightCounter().get(self.job.pk))
+
+    def test_rescheduled_then_completed_blocks_balance_out(self):
+        blocks = [self._create_block(1, RESULT_STATUS_BAD), self._create_block(2, RESULT_STATUS_PEND, SCHEDULED_NEVER)]
+
+        self.engine._reschedule_blocks(timezone.now(), self.job, 'retry', blocks, 100)
+        for block in blocks:
+            self._complete(block)
+        self.assertEqual(0, JobInflightCounter().get(self.job.pk))
+
+
+class SummaryViewTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.job = ChainJob.objects.create(
+            name='test', enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=10, finality_depth=1)
+        statuses = {10: RESULT_STATUS_BAD, 11: RESULT_STATUS_BAD, 20: RESULT_STATUS_FAIL, 30: RESULT_STATUS_BAD}
+        for height in range(0, 40):
+            ChainBlock.objects.create(job=self.job, block_height=height, scheduled=timezone.now(), status=statuses.get(height, RESULT_STATUS_GOOD))
+
+    def _summary(self, **params):
+        response = self.client.get(reverse('service-chain-summary-json', args=[self.job.pk]), params)
+        self.assertEqual(200, response.status_code)
+        return json.loads(b''.join(response.streaming_content))
+
+    def _ranges(self, summary):
+        return sorted([('bad', x['block_start'], x['block_end']) for x in summary['bad_ranges']] +
+                      [('fail', x['block_start'], x['block_end']) for x in summary['fail_ranges']], key=lambda x: x[1])
+
+    def test_pages_are_walked_by_cursor(self):
+        pages, params = list(), dict(limit=1)
+        while True:
+            summary = self._summary(**params)
+            pages.append(self._ranges(summary))
+            if summary['next_cursor'] is None:
+                break
+            params['cursor'] = summary['next_cursor']
+
+        self.assertEqual([[('bad', 10, 11)], [('fail', 20, 20)], [('bad', 30, 30)]], pages)
+
+    def test_full_page_without_more_has_no_next_cursor(self):
+        summary = self._summary(limit=3)
+
+        self.assertEqual([('bad', 10, 11), ('fail', 20, 20), ('bad', 30, 30)], self._ranges(summary))
+        self.assertIsNone(summary['next_cursor'])
+
+    def test_cache_is_invalidated_by_a_new_failure(self):
+        self.assertEqual(3, len(self._ranges(self._summary())))
+
+        # changed without being published, the cached summary is still served
+        ChainBlock.objects.filter(job=self.job, block_height=35).update(status=RESULT_STATUS_BAD)
+        self.assertEqual(3, len(self._ranges(self._summary())))
+
+        BlockStatusChannel().publish(self.job.pk, [(35, RESULT_STATUS_PEND, RESULT_STATUS_BAD)])
+        self.assertEqual(('bad', 35, 35), self._ranges(self._summary())[-1])
+
+    def test_good_transitions_keep_the_cache(self):
+        version = BlockStatusChannel().failure_version(self.job.pk)
+        BlockStatusChannel().publish(self.job.pk, [(40, None, RESULT_STATUS_PEND), (40, RESULT_STATUS_PEND, RESULT_STATUS_GOOD)])
+
+        self.assertEqual(version, BlockStatusChannel().failure_version(self.job.pk))
+
+
+class JobWorkTestCase(TestCase):
+
+    def _create_job(self, name: str, changed_blocks: Optional[dict] = None):
+        # ten good blocks, bar those changed
+        job = ChainJob.objects.create(
+            name=name, enabled=True, visible=True, service_id=SERVICE_ID_BLOCKSET, blockchain_id=BLOCKCHAIN_ID_BITCOIN_MAINNET,
+            start_height=0, inflight_max=10, finality_depth=1)
+        for height in range(0, 10):
+            ChainBlock.objects.create(**{**dict(
+                job=job, block_height=height, scheduled=timezone.now(), status=RESULT_STATUS_GOOD,
+            ), **(changed_blocks or dict()).get(height, dict())})
+        return job
+
+    def test_work_of_each_kind_is_found(self):
+        now = timezone.now()
+        idle = self._create_job('idle')
+        gap = self._create_job('gap')
+        ChainBlock.objects.filter(job=gap, block_height=9).delete()
+        expired = self._create_job('expired', {5: dict(status=RESULT_STATUS_PEND, scheduled=now - timedelta(hours=1))})
+        recheck = self._create_job('recheck', {5: dict(status=RESULT_STATUS_PEND, scheduled=SCHEDULED_NEVER)})
+        retry = self._create_job('retry', {5: dict(status=RESULT_STATUS_FAIL, retry_after=now - timedelta(minutes=1))})
+
+        work = {job_pk: flags for job_pk, *flags in ChainBlock.objects.find_all_job_work(
+            [(job.pk, 0, 9, 0) for job in (idle, gap, expired, recheck, retry)], now - timedelta(minutes=5), now)}
+        self.assertEqual({
+            idle.pk: [False, False, False, False],
+            gap.pk: [True, False, False, False],
+            expired.pk: [False, True, False, False],
+            recheck.pk: [False, False, True, False],
+            retry.pk: [False, False, False, True],
+        }, work)
+
+
+class ChainsourceMetricsTestCase(SimpleTestCase):
+
+    def _request_count(self):
+        return prometheus_client.REGISTRY.get_sample_value(
+            'chainlinks_chainsource_request_seconds_count', dict(service_id=SERVICE_ID_INFURA, blockchain_id='ethereum-mainnet')) or 0
+
+    def test_failed_requests_are_timed(self):
+        session = create_session(SERVICE_ID_INFURA, 'ethereum-mainnet')
+        count = self._request_count()
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send', side_effect=requests.ConnectionError('unreachable')):
+            with self.assertRaises(requests.ConnectionError):
+                session.get('https://mainnet.infura.io/v3/project')
+
+        self.assertEqual(count + 1, self._request_count())
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qs
+
+from redis import RedisError
+
+from chainlinks.data.stores import BlockStatusChannel
+
+
+BLOCK_STATUS_STREAM_PATH = '/_stream/status'
+
+
+logger = logging.getLogger('chainlinks.web.streams')
+
+
+class BlockStatusBroadcaster:
+    '''Fans a single block status subscription out to every stream connected to this process'''
+
+    LISTENER_QUEUE_SIZE = 1000
+    RECONNECT_DELAY_S = 5
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.listeners = dict()
+        self.thread = None
+
+    def add_listener(self, loop: asyncio.AbstractEventLoop, job_ids: frozenset):
+        queue = asyncio.Queue(BlockStatusBroadcaster.LISTENER_QUEUE_SIZE)
+        with self.lock:
+            self.listeners[queue] = (loop, job_ids)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='block-status-broadcaster', daemon=True)
+                self.thread.start()
+        return queue
+
+    def remove_listener(self, queue: asyncio.Queue):
+        with self.lock:
+            self.listeners.pop(queue, None)
+
+    def _run(self):
+        while True:
+            try:
+                for message in BlockStatusChannel().listen():
+                    with self.lock:
+                        listeners = list(self.listeners.items())
+                    for queue, (loop, job_ids) in listeners:
+                        if not job_ids or message['job_id'] in job_ids:
+                            loop.call_soon_threadsafe(self._offer, queue, message)
+            except RedisError as e:
+                logger.warning(f'Block status subscription lost error={e}')
+            time.sleep(BlockStatusBroadcaster.RECONNECT_DELAY_S)
+
+    def _offer(self, queue: asyncio.Queue, message: dict):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # the client has fallen behind; drop what it has queued and ask it to reload instead
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+class BlockStatusStreamView:
+
+    HEARTBEAT_INTERVAL_S = 15
+
+    def __init__(self, broadcaster: BlockStatusBroadcaster) -> None:
+        self.broadcaster = broadcaster
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        try:
+            job_ids = frozenset(int(x) for x in query.get('job_id', []))
+        except ValueError:
+            await self._send_error(send, 400)
+            return
+
+        queue = self.broadcaster.add_listener(asyncio.get_running_loop(), job_ids)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+            disconnect = asyncio.ensure_future(self._wait_for_disconnect(receive))
+            try:
+                while not disconnect.done():
+                    message = asyncio.ensure_future(queue.get())
+                    done, _ = await asyncio.wait((message, disconnect), timeout=BlockStatusStreamView.HEARTBEAT_INTERVAL_S, return_when=asyncio.FIRST_COMPLETED)
+                    if message not in done:
+                        message.cancel()
+                        if not disconnect.done():
+                            await send({'type': 'http.response.body', 'body': b': heartbeat\n\n', 'more_body': True})
+                    elif message.result() is None:
+                        await send({'type': 'http.response.body', 'body': b'event: resync\ndata: {}\n\n', 'more_body': True})
+                    else:
+                        await send({'type': 'http.response.body', 'body': f'data: {json.dumps(message.result())}\n\n'.encode(), 'more_body': True})
+            finally:
+                disconnect.cancel()
+        finally:
+            self.broadcaster.remove_listener(queue)
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _send_error(self, send, status: int):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+block_status_stream = BlockStatusStreamView(BlockStatusBroadcaster())
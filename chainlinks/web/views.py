@@ -1,32 +1,42 @@
 import collections
+import json
 import math
+import sys
 from itertools import groupby
-from typing import Iterable
+from typing import Iterable, Optional
 
 from django.core.cache import cache
-from django.core.paginator import Paginator
 from django.db.models.functions import Collate
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.cache import cache_page
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from redis import RedisError
 
 from chainlinks.common.constants import RESULT_STATUS_PEND, RESULT_STATUS_GOOD, RESULT_STATUS_BAD, RESULT_STATUS_FAIL
-from chainlinks.common.constants import SERVICE_ID_CANONICAL
+from chainlinks.common.constants import SERVICE_ID_CANONICAL, VERIFICATION_MODE_SAMPLED
+from chainlinks.common.metrics import get_registry
+from chainlinks.data.stores import BlockStatusChannel
 from chainlinks.domain.chainsources import get_chainsource
+from chainlinks.domain.sampling import wilson_upper_bound
 from chainlinks.models import ChainJob, ChainBlock
+from chainlinks.web.streams import BLOCK_STATUS_STREAM_PATH
 
 
 class ServiceChainView:
 
+    ERRORS_PAGE_SIZE = 15
+
     def view_get(self, request, service_id, blockchain_id):
         job = ChainJob.objects.filter(service_id=service_id, blockchain_id=blockchain_id).first()
         if job is None:
             raise Http404('No %s matches the given query.' % ChainJob._meta.object_name)
 
-        errors_paginator = Paginator(ChainBlock.objects.filter(
-            job = job,
-            status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL)
-        ).select_related('fetch').order_by('-block_height'), 15)
+        try:
+            errors_before = int(request.GET['errors_before']) if 'errors_before' in request.GET else None
+            errors_after = int(request.GET['errors_after']) if 'errors_after' in request.GET else None
+        except ValueError:
+            return HttpResponseBadRequest('errors_before and errors_after must be integers')
 
         jobs = (job,)
         return render(
@@ -35,7 +45,7 @@ class ServiceChainView:
             {
                 'detail_view': True,
                 'include_all_blocks': True,
-                'errors_page': errors_paginator.get_page(request.GET.get('error_page', None))
+                'errors_page': self._to_errors_page(job, errors_before, errors_after),
             } | self._to_service_chains_context(jobs)
         )
 
@@ -50,8 +60,32 @@ class ServiceChainView:
             } | self._to_service_chains_context(jobs)
         )
 
+    def _to_errors_page(self, job: ChainJob, errors_before: Optional[int], errors_after: Optional[int]):
+        # keyset pagination on block_height (newest first) so every page costs the same as the first one
+        page_size = ServiceChainView.ERRORS_PAGE_SIZE
+        errors = ChainBlock.objects.select_related('fetch')
+        if errors_after is not None:
+            blocks = list(reversed(errors.find_unsuccessful_blocks_after(job.pk, errors_after, page_size + 1)))
+            has_newer, blocks = len(blocks) > page_size, blocks[-page_size:]
+            has_older = bool(blocks) and errors.find_unsuccessful_blocks_before(job.pk, blocks[-1].block_height, 1).exists()
+        else:
+            blocks = list(errors.find_unsuccessful_blocks_before(job.pk, errors_before if errors_before is not None else sys.maxsize, page_size + 1))
+            has_older, blocks = len(blocks) > page_size, blocks[:page_size]
+            has_newer = bool(blocks) and errors.find_unsuccessful_blocks_after(job.pk, blocks[0].block_height, 1).exists()
+
+        return {
+            'blocks': blocks,
+            'newer_cursor': blocks[0].block_height if has_newer else None,
+            'older_cursor': blocks[-1].block_height if has_older else None,
+            'estimated_count': ChainBlock.objects.filter(
+                job=job,
+                status__in=(RESULT_STATUS_BAD, RESULT_STATUS_FAIL)
+            ).estimate_count(),
+        }
+
     def _to_service_chains_context(self, jobs: Iterable[ChainJob]):
         return {
+            'stream_url': BLOCK_STATUS_STREAM_PATH,
             'services': [
                 {
                     'service_id': service_id,
@@ -112,6 +146,14 @@ class ServiceChainMatrixJsonView:
             'job_id': job_id,
             'service_id': service_id,
             'blockchain_id': blockchain_id,
+            'verification_mode': job.verification_mode,
+            'start_height': start_height,
+            'end_height': final_height,
+            'range_start': range_start,
+            'range_stride': range_stride,
+            'range_step': range_step,
+            'range_cols': range_cols,
+            'range_rows': range_rows,
             'y_labels': [self._to_y_label(i * range_stride + range_start, range_stride) for i in reversed(range(range_rows))],
             'x_labels': [self._to_x_label(i * range_step, range_step) for i in range(range_cols)],
             'dataset': [{'x': self._to_x_label(x * range_step, range_step), 'y': self._to_y_label(y * range_stride + range_start, range_stride), 'v': v}
@@ -146,7 +188,11 @@ class ServiceChainMatrixJsonView:
                 range_data[y][x] = {'total': 0, 'start': 0, 'end': 0} | status_dict
 
     def _populate_range_data(self, job, range_coords, start_height, end_height, range_start, range_stride, range_step, range_data):
-        if ChainBlock.objects.has_holes(job.pk, start_height, end_height):
+        # sampled jobs are mostly holes, and are shown with the coverage of their samples
+        if job.verification_mode == VERIFICATION_MODE_SAMPLED:
+            self._populate_with_status_ranges(job, range_coords, start_height, end_height, range_start, range_stride, range_step, range_data)
+            self._populate_corruption_bounds(range_coords, range_data)
+        elif ChainBlock.objects.has_holes(job.pk, start_height, end_height):
             self._populate_with_status_ranges(job, range_coords, start_height, end_height, range_start, range_stride, range_step, range_data)
         else:
             self._populate_with_status_islands(job, range_coords, start_height, end_height, range_start, range_stride, range_step, range_data)
@@ -183,6 +229,13 @@ class ServiceChainMatrixJsonView:
             fail = range_data[y][x][f'status_{RESULT_STATUS_FAIL}']
             range_data[y][x][f'status_{RESULT_STATUS_GOOD}'] = total - (pend + bad + fail)
 
+    def _populate_corruption_bounds(self, range_coords, range_data):
+        # how corrupt each range may be, given its checked samples; none where nothing was checked
+        for x, y in range_coords:
+            good = range_data[y][x][f'status_{RESULT_STATUS_GOOD}']
+            bad = range_data[y][x][f'status_{RESULT_STATUS_BAD}']
+            range_data[y][x]['corruption_bound'] = wilson_upper_bound(bad, good + bad) if good + bad else None
+
     def _to_x_label(self, value, step):
         return f'+{value:,} to {(value + step - 1):,}'
 
@@ -192,28 +245,67 @@ class ServiceChainMatrixJsonView:
 
 class ServiceChainSummaryJsonView:
 
+    PAGE_SIZE_DEFAULT = 1000
+    PAGE_SIZE_MAX = 10000
+    # block changes that were never published (seeded or made by hand) show within this
+    SUMMARY_CACHE_TIMEOUT_S = 5 * 60
+
     def view_get(self, request, job_id: int):
         job = get_object_or_404(ChainJob, pk=job_id)
-        return JsonResponse({
+        try:
+            cursor = max(job.start_height, int(request.GET.get('cursor', job.start_height)))
+            limit = min(ServiceChainSummaryJsonView.PAGE_SIZE_MAX, max(1, int(request.GET.get('limit', ServiceChainSummaryJsonView.PAGE_SIZE_DEFAULT))))
+        except ValueError:
+            return HttpResponseBadRequest('cursor and limit must be integers')
+
+        # summaries only change when blocks go bad or fail, or stop being so, so cache them against the job's
+        # failure version
+        version = self._determine_version(job.pk)
+        cache_key = f'ServiceChainSummaryJsonView.view_get.{job.pk}.{version}.{cursor}.{limit}'
+        summary = cache.get(cache_key) if version is not None else None
+        if summary is None:
+            summary = self._summarize(job, cursor, limit)
+            if version is not None:
+                cache.set(cache_key, summary, ServiceChainSummaryJsonView.SUMMARY_CACHE_TIMEOUT_S)
+
+        return StreamingHttpResponse(json.JSONEncoder().iterencode(summary), content_type='application/json')
+
+    def _determine_version(self, job_pk: int):
+        try:
+            return BlockStatusChannel().failure_version(job_pk)
+        except RedisError:
+            return None
+
+    def _summarize(self, job: ChainJob, cursor: int, limit: int):
+        # one island more than the page tells whether there is a next page
+        islands = list(ChainBlock.objects.find_islands_page(
+            job.id, cursor, job.end_height, [RESULT_STATUS_BAD, RESULT_STATUS_FAIL], limit + 1
+        ))
+        next_cursor = islands[limit - 1][2] + 1 if len(islands) > limit else None
+        islands = islands[:limit]
+        return {
             'bad_ranges': [
                 {
                     'blockchain_id': job.blockchain_id,
                     'block_start': result_start,
                     'block_end': result_end,
-                } for _, result_start, result_end in ChainBlock.objects.find_all_islands(
-                    job.id, job.start_height, job.end_height, [RESULT_STATUS_BAD]
-                )
+                } for status, result_start, result_end in islands if status == RESULT_STATUS_BAD
             ],
             'fail_ranges': [
                 {
                     'blockchain_id': job.blockchain_id,
                     'block_start': result_start,
                     'block_end': result_end,
-                } for _, result_start, result_end in ChainBlock.objects.find_all_islands(
-                    job.id, job.start_height, job.end_height, [RESULT_STATUS_FAIL]
-                )
-            ]
-        })
+                } for status, result_start, result_end in islands if status == RESULT_STATUS_FAIL
+            ],
+            'next_cursor': next_cursor,
+        }
+
+
+class MetricsView:
+
+    def view_get(self, request):
+        return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
 
 
 @cache_page(15)
@@ -232,3 +324,7 @@ def service_chain_matrix_json(request, job_id: int):
 
 def service_chain_summary_json(request, job_id: int):
     return ServiceChainSummaryJsonView().view_get(request, job_id)
+
+
+def metrics(request):
+    return MetricsView().view_get(request)
@@ -2,6 +2,8 @@
 ASGI config for server project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the live block status stream are served directly, everything
+else is handed to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the apps are ready
+from chainlinks.web.streams import BLOCK_STATUS_STREAM_PATH, block_status_stream
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == BLOCK_STATUS_STREAM_PATH:
+        await block_status_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
@@ -17,6 +18,22 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from django.conf import settings
+    from chainlinks.common.metrics import start_metrics_server
+
+    if settings.METRICS_PORT:
+        start_metrics_server(settings.METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    from chainlinks.common.metrics import mark_process_dead
+
+    mark_process_dead(pid or os.getpid())
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
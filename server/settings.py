@@ -139,9 +139,11 @@ STATIC_URL = '/static/'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:16379/0')
+
 CELERY_TIMEZONE = 'Europe/London'
 ENABLE_UTC = True
-CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:16379/0')
+CELERY_BROKER_URL = REDIS_URL
 CELERY_SINGLETON_BACKEND_URL = os.environ.get('CELERY_SINGLETON_BACKEND_URL', CELERY_BROKER_URL)
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
@@ -154,9 +156,46 @@ CANONICAL_TOKEN = os.environ.get('CANONICAL_TOKEN', '').strip()
 BLOCKSET_URL = os.environ.get('BLOCKSET_URL', '').strip()
 BLOCKSET_TOKEN = os.environ.get('BLOCKSET_TOKEN', '').strip()
 INFURA_PROJECT_ID = os.environ.get('INFURA_PROJECT_ID', '').strip()
+INFURA_URL = os.environ.get('INFURA_URL', '').strip()
+
+# record chain source responses to, or replay them from, a cassette file ('record' or 'replay')
+CHAINSOURCE_CASSETTE = os.environ.get('CHAINSOURCE_CASSETTE', '').strip()
+CHAINSOURCE_CASSETTE_MODE = os.environ.get('CHAINSOURCE_CASSETTE_MODE', 'replay').strip()
 
 CHECK_FOR_HOLES = os.environ.get('CHECK_FOR_HOLES', '').lower() == 'true'
 
+# block checks for a job ('job-<id>'), a blockchain or everything else ('*') go to their lane's queue suffixed with
+# the route's group, e.g. 'ethereum-mainnet=eth,*={blockchain_id}'; without a route they go to the lane's own queue.
+# The worker and worker_backfill processes only consume the lanes' own queues, so routed queues need workers of
+# their own: set WORKER_TOPOLOGY, for the worker_topology process, to consume every group routed to
+CHECK_QUEUE_ROUTES = dict(
+    route.split('=', 1) for route in os.environ.get('CHECK_QUEUE_ROUTES', '').replace(' ', '').split(',') if '=' in route
+)
+
+# worker processes started by the runworkers command, as '<queues>=<processes>x<concurrency>' groups separated by ';';
+# without any, the command (and so the worker_topology process) idles
+WORKER_TOPOLOGY = os.environ.get('WORKER_TOPOLOGY', '').strip()
+
+# jobs are planned by runscheduler nodes, each taking its share, rather than by the run_all_check_jobs task; a node
+# is named SCHEDULER_NODE_ID, or after its host and process, and plans every SCHEDULER_PLAN_INTERVAL_S seconds (as
+# often as the run_all_check_jobs task is scheduled, by default)
+SCHEDULER_SHARDED = os.environ.get('SCHEDULER_SHARDED', '').lower() == 'true'
+SCHEDULER_NODE_ID = os.environ.get('SCHEDULER_NODE_ID', '').strip()
+SCHEDULER_PLAN_INTERVAL_S = int(os.environ.get('SCHEDULER_PLAN_INTERVAL_S', '10'))
+
+# port for workers to serve Prometheus metrics on (0 disables); set PROMETHEUS_MULTIPROC_DIR for multi-process servers
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+
+# share of every job's scheduler passes and block checks to profile (on top of each job's own rate), and a directory
+# to also write the profiles to as HTML
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '').strip()
+
+# queryset statements slower than this (0 disables) are explained, on a sample, and kept as SlowQuery records
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '1000'))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', '0.1'))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', '60000'))
+
 sentry_sdk.init(
     dsn=os.environ.get('SENTRY_DSN', ''),
     integrations=[DjangoIntegration(), CeleryIntegration()],
@@ -164,7 +203,7 @@ sentry_sdk.init(
     # Set traces_sample_rate to 1.0 to capture 100%
     # of transactions for performance monitoring.
     # We recommend adjusting this value in production,
-    traces_sample_rate=1.0,
+    traces_sample_rate=float(os.environ.get('SENTRY_TRACES_SAMPLE_RATE', '1.0')),
 
     # If you wish to associate users to errors (assuming you are using
     # django.contrib.auth) you may enable sending PII data.